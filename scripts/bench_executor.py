@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+"""Compare per-call latency of the ``ansible`` CLI with testfm.executor.
+
+Usage::
+
+    python scripts/bench_executor.py -i testfm/inventory -p server -n 20
+
+Every side runs the command on the first inventory host matching the
+pattern: the ``ansible`` CLI, ``ssh`` opening a connection per call, and
+:class:`testfm.executor.Executor` reusing its control master. The first
+executor call, which starts the control master, is reported on its own.
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from functools import partial  # noqa: E402
+
+from testfm.executor import Executor  # noqa: E402
+from testfm.executor import SSHTransport  # noqa: E402
+
+
+def timed(call, count):
+    """Return per-call durations of count runs of call"""
+    durations = []
+    for _ in range(count):
+        start = time.perf_counter()
+        call()
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+def report(name, durations):
+    print(
+        f"{name:<10} calls={len(durations):<4} mean={statistics.mean(durations) * 1000:9.1f} ms "
+        f"median={statistics.median(durations) * 1000:9.1f} ms "
+        f"max={max(durations) * 1000:9.1f} ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-i", "--inventory", default="testfm/inventory")
+    parser.add_argument("-p", "--pattern", default="server")
+    parser.add_argument("-u", "--user", default="root")
+    parser.add_argument("-n", "--count", type=int, default=10)
+    parser.add_argument("--command", default="true")
+    args = parser.parse_args()
+
+    executor = Executor(args.inventory, args.pattern, args.user, SSHTransport)
+    host = executor.default_host()
+    ansible = f"ansible {host} -i {args.inventory} -u {args.user} -m command -a '{args.command}'"
+    plain = Executor(
+        args.inventory, args.pattern, args.user, partial(SSHTransport, multiplex=False)
+    )
+
+    before = timed(lambda: os.popen(ansible).read(), args.count)
+    ssh = timed(lambda: plain.run(args.command, host), args.count)
+    # the first call pays for the control master
+    first = timed(lambda: executor.run(args.command, host), 1)
+    after = timed(lambda: executor.run(args.command, host), args.count)
+    executor.close()
+
+    report("ansible", before)
+    report("ssh", ssh)
+    report("first", first)
+    report("executor", after)
+    print(f"speedup    {statistics.mean(before) / statistics.mean(after):.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""Controller side cache of downloaded artifacts, pushed to the hosts on demand.
+
+Fixtures installing pexpect, the katello CA consumer or the EPEL release
+package used to download them on the host for every test. :class:`ArtifactCache`
+downloads each URL once into ``~/.cache/testfm/artifacts``, where files are
+stored by their sha256 checksum, and copies them to the hosts::
+
+    path = artifacts.push(katello_ca_consumer, max_age=LATEST_MAX_AGE)
+    ansible_module.command(f"yum -y localinstall {path}")
+
+A file whose checksum already matches on the host is not copied again, and
+copied files are checked before being moved in place.
+"""
+import base64
+import hashlib
+import json
+import os
+import posixpath
+import shlex
+import tempfile
+import threading
+import time
+import urllib.request
+
+from testfm.executor import default_executor
+from testfm.facts import CACHE_DIR
+
+ARTIFACTS_DIR = os.path.join(CACHE_DIR, "artifacts")
+REMOTE_DIR = "/var/cache/testfm"
+# artifacts published under a fixed "latest" URL are downloaded again after a day
+LATEST_MAX_AGE = 24 * 3600
+
+
+class ArtifactError(Exception):
+    """An artifact could not be downloaded or copied"""
+
+
+class ArtifactCache:
+    """Downloaded files stored by checksum, with an index of the URLs they came from
+
+    @param directory: local cache directory
+    @param executor: executor reaching the hosts, the shared one by default
+    """
+
+    def __init__(self, directory=ARTIFACTS_DIR, executor=None):
+        self.directory = directory
+        self.index_file = os.path.join(directory, "index.json")
+        self.executor = executor
+        self.downloads = 0
+        self.copies = 0
+        self._lock = threading.Lock()
+
+    def path(self, digest):
+        """Return the local path of the artifact with sha256 checksum digest"""
+        return os.path.join(self.directory, "sha256", digest)
+
+    def _load_index(self):
+        try:
+            with open(self.index_file) as handle:
+                return json.load(handle)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_index(self, index):
+        with tempfile.NamedTemporaryFile("w", dir=self.directory, delete=False) as handle:
+            json.dump(index, handle, indent=2, sort_keys=True)
+        os.replace(handle.name, self.index_file)
+
+    def _download(self, url):
+        """Download url into the cache, return its checksum"""
+        os.makedirs(os.path.join(self.directory, "sha256"), exist_ok=True)
+        digest = hashlib.sha256()
+        with tempfile.NamedTemporaryFile(dir=self.directory, delete=False) as handle:
+            try:
+                with urllib.request.urlopen(url, timeout=300) as response:
+                    for block in iter(lambda: response.read(1 << 20), b""):
+                        digest.update(block)
+                        handle.write(block)
+            except OSError as err:
+                os.unlink(handle.name)
+                raise ArtifactError(f"Downloading {url} failed: {err}")
+        os.replace(handle.name, self.path(digest.hexdigest()))
+        self.downloads += 1
+        return digest.hexdigest()
+
+    def fetch(self, url, sha256=None, max_age=None):
+        """Return the checksum of the artifact at url, downloading it unless cached
+
+        @param sha256: expected checksum, the artifact is then looked up by it
+        @param max_age: seconds after which an artifact cached by URL is downloaded again
+        """
+        with self._lock:
+            if sha256 is not None and os.path.exists(self.path(sha256)):
+                return sha256
+            index = self._load_index()
+            entry = index.get(url)
+            if (
+                sha256 is None
+                and entry is not None
+                and os.path.exists(self.path(entry["sha256"]))
+                and (max_age is None or time.time() - entry["time"] < max_age)
+            ):
+                return entry["sha256"]
+            digest = self._download(url)
+            if sha256 is not None and digest != sha256:
+                os.unlink(self.path(digest))
+                raise ArtifactError(f"{url} has checksum {digest} instead of {sha256}")
+            index[url] = {"sha256": digest, "time": time.time()}
+            self._save_index(index)
+            return digest
+
+    def push(self, url, dest=None, host=None, sha256=None, max_age=None):
+        """Copy the artifact at url to host, unless it is there already, return its remote path
+
+        @param dest: remote path, a file named after the URL in ``/var/cache/testfm`` by default
+        @param host: host to copy to, the default host of the executor by default
+        @param sha256: expected checksum, see :meth:`fetch`
+        @param max_age: see :meth:`fetch`
+        """
+        digest = self.fetch(url, sha256, max_age)
+        if dest is None:
+            dest = posixpath.join(REMOTE_DIR, posixpath.basename(url.split("?")[0]))
+        executor = self.executor or default_executor()
+        quoted = shlex.quote(dest)
+        check = executor.run(f"sha256sum {quoted}", host)
+        if check.rc == 0 and check.stdout.split()[0] == digest:
+            return dest
+        with open(self.path(digest), "rb") as handle:
+            encoded = base64.encodebytes(handle.read()).decode()
+        part = shlex.quote(f"{dest}.part")
+        script = (
+            f"mkdir -p {shlex.quote(posixpath.dirname(dest))} && base64 -d > {part} && "
+            f"echo '{digest}  '{part} | sha256sum -c --status && mv -f {part} {quoted}"
+        )
+        copy = executor.run(f"sh -c {shlex.quote(script)}", host, input=encoded)
+        if copy.rc != 0:
+            raise ArtifactError(f"Copying {url} to {dest} failed: {copy.stderr}")
+        self.copies += 1
+        return dest
+
+
+artifacts = ArtifactCache()
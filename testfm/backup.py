@@ -28,34 +28,28 @@ class Backup(Base):
     def run_online_backup(cls, options=None):
         """Build foreman-maintain backup online"""
 
-        cls.command_sub = "online"
-
         if options is None:
             options = {}
 
-        result = cls._construct_command(options)
+        result = cls._construct_command(options, "online")
         return result
 
     @classmethod
     def run_offline_backup(cls, options=None):
         """Build foreman-maintain backup offline"""
 
-        cls.command_sub = "offline"
-
         if options is None:
             options = {}
 
-        result = cls._construct_command(options)
+        result = cls._construct_command(options, "offline")
         return result
 
     @classmethod
     def run_snapshot_backup(cls, options=None):
         """Build foreman-maintain backup snapshot"""
 
-        cls.command_sub = "snapshot"
-
         if options is None:
             options = {}
 
-        result = cls._construct_command(options)
+        result = cls._construct_command(options, "snapshot")
         return result
@@ -1,3 +1,87 @@
+import sys
+from functools import lru_cache
+
+from testfm.steps import parse_steps
+
+
+class Command(str):
+    """Immutable foreman-maintain command produced by the builders.
+
+    It is a plain string (so it can be passed to ``ansible_module.command`` or
+    concatenated with other shell snippets as before) which additionally keeps
+    its parts:
+
+    @param base: command base, like ``health`` or ``advanced procedure run``
+    @param sub: subcommand, like ``check`` or ``list-tags``
+    @param argv: tuple of option tokens following the subcommand
+    @param read_only: whether the command only reports state, see :attr:`Base.read_only`
+    @param builder: name of the builder which made it, like ``Backup.run_online_backup``
+    """
+
+    def __new__(cls, base, sub, argv=(), read_only=False, builder=None):
+        argv = tuple(argv)
+        self = super().__new__(cls, f"foreman-maintain {base} {sub} {' '.join(argv)}")
+        object.__setattr__(self, "base", base)
+        object.__setattr__(self, "sub", sub)
+        object.__setattr__(self, "argv", argv)
+        object.__setattr__(self, "read_only", read_only)
+        object.__setattr__(self, "builder", builder)
+        return self
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __reduce__(self):
+        return type(self), (self.base, self.sub, self.argv, self.read_only, self.builder)
+
+    def __repr__(self):
+        return f"{type(self).__name__}({str.__repr__(self)})"
+
+
+def _argv(kind, options):
+    """Turn frozen builder options into a tuple of option tokens"""
+    argv = []
+    if kind == "list":
+        for _, val in options:
+            if val is None:
+                continue
+            argv.append(f"{val}")
+    else:
+        for key, (_, val) in options:
+            if val is None:
+                continue
+            if val is True:
+                argv.append(f"--{key}")
+            elif val is not False:
+                if isinstance(val, tuple):
+                    val = ",".join(str(el) for el in val)
+                argv.append(f'--{key}="{val}"')
+    return tuple(argv)
+
+
+def _typed(val):
+    """Pair a value with its type so that e.g. ``True`` and ``1`` are cached apart"""
+    if isinstance(val, list):
+        val = tuple(val)
+    return type(val), val
+
+
+def _freeze(options):
+    """Return options as a hashable ``(kind, items)`` pair"""
+    if isinstance(options, dict):
+        return "dict", tuple((key, _typed(val)) for key, val in options.items())
+    return "list", tuple(_typed(val) for val in options)
+
+
+@lru_cache(maxsize=1024)
+def _render(base, sub, kind, options, read_only, builder):
+    """Memoized construction of a :class:`Command` for hashable options"""
+    return Command(base, sub, _argv(kind, options), read_only, builder)
+
+
 class Base:
     """
     @param command_base: base command of foreman-maintain.
@@ -26,28 +110,40 @@ class Base:
     """
 
     command_base = None  # each inherited instance should define this
-    command_sub = ""  # specific to instance, like: health, upgrade, etc
+    # subcommands which only report state, their results can be reused until
+    # any other command runs on the host (see testfm.cache)
+    read_only = frozenset()
 
     @classmethod
-    def _construct_command(cls, options=None):
-        """Build a foreman-maintain command based on the options passed"""
-        tail = ""
-        if isinstance(options, list):
-            for val in options:
-                if val is None:
-                    continue
-                else:
-                    tail += f" {val}"
-        else:
-            for key, val in options.items():
-                if val is None:
-                    continue
-                if val is True:
-                    tail += f" --{key}"
-                elif val is not False:
-                    if isinstance(val, list):
-                        val = ",".join(str(el) for el in val)
-                    tail += f' --{key}="{val}"'
-
-        cmd = f"foreman-maintain {cls.command_base} {cls.command_sub} {tail.strip()}"
-        return cmd
+    def _construct_command(cls, options=None, command_sub=""):
+        """Build a foreman-maintain command based on the options passed
+
+        Builders pass their subcommand explicitly instead of storing it on the
+        class, so commands can be built concurrently from several threads.
+        """
+        if options is None:
+            options = {}
+        kind, frozen = _freeze(options)
+        read_only = command_sub in cls.read_only
+        # the calling builder, reported by testfm.timing
+        builder = f"{cls.__name__}.{sys._getframe(1).f_code.co_name}"
+        try:
+            return _render(cls.command_base, command_sub, kind, frozen, read_only, builder)
+        except TypeError:
+            # unhashable option values, build it without memoizing
+            return Command(cls.command_base, command_sub, _argv(kind, frozen), read_only, builder)
+
+    @classmethod
+    def parse(cls, output, labels=None):
+        """Parse foreman-maintain output into :class:`testfm.steps.Step` records
+
+        Usage::
+
+            contacted = ansible_module.command(Health.check({"label": "server-ping"}))
+            for result in contacted.values():
+                steps = Health.parse(result["stdout"])
+                assert [step.status for step in steps] == ["OK"]
+
+        @param labels: optional mapping of step descriptions to labels
+        """
+        return parse_steps(output, labels)
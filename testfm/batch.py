@@ -0,0 +1,114 @@
+"""Run a sequence of commands on a host as one remote script.
+
+Fixtures often run several commands in a row, each paying a full ansible
+task. :class:`Batch` collects the commands with the return codes expected from
+each step and ships them as a single shell script, so the whole sequence costs
+one round-trip::
+
+    from testfm.batch import Batch
+
+    batch = (
+        Batch()
+        .add(f"{Packages.is_locked()} && PKGS_LOCKED=1", rc=None)
+        .add(f'[ -z "$PKGS_LOCKED" ] || {Packages.unlock()}')
+        .add("yum -y install zsh")
+    )
+    for steps in batch.run(ansible_module).values():
+        assert all(step.ok for step in steps), steps
+
+Steps run in the same shell, one after the other, so shell variables set by a
+step are visible in the following ones (and a step calling ``exit`` ends the
+script). Running stops at the first step whose return code is not expected,
+the remaining steps are reported with rc None.
+"""
+import base64
+import shlex
+from collections import namedtuple
+
+from testfm.remote import phase
+
+MARKER = "@@testfm-step"
+
+StepResult = namedtuple("StepResult", ["command", "rc", "stdout", "stderr", "ok"])
+StepResult.__doc__ = "Outcome of one :class:`Batch` step, rc is None if it did not run"
+
+STEP_FUNCTION = f"""__testfm_step() {{
+    __testfm_out=$(mktemp) && __testfm_err=$(mktemp) || return 127
+    eval "$2" >"$__testfm_out" 2>"$__testfm_err" </dev/null
+    __testfm_rc=$?
+    __testfm_o=$(base64 -w0 <"$__testfm_out")
+    __testfm_e=$(base64 -w0 <"$__testfm_err")
+    rm -f "$__testfm_out" "$__testfm_err"
+    printf '\\n{MARKER} %s %s %s %s\\n' "$1" "$__testfm_rc" "${{__testfm_o:--}}" \\
+        "${{__testfm_e:--}}"
+    return $__testfm_rc
+}}
+"""
+
+
+def _decode(field):
+    if field == "-":
+        return ""
+    return base64.b64decode(field).decode("utf-8", "replace").rstrip("\n")
+
+
+class Batch:
+    """Sequence of commands with per-step return code expectations"""
+
+    def __init__(self):
+        self.steps = []
+
+    def add(self, command, rc=0):
+        """Append command, expecting return code rc
+
+        @param command: shell command line, a builder's command for example
+        @param rc: expected return code, a collection of them, or None for any
+        """
+        if rc is not None and not isinstance(rc, int):
+            rc = tuple(rc)
+        self.steps.append((str(command), rc))
+        return self
+
+    @staticmethod
+    def _expected(rc, expected):
+        if expected is None:
+            return True
+        if isinstance(expected, int):
+            return rc == expected
+        return rc in expected
+
+    def script(self):
+        """Return the shell script running all steps"""
+        lines = [STEP_FUNCTION]
+        for index, (command, expected) in enumerate(self.steps):
+            call = f"__testfm_step {index} {shlex.quote(command)}"
+            if expected is None:
+                lines.append(call)
+            else:
+                codes = (expected,) if isinstance(expected, int) else expected
+                allowed = " ".join(str(code) for code in codes)
+                lines.append(f'{call}; case " {allowed} " in *" $? "*) ;; *) exit 0 ;; esac')
+        lines.append("exit 0")
+        return "\n".join(lines)
+
+    def parse(self, stdout):
+        """Return a :class:`StepResult` for every step from the output of :meth:`script`"""
+        done = {}
+        for line in stdout.splitlines():
+            if line.startswith(f"{MARKER} "):
+                _, index, rc, out, err = line.split(" ")
+                done[int(index)] = (int(rc), _decode(out), _decode(err))
+        results = []
+        for index, (command, expected) in enumerate(self.steps):
+            if index in done:
+                rc, out, err = done[index]
+                results.append(StepResult(command, rc, out, err, self._expected(rc, expected)))
+            else:
+                results.append(StepResult(command, None, "", "", False))
+        return results
+
+    def run(self, ansible_module):
+        """Run the batch through ansible_module, return step results for each contacted host"""
+        contacted = ansible_module.shell(self.script())
+        with phase("parse"):
+            return {host: self.parse(result["stdout"]) for host, result in contacted.items()}
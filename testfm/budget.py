@@ -0,0 +1,127 @@
+"""Fail tests making more remote calls, or spending more time in them, than allowed.
+
+Tests declare their budget with :func:`testfm.decorators.remote_budget`::
+
+    @remote_budget(calls=5, seconds=60)
+    def test_positive_check_hammer_ping():
+        # test code continues here
+
+and ``--remote-budget-calls`` and ``--remote-budget-seconds`` set a default
+for the tests without one. A :mod:`testfm.remote` middleware counts the calls
+made by the test and its function scoped fixtures while they are set up; the
+call going over the budget raises :class:`BudgetExceeded`, listing every call
+made. Calls of module and session fixtures are not counted, as they depend on
+which tests run first, nor are teardown calls, which cannot be told apart from
+those of shared fixtures finishing after the test.
+"""
+import time
+
+import pytest
+
+from testfm.remote import redact
+from testfm.remote import register
+from testfm.timing import context
+
+
+class BudgetExceeded(AssertionError):
+    """A test went over its remote call budget"""
+
+
+class Budget:
+    """Middleware holding the remote calls of the running test to its budget"""
+
+    def __init__(self):
+        self.calls = None
+        self.seconds = None
+        self.made = []
+
+    def start(self, calls=None, seconds=None):
+        """Hold the next calls to a budget, None for no limit"""
+        self.calls = calls
+        self.seconds = seconds
+        self.made = []
+
+    def stop(self):
+        """Stop counting calls"""
+        self.start()
+
+    @property
+    def counting(self):
+        """Whether calls made now count, they do outside of shared fixtures"""
+        if self.calls is None and self.seconds is None:
+            return False
+        if context.when not in ("setup", "call"):
+            return False
+        return context.scope in (None, "function")
+
+    def spent(self):
+        """Seconds spent in the calls made so far"""
+        return sum(duration for _, duration in self.made)
+
+    def exceeded(self, why):
+        """Return the :class:`BudgetExceeded` error listing the calls made"""
+        lines = [f"Remote call budget exceeded: {why}"]
+        for index, (call, duration) in enumerate(self.made, 1):
+            command = call.command if call.command is not None else f"{call.module} {call.args}"
+            lines.append(f"  {index}. {call.host}: {redact(str(command))} ({duration:.2f}s)")
+        return BudgetExceeded("\n".join(lines))
+
+    def __call__(self, call, proceed):
+        if not self.counting:
+            return proceed()
+        if self.calls is not None and len(self.made) >= self.calls:
+            self.made.append((call, 0.0))
+            raise self.exceeded(f"more than {self.calls} calls")
+        start = time.perf_counter()
+        try:
+            result = proceed()
+        finally:
+            self.made.append((call, time.perf_counter() - start))
+        if self.seconds is not None and self.spent() > self.seconds:
+            raise self.exceeded(f"{self.spent():.2f}s spent, more than {self.seconds}s")
+        return result
+
+
+budget = Budget()
+
+
+def pytest_addoption(parser):
+    """Add the default budget options"""
+    parser.addoption(
+        "--remote-budget-calls",
+        metavar="N",
+        type=int,
+        help="Fail tests without a remote_budget marker making more than N remote calls",
+    )
+    parser.addoption(
+        "--remote-budget-seconds",
+        metavar="S",
+        type=float,
+        help="Fail tests without a remote_budget marker spending over S seconds in remote calls",
+    )
+
+
+def pytest_configure(config):
+    """Enforce the budgets"""
+    register(budget)
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_setup(item):
+    """Hold the test to the budget of its marker, or to the default one"""
+    marker = item.get_closest_marker("remote_budget")
+    if marker is not None:
+        budget.start(marker.kwargs.get("calls"), marker.kwargs.get("seconds"))
+    else:
+        budget.start(
+            item.config.getoption("remote_budget_calls"),
+            item.config.getoption("remote_budget_seconds"),
+        )
+    yield
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_teardown(item, nextitem):
+    """Stop counting once the test ran"""
+    budget.stop()
+    yield
@@ -0,0 +1,99 @@
+"""Session cache of read-only command results.
+
+Builders mark the subcommands which only report state, like ``health list``
+or ``service list``, in their ``read_only`` attribute (see
+:class:`testfm.base.Base`). :class:`ResultCache` is a :mod:`testfm.remote`
+middleware answering repeated read-only calls from memory. Any other call made
+on a host, like ``service stop``, ``packages lock``, an ansible ``yum`` task
+or a plain shell command, may change what those commands report, so it drops
+the results cached for that host.
+
+``tests/conftest.py`` registers :data:`read_cache` unless pytest is run with
+``--no-read-cache`` or ``--shared-host``, as a worker cannot see the changes
+made by the others sharing its host. It is registered outermost, so the
+calls it answers are not counted by budgets, timings or fixture costs.
+"""
+import threading
+
+from testfm.base import Command
+from testfm.executor import default_executor
+
+# ansible modules which only gather information
+READ_ONLY_MODULES = ("find", "package_facts", "ping", "service_facts", "setup", "slurp", "stat")
+
+
+def is_read_only(call):
+    """Return whether a :class:`testfm.remote.Call` runs a read-only builder command"""
+    command = call.command
+    return isinstance(command, Command) and command.read_only
+
+
+class ResultCache:
+    """Results of read-only calls per host, flushed by any other call on that host
+
+    @param executor: executor used to expand host patterns, the shared one by default
+    """
+
+    def __init__(self, executor=None):
+        self.executor = executor
+        self.hits = 0
+        self.misses = 0
+        self._results = {}
+        self._hosts = {}
+        self._flushes = 0
+        self._lock = threading.Lock()
+
+    def _expand(self, pattern):
+        """Return the hosts matched by pattern, which may be a host name itself"""
+        hosts = self._hosts.get(pattern)
+        if hosts is None:
+            hosts = {pattern}
+            try:
+                hosts.update((self.executor or default_executor()).hosts(pattern))
+            except (OSError, ValueError):
+                pass
+            self._hosts[pattern] = hosts
+        return hosts
+
+    @staticmethod
+    def _key(call):
+        # the API making the call decides the result type, like Result for executor runs
+        args = repr((call.args[1:], sorted(call.kwargs.items())))
+        return call.via, call.module, str(call.command), args
+
+    def flush(self, pattern=None):
+        """Drop cached results of hosts matching pattern, or of all hosts"""
+        with self._lock:
+            self._flushes += 1
+            if pattern is None:
+                self._results.clear()
+                return
+            hosts = self._expand(pattern)
+            for cached in list(self._results):
+                if hosts & self._expand(cached):
+                    del self._results[cached]
+
+    def __call__(self, call, proceed):
+        if not is_read_only(call):
+            try:
+                return proceed()
+            finally:
+                if call.module not in READ_ONLY_MODULES:
+                    self.flush(call.host)
+        key = self._key(call)
+        with self._lock:
+            results = self._results.get(call.host, {})
+            if key in results:
+                self.hits += 1
+                return results[key]
+            self.misses += 1
+            flushes = self._flushes
+        result = proceed()
+        with self._lock:
+            # a result racing with a flush may already be stale
+            if flushes == self._flushes:
+                self._results.setdefault(call.host, {})[key] = result
+        return result
+
+
+read_cache = ResultCache()
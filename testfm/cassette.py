@@ -0,0 +1,301 @@
+"""Record the remote calls of every test, and replay them without a server.
+
+With ``--cassette-mode record`` every remote call made through
+:mod:`testfm.remote` is written, with its result, to a gzipped JSON cassette
+per test in ``--cassette-dir`` (``cassettes`` by default)::
+
+    pytest --cassette-mode record --ansible-inventory testfm/inventory ... tests/
+
+With ``--cassette-mode replay`` the results are served from the cassettes and
+nothing is run, so changes to test logic, fixtures and parsers can be checked
+without a Satellite. Calls are keyed by the API making them and the
+normalized command line, which for foreman-maintain is the command built by
+``Base._construct_command``; other ansible modules, :mod:`testfm.hammer` API
+requests and hammer commands are keyed by their arguments. Dates in keys are
+masked, so a cassette recorded on another day still matches. A command made
+several times replays its results in the recorded order, the last one being
+repeated.
+
+Names made with :mod:`random`, like fauxfactory's ``gen_string()``, end up in
+commands. In both modes :mod:`random` is seeded with ``session`` before the
+tests are collected and with the node id of each test before it runs, so a
+test replays the names it recorded.
+
+Calls made outside of a test or by module and session fixtures go to a
+shared ``session`` cassette, as they run for whichever test comes first. A
+call missing from the cassette of a test is looked up in the session cassette,
+and :class:`CassetteError` is raised if it is not there either.
+
+Host facts are neither read from nor written to their file in either mode, so
+the facts query is recorded and replayed like any other call. Downloads made
+by the controller itself, like :mod:`testfm.artifacts`, are not remote calls
+and need their cache filled when replaying offline.
+"""
+import gzip
+import json
+import os
+import random
+import re
+import shlex
+
+import pytest
+from pytest_ansible.results import AdHocResult
+
+from testfm.executor import Result
+from testfm.executor import StreamResult
+from testfm.facts import cache as facts_cache
+from testfm.log import logger
+from testfm.remote import redact
+from testfm.remote import register
+from testfm.steps import Step
+from testfm.timing import context
+
+MODES = ("record", "replay")
+DEFAULT_DIR = "cassettes"
+SESSION = "session"
+SUFFIX = ".json.gz"
+DATES = re.compile(r"\b\d{4}-\d{2}-\d{2}(?:[ T]\d{2}:\d{2}(?::\d{2})?)?\b")
+
+
+class CassetteError(Exception):
+    """A call cannot be recorded or replayed"""
+
+
+def normalize(command):
+    """Return command, an argv list or a command line, as a command line with single spaces"""
+    if not isinstance(command, str):
+        command = " ".join(shlex.quote(str(arg)) for arg in command)
+    return " ".join(command.split())
+
+
+def key_of(call):
+    """Return the cassette key of a :class:`testfm.remote.Call`, with dates and secrets masked"""
+    if call.command is not None:
+        key = f"{call.via} {call.module}: {normalize(call.command)}"
+    else:
+        arguments = json.dumps([call.args, call.kwargs], sort_keys=True, default=str)
+        key = f"{call.via} {call.module}: {arguments}"
+    return DATES.sub("<date>", redact(key))
+
+
+def encode(result):
+    """Return result as a JSON serializable dict, tagged with its type"""
+    if isinstance(result, StreamResult):
+        return {
+            "type": "stream",
+            "rc": result.rc,
+            "steps": [list(step) for step in result.steps],
+            "aborted": list(result.aborted) if result.aborted is not None else None,
+            "stderr": result.stderr,
+        }
+    if isinstance(result, Result):
+        return {"type": "result", "rc": result.rc, "stdout": result.stdout, "stderr": result.stderr}
+    if isinstance(result, AdHocResult):
+        contacted = {host: dict(value) for host, value in result.contacted.items()}
+        return {"type": "ansible", "contacted": contacted}
+    if isinstance(result, str):
+        return {"type": "text", "text": result}
+    if result is None or isinstance(result, (dict, list)):
+        return {"type": "json", "value": result}
+    raise CassetteError(f"Cannot record a {type(result).__name__} result")
+
+
+def decode(data):
+    """Return the result encoded by :func:`encode`"""
+    kind = data["type"]
+    if kind == "stream":
+        aborted = Step(*data["aborted"]) if data["aborted"] is not None else None
+        return StreamResult(
+            data["rc"], [Step(*step) for step in data["steps"]], aborted, data["stderr"]
+        )
+    if kind == "result":
+        return Result(data["rc"], data["stdout"], data["stderr"])
+    if kind == "ansible":
+        return AdHocResult(contacted=data["contacted"])
+    if kind == "text":
+        return data["text"]
+    if kind == "json":
+        return data["value"]
+    raise CassetteError(f"Unknown result type {kind}")
+
+
+def _redacted(value):
+    """Return an encoded result with the secrets of its strings masked"""
+    if isinstance(value, str):
+        return redact(value)
+    if isinstance(value, dict):
+        return {key: _redacted(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_redacted(item) for item in value]
+    return value
+
+
+class Cassette:
+    """Recorded calls of one test, or of the session
+
+    @param path: gzipped JSON file of the cassette
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.calls = []
+        self._results = None
+        self._replayed = {}
+
+    def load(self):
+        """Read the calls of the cassette file, return self"""
+        try:
+            with gzip.open(self.path, "rt") as handle:
+                self.calls = json.load(handle)["calls"]
+        except FileNotFoundError:
+            self.calls = []
+        except (OSError, ValueError, KeyError) as err:
+            raise CassetteError(f"Cannot read cassette {self.path}: {err}")
+        self._results = None
+        return self
+
+    def save(self):
+        """Write the calls to the cassette file, removing it if there are none"""
+        if not self.calls:
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with gzip.open(self.path, "wt") as handle:
+            json.dump({"calls": self.calls}, handle, separators=(",", ":"), default=str)
+
+    def record(self, call, result):
+        """Add a call and its result"""
+        encoded = encode(result)
+        # the type tag is no secret, and a short password could spell part of it
+        result = {key: _redacted(value) for key, value in encoded.items() if key != "type"}
+        result["type"] = encoded["type"]
+        entry = {"key": key_of(call), "host": call.host, "result": result}
+        self.calls.append(entry)
+
+    def results(self, key):
+        """Return the recorded results of key, in order"""
+        if self._results is None:
+            self._results = {}
+            for entry in self.calls:
+                self._results.setdefault(entry["key"], []).append(entry["result"])
+        return self._results.get(key, [])
+
+    def replay(self, key):
+        """Return the next recorded result of key, None if it was not recorded"""
+        results = self.results(key)
+        if not results:
+            return None
+        index = self._replayed.get(key, 0)
+        self._replayed[key] = index + 1
+        return decode(results[min(index, len(results) - 1)])
+
+
+class Cassettes:
+    """Middleware recording calls to, or replaying them from, the cassettes of a directory
+
+    @param directory: directory of the cassette files
+    @param mode: ``record`` or ``replay``
+    """
+
+    def __init__(self, directory=DEFAULT_DIR, mode="replay"):
+        self.directory = directory
+        self.mode = mode
+        self.test = None
+        self.session = Cassette(self.path(SESSION))
+        if mode == "replay":
+            self.session.load()
+
+    def path(self, name):
+        """Return the cassette file of test node id name"""
+        return os.path.join(self.directory, re.sub(r"[^\w.-]+", "_", name) + SUFFIX)
+
+    def start(self, nodeid):
+        """Use the cassette of test nodeid"""
+        self.test = Cassette(self.path(nodeid))
+        if self.mode == "replay":
+            self.test.load()
+
+    def stop(self):
+        """Save the cassette of the test when recording, and stop using it"""
+        if self.mode == "record" and self.test is not None:
+            self.test.save()
+        self.test = None
+
+    def close(self):
+        """Save the session cassette when recording"""
+        if self.mode == "record":
+            self.session.save()
+
+    def current(self):
+        """Return the cassette of calls made now, the session one out of function scope"""
+        if self.test is None or context.scope not in (None, "function"):
+            return self.session
+        return self.test
+
+    def _lookup(self, key):
+        for cassette in (self.test, self.session):
+            if cassette is not None and cassette.results(key):
+                return cassette.replay(key)
+        test = context.nodeid or "the session"
+        raise CassetteError(f"No recorded result of '{key}' for {test}")
+
+    def __call__(self, call, proceed):
+        key = key_of(call)
+        if self.mode == "replay":
+            return self._lookup(key)
+        result = proceed()
+        try:
+            self.current().record(call, result)
+        except CassetteError as err:
+            logger.warning(f"Not recording '{key}': {err}")
+        return result
+
+
+cassettes = None
+
+
+def pytest_addoption(parser):
+    """Add the cassette options"""
+    parser.addoption(
+        "--cassette-mode",
+        choices=MODES,
+        help="Record the remote calls of every test, or replay them without contacting hosts",
+    )
+    parser.addoption(
+        "--cassette-dir",
+        metavar="DIR",
+        default=DEFAULT_DIR,
+        help=f"Directory of the cassettes ({DEFAULT_DIR} by default)",
+    )
+
+
+@pytest.hookimpl(trylast=True)
+def pytest_configure(config):
+    """Record or replay, after the other middlewares so they see replayed calls too"""
+    global cassettes
+    mode = config.getoption("cassette_mode")
+    if mode:
+        cassettes = Cassettes(config.getoption("cassette_dir"), mode)
+        register(cassettes)
+        random.seed(SESSION)
+        # facts cached on disk by the recording run would skip the recorded query
+        facts_cache.path = None
+        facts_cache.invalidate()
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_protocol(item, nextitem):
+    """Use the cassette of the test while it runs, making the same random names as recorded"""
+    if cassettes is not None:
+        cassettes.start(item.nodeid)
+        random.seed(item.nodeid)
+    yield
+    if cassettes is not None:
+        cassettes.stop()
+
+
+def pytest_sessionfinish(session, exitstatus):
+    """Save the session cassette"""
+    if cassettes is not None:
+        cassettes.close()
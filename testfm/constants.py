@@ -1,13 +1,16 @@
 from testfm import settings
+from testfm.remote import secret
 
 RHN_USERNAME = settings.subscription.rhn_username
-RHN_PASSWORD = settings.subscription.rhn_password
+RHN_PASSWORD = secret(settings.subscription.rhn_password)
 FM_RHN_POOLID = settings.subscription.fm_rhn_poolid
 DOGFOOD_ORG = settings.subscription.dogfood_org
 DOGFOOD_ACTIVATIONKEY = settings.subscription.dogfood_activationkey
 CAPSULE_DOGFOOD_ACTIVATIONKEY = settings.subscription.capsule_dogfood_activationkey
 DOGFOOD_URL = settings.subscription.dogfood_url
 HOTFIX_URL = settings.testfm.hotfix_url
+FOREMAN_USERNAME = settings.testfm.get("foreman_username", "admin")
+FOREMAN_PASSWORD = secret(settings.testfm.get("foreman_password", "changeme"))
 REPOS_HOSTING_URL = settings.robottelo.repos_hosting_url
 FAKE_YUM0_REPO = f"{REPOS_HOSTING_URL}/fake_yum0/"
 
@@ -115,5 +118,13 @@ cap_repos = {
 }
 foreman_maintain_yml = "/etc/foreman-maintain/foreman_maintain.yml"
 epel_repo = "https://dl.fedoraproject.org/pub/epel/epel-release-latest-7.noarch.rpm"
+# pip and wheels for the python 3.6 of el7 hosts, installed without an index
+get_pip_url = "https://bootstrap.pypa.io/pip/3.6/get-pip.py"
+pexpect_wheels = [
+    "https://files.pythonhosted.org/packages/py3/p/pip/pip-21.3.1-py3-none-any.whl",
+    "https://files.pythonhosted.org/packages/py2.py3/p/pexpect/pexpect-4.8.0-py2.py3-none-any.whl",
+    "https://files.pythonhosted.org/packages/py2.py3/p/ptyprocess/"
+    "ptyprocess-0.7.0-py2.py3-none-any.whl",
+]
 satellite_answer_file = "/etc/foreman-installer/scenarios.d/satellite-answers.yaml"
 fm_hammer_yml = "/etc/foreman-maintain/foreman-maintain-hammer.yml"
@@ -0,0 +1,220 @@
+"""Checkpoints of the server databases, to undo destructive tests in seconds.
+
+Restore, offline backup or ``foreman-tasks-delete`` tests change the foreman
+and candlepin databases for good. With ``--db-checkpoint`` this plugin copies
+every database of :data:`DATABASES` present on the server into a template
+database when the session starts; a capsule has none of them and gets no
+checkpoint. After each test marked ``@pytest.mark.destructive`` the databases
+are dropped and created again from their templates with ``CREATE DATABASE ...
+TEMPLATE``, a file level copy made by postgres itself. The templates are
+dropped when the session ends.
+
+Copying a database needs it to have no connections, so services other than
+postgres are stopped around checkpoints and restorations. They are made
+holding the exclusive server lock of :mod:`testfm.resources`, which tests
+marked destructive hold too. Workers sharing a server (``--shared-host``)
+would still checkpoint it once each, so the option refuses to run with them.
+
+:class:`DBCheckpoint` can be tried against a throwaway local postgres, leaving
+services alone::
+
+    from testfm.dbcheckpoint import DBCheckpoint
+    from testfm.executor import Executor
+    from testfm.executor import LocalTransport
+
+    executor = Executor(transport=LocalTransport)
+    checkpoint = DBCheckpoint(
+        ["scratch"], executor, "localhost", psql="psql -h /tmp -d postgres", stop=None, start=None
+    )
+    checkpoint.create()
+    checkpoint.restore()
+"""
+import shlex
+
+import pytest
+
+from testfm.executor import default_executor
+from testfm.log import logger
+from testfm.resources import lock_dir
+from testfm.resources import locked
+from testfm.resources import SERVER
+from testfm.service import Service
+
+DATABASES = ("foreman", "candlepin")
+TEMPLATE_SUFFIX = "_testfm_checkpoint"
+PSQL = "runuser -u postgres -- psql -d postgres"
+STOP_SERVICES = Service.service_stop({"exclude": "postgresql,rh-postgresql12-postgresql"})
+START_SERVICES = Service.service_start()
+SQL_EOF = "@@testfm-sql-eof"
+
+
+class CheckpointError(Exception):
+    """Creating or restoring a database checkpoint failed"""
+
+
+def _literal(value):
+    return "'" + value.replace("'", "''") + "'"
+
+
+def _identifier(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _disconnect(databases):
+    """Return the statement closing the connections to databases left by stopped services"""
+    names = ", ".join(_literal(name) for name in databases)
+    return (
+        "SELECT count(pg_terminate_backend(pid)) FROM pg_stat_activity "
+        f"WHERE datname IN ({names}) AND pid <> pg_backend_pid()"
+    )
+
+
+class DBCheckpoint:
+    """Template database copies of the server databases
+
+    @param databases: names of the databases to checkpoint
+    @param executor: executor reaching the server, the shared one by default
+    @param host: server, the default host of executor by default
+    @param psql: command line running psql as a superuser, SQL comes on its standard input
+    @param stop: command stopping the services connected to the databases, None to skip
+    @param start: command starting them again, None to skip
+    """
+
+    def __init__(
+        self,
+        databases=DATABASES,
+        executor=None,
+        host=None,
+        psql=PSQL,
+        stop=STOP_SERVICES,
+        start=START_SERVICES,
+    ):
+        self.databases = list(databases)
+        self.executor = executor
+        self.host = host
+        self.psql = psql
+        self.stop = stop
+        self.start = start
+        self.owners = None
+        self.restorations = 0
+
+    @staticmethod
+    def template(database):
+        """Return the name of the template database of database"""
+        return f"{database}{TEMPLATE_SUFFIX}"
+
+    def _run(self, statements, services=True):
+        """Run SQL statements one by one outside of a transaction, services stopped if asked"""
+        psql = f"{self.psql} -X -q -v ON_ERROR_STOP=1"
+        script = f"{psql} << '{SQL_EOF}'\n" + "".join(f"{sql};\n" for sql in statements) + SQL_EOF
+        if services and self.stop is not None:
+            # services come back even when psql fails
+            start = f"trap {shlex.quote(str(self.start))} EXIT; " if self.start else ""
+            script = f"{start}{self.stop} && {script}"
+        result = (self.executor or default_executor()).run(
+            f"sh -c {shlex.quote(script)}", self.host
+        )
+        if result.rc != 0:
+            raise CheckpointError(f"psql failed with {result.rc}: {result.stderr}")
+        return result.stdout
+
+    def _query_owners(self):
+        names = ", ".join(_literal(name) for name in self.databases)
+        output = self._run(
+            [
+                r"\pset format unaligned",
+                r"\pset tuples_only on",
+                "SELECT datname, pg_get_userbyid(datdba) FROM pg_database "
+                f"WHERE datname IN ({names})",
+            ],
+            services=False,
+        )
+        owners = dict(line.split("|", 1) for line in output.splitlines() if "|" in line)
+        missing = [name for name in self.databases if name not in owners]
+        if missing:
+            logger.info(f"Not checkpointing the missing databases {', '.join(missing)}")
+        return owners
+
+    def create(self):
+        """Copy the databases present on the server into their templates, replacing older ones"""
+        self.owners = self._query_owners()
+        if not self.owners:
+            return
+        statements = [_disconnect(self.owners)]
+        for name in self.owners:
+            template = _identifier(self.template(name))
+            statements += [
+                f"DROP DATABASE IF EXISTS {template}",
+                f"CREATE DATABASE {template} TEMPLATE {_identifier(name)}",
+            ]
+        self._run(statements)
+
+    def restore(self):
+        """Create the databases again from their templates"""
+        if self.owners is None:
+            raise CheckpointError("No checkpoint to restore, call create() first")
+        if not self.owners:
+            return
+        statements = [_disconnect(self.owners)]
+        for name in self.owners:
+            statements += [
+                f"DROP DATABASE IF EXISTS {_identifier(name)}",
+                f"CREATE DATABASE {_identifier(name)} TEMPLATE "
+                f"{_identifier(self.template(name))} OWNER {_identifier(self.owners[name])}",
+            ]
+        self._run(statements)
+        self.restorations += 1
+
+    def drop(self):
+        """Drop the templates"""
+        statements = [
+            f"DROP DATABASE IF EXISTS {_identifier(self.template(name))}"
+            for name in self.owners or ()
+        ]
+        if statements:
+            self._run(statements, services=False)
+        self.owners = None
+
+
+checkpoint = None
+
+
+def pytest_addoption(parser):
+    """Add the checkpoint option"""
+    parser.addoption(
+        "--db-checkpoint",
+        action="store_true",
+        help="Copy the server databases at session start and restore them after tests "
+        "marked destructive",
+    )
+
+
+def pytest_configure(config):
+    """Refuse to checkpoint a server other workers are testing"""
+    if config.getoption("db_checkpoint") and config.getoption("shared_host"):
+        raise pytest.UsageError("--db-checkpoint cannot be used with --shared-host")
+
+
+def pytest_sessionstart(session):
+    """Take the checkpoint"""
+    global checkpoint
+    if session.config.getoption("db_checkpoint") and not session.config.getoption("collectonly"):
+        checkpoint = DBCheckpoint()
+        with locked(lock_dir(session.config), [(SERVER, True)]):
+            checkpoint.create()
+
+
+@pytest.hookimpl(trylast=True)
+def pytest_runtest_teardown(item, nextitem):
+    """Restore the databases once a destructive test is torn down, under its server lock"""
+    if checkpoint is not None and item.get_closest_marker("destructive"):
+        checkpoint.restore()
+
+
+def pytest_sessionfinish(session, exitstatus):
+    """Drop the templates"""
+    global checkpoint
+    if checkpoint is not None:
+        with locked(lock_dir(session.config), [(SERVER, True)]):
+            checkpoint.drop()
+        checkpoint = None
@@ -1,8 +1,25 @@
+"""Decorators used by TestFM tests.
+
+The version and server decorators only attach pytest markers. They are
+resolved once per session in :func:`pytest_collection_modifyitems` (this
+module is loaded as a pytest plugin by ``tests/conftest.py``), so importing or
+collecting tests does not contact the server.
+"""
 import pytest
 import unittest2
 
-from testfm.helpers import product
-from testfm.helpers import server
+from testfm.facts import host_facts
+
+VERSION_MARKERS = ("run_only_on", "starts_in", "ends_in", "run_only_on_server")
+RESOURCES = (
+    "foreman_maintain_yml",
+    "hammer",
+    "maintenance_mode",
+    "packages",
+    "services",
+    "tasks",
+    "yum_repos",
+)
 
 
 def stubbed(reason=None):
@@ -10,6 +27,14 @@ def stubbed(reason=None):
     return unittest2.skip(reason)(pytest.mark.stubbed(reason))
 
 
+def version_tuple(version):
+    """Return a comparable tuple of a version, like (6, 10) for '6.10' or '6.10.1'
+
+    Pass versions as strings: the float 6.10 is the same number as 6.1.
+    """
+    return tuple(int(part) for part in str(version).split(".")[:2])
+
+
 def run_only_on(*server_version):
     """Decorator to skip tests based on server version.
 
@@ -23,15 +48,10 @@ def run_only_on(*server_version):
         def test_health_check():
             # test code continues here
 
-    :param str server_version: Enter '6.8', 6.7', '6.6', '6.5', '6.4' and '6.3'
+    :param str server_version: Enter '6.10', '6.9', '6.8', 6.7', '6.6', '6.5', '6.4' and '6.3'
     for specific version
     """
-    prd_version = product()
-    return pytest.mark.skipif(
-        prd_version not in server_version,
-        reason="Server version is '{}' and this test will run only "
-        "on '{}' version".format(prd_version, server_version),
-    )
+    return pytest.mark.run_only_on(*server_version)
 
 
 def starts_in(version):
@@ -43,18 +63,14 @@ def starts_in(version):
 
         from TestFM.decorators import starts_in
 
-        @starts_in(6.6)
+        @starts_in('6.6')
         def test_health_check():
             # test code continues here
 
-    :param float version: Enter 6.8, 6.7, 6.6, 6.5, 6.4 and 6.3
+    :param str version: Enter '6.10', '6.9', '6.8', '6.7', '6.6', '6.5', '6.4' and '6.3'
     for specific version
     """
-    return pytest.mark.skipif(
-        float(product()) < version,
-        reason="Server version is '{}' and this test will run only "
-        "on {} '{}' onward".format(product(), server(), version),
-    )
+    return pytest.mark.starts_in(version)
 
 
 def ends_in(version):
@@ -66,15 +82,140 @@ def ends_in(version):
 
         from TestFM.decorators import ends_in
 
-        @ends_in(6.6)
+        @ends_in('6.6')
         def test_health_check():
             # test code continues here
 
-    :param float version: Enter 6.7, 6.6, 6.5 , 6.4 , 6.3 , 6.2 and 6.1
+    :param str version: Enter '6.9', '6.8', '6.7', '6.6', '6.5', '6.4', '6.3', '6.2' and '6.1'
     for specific version
     """
-    return pytest.mark.skipif(
-        float(product()) > version,
-        reason="Server version is '{}' and this test will run only "
-        "on {} <= '{}'".format(product(), server(), version),
-    )
+    return pytest.mark.ends_in(version)
+
+
+def run_only_on_server(*servers):
+    """Decorator to select tests based on server type.
+
+    Usage:
+
+    To run a test only on Capsule servers::
+
+        from TestFM.decorators import run_only_on_server
+
+        @run_only_on_server('capsule')
+        def test_capsule_repositories_setup():
+            # test code continues here
+
+    :param str servers: Enter 'satellite' and/or 'capsule'
+    """
+    return pytest.mark.run_only_on_server(*servers)
+
+
+def uses(*resources):
+    """Decorator to declare the server resources a test reads or changes.
+
+    Usage:
+
+    To let a test run next to other tests only reading services::
+
+        from TestFM.decorators import uses
+
+        @uses("services:read", "foreman_maintain_yml:read")
+        def test_service_status():
+            # test code continues here
+
+    Tests sharing a server run at the same time unless one of them writes a
+    resource another one uses, see :mod:`testfm.resources`. Tests without this
+    decorator are assumed to change anything and run alone.
+
+    :param str resources: '<resource>:read' or '<resource>:write', where resource is one
+    of :data:`RESOURCES`
+    """
+    for resource in resources:
+        name, _, access = resource.partition(":")
+        if name not in RESOURCES or access not in ("read", "write"):
+            raise ValueError(
+                f"Unknown resource '{resource}', use '<resource>:read' or '<resource>:write' "
+                f"with one of {RESOURCES}"
+            )
+    return pytest.mark.uses(*resources)
+
+
+def remote_budget(calls=None, seconds=None):
+    """Decorator to limit the remote calls of a test.
+
+    Usage:
+
+    To fail a test making more than five remote calls or spending more than a
+    minute in them::
+
+        from TestFM.decorators import remote_budget
+
+        @remote_budget(calls=5, seconds=60)
+        def test_positive_check_hammer_ping():
+            # test code continues here
+
+    Calls of the test and of its function scoped fixtures count, see
+    :mod:`testfm.budget`. The budget replaces the default one of
+    ``--remote-budget-calls`` and ``--remote-budget-seconds``.
+
+    :param int calls: maximum number of remote calls, None for no limit
+    :param float seconds: maximum time spent in remote calls, None for no limit
+    """
+    return pytest.mark.remote_budget(calls=calls, seconds=seconds)
+
+
+def skip_reason(item, facts):
+    """Return why item should be skipped on a server with facts, or None"""
+    version = version_tuple(facts.version)
+    marker = item.get_closest_marker("run_only_on")
+    if marker and facts.version not in [str(arg) for arg in marker.args]:
+        return (
+            f"Server version is '{facts.version}' and this test will run only "
+            f"on '{marker.args}' version"
+        )
+    marker = item.get_closest_marker("starts_in")
+    if marker and version < version_tuple(marker.args[0]):
+        return (
+            f"Server version is '{facts.version}' and this test will run only "
+            f"on {facts.role} '{marker.args[0]}' onward"
+        )
+    marker = item.get_closest_marker("ends_in")
+    if marker and version > version_tuple(marker.args[0]):
+        return (
+            f"Server version is '{facts.version}' and this test will run only "
+            f"on {facts.role} <= '{marker.args[0]}'"
+        )
+    marker = item.get_closest_marker("run_only_on_server")
+    if marker and facts.role not in marker.args:
+        return f"Server is {facts.role} and this test will run only on {marker.args}"
+    return None
+
+
+def pytest_configure(config):
+    """Register the markers set by the decorators"""
+    config.addinivalue_line("markers", "run_only_on(*versions): run only on these versions")
+    config.addinivalue_line("markers", "starts_in(version): run on this version onward")
+    config.addinivalue_line("markers", "ends_in(version): run up to this version")
+    config.addinivalue_line("markers", "run_only_on_server(*servers): satellite or capsule")
+    config.addinivalue_line("markers", "capsule: applies to capsules too, see testfm.runner")
+    config.addinivalue_line("markers", "uses(*resources): resources read or written by the test")
+    config.addinivalue_line("markers", "destructive: changes the databases, see --db-checkpoint")
+    config.addinivalue_line("markers", "remote_budget(calls, seconds): limit of remote calls")
+
+
+@pytest.hookimpl(trylast=True)
+def pytest_collection_modifyitems(config, items):
+    """Skip gated tests against the server facts, fetched once and only when needed
+
+    Runs after deselection, and not at all with ``--collect-only``.
+    """
+    if config.getoption("collectonly"):
+        return
+    gated = [item for item in items if any(item.get_closest_marker(m) for m in VERSION_MARKERS)]
+    if not gated:
+        return
+    facts = host_facts()
+    for item in gated:
+        reason = skip_reason(item, facts)
+        if reason:
+            item.add_marker(pytest.mark.skip(reason=reason))
@@ -0,0 +1,479 @@
+"""Persistent remote command execution for TestFM helpers.
+
+Running the ``ansible`` CLI for every helper call costs a Python interpreter
+start, inventory parsing and a fresh SSH handshake. :class:`Executor` instead
+keeps one transport per inventory host: an OpenSSH control master for real
+hosts, or :class:`LocalTransport` as a local stand-in.
+
+Usage::
+
+    from testfm.executor import Executor
+
+    executor = Executor("testfm/inventory")
+    result = executor.run(["rpm", "-q", "satellite"])
+    assert result.rc == 0
+
+Long foreman-maintain commands can be streamed instead: their steps are parsed
+while they run and the command is killed at the first fatal step::
+
+    result = executor.stream(Backup.run_online_backup(["-y", "/tmp/backup"]))
+    assert result.aborted is None, result.aborted.message
+"""
+import codecs
+import os
+import shlex
+import subprocess
+import tempfile
+import threading
+import time
+from collections import namedtuple
+
+from testfm.remote import Call
+from testfm.remote import dispatch
+from testfm.remote import phase
+from testfm.steps import StepParser
+
+DEFAULT_INVENTORY = "testfm/inventory"
+DEFAULT_PATTERN = "server"
+DEFAULT_USER = "root"
+FATAL_STATUSES = ("FAIL",)
+PGID_MARKER = "@@testfm-pgid"
+# connection variables SSHTransport cannot honour, see ssh_options()
+UNSUPPORTED_VARS = (
+    "ansible_password",
+    "ansible_ssh_pass",
+    "ansible_ssh_password",
+    "ansible_become_password",
+    "ansible_become_pass",
+    "ansible_ssh_executable",
+)
+
+Result = namedtuple("Result", ["rc", "stdout", "stderr"])
+Result.__doc__ = "Structured outcome of a command run through a transport"
+
+StreamResult = namedtuple("StreamResult", ["rc", "steps", "aborted", "stderr"])
+StreamResult.__doc__ = "Outcome of :meth:`Executor.stream`, aborted is the fatal step or None"
+
+Host = namedtuple("Host", ["name", "vars"])
+
+
+def _command_line(argv):
+    """Return argv as a single shell command line"""
+    if isinstance(argv, str):
+        return argv
+    return " ".join(shlex.quote(str(arg)) for arg in argv)
+
+
+class Inventory:
+    """Minimal reader of the INI inventory used by ``testfm/inventory``
+
+    Host variables are merged like ansible does: ``[all:vars]``, then the
+    ``[group:vars]`` of the groups the host is in (parents first), then the
+    variables of the host line.
+    """
+
+    def __init__(self, path=DEFAULT_INVENTORY):
+        self.path = path
+        self.groups = {}
+        self.children = {}
+        self.group_vars = {}
+        self._load()
+
+    def _load(self):
+        group, section = "ungrouped", None
+        host_lines = []
+        with open(self.path) as handle:
+            for line in handle:
+                line = line.split("#", 1)[0].strip()
+                if not line or line.startswith(";"):
+                    continue
+                if line.startswith("[") and line.endswith("]"):
+                    group, _, section = line[1:-1].partition(":")
+                    continue
+                if section == "vars":
+                    key, _, value = line.partition("=")
+                    # quoted values, like ssh arguments, lose their quotes as in host lines
+                    value = " ".join(shlex.split(value))
+                    self.group_vars.setdefault(group, {})[key.strip()] = value
+                elif section == "children":
+                    self.children.setdefault(group, []).append(line)
+                else:
+                    name, *pairs = shlex.split(line)
+                    host_vars = dict(pair.split("=", 1) for pair in pairs if "=" in pair)
+                    host_lines.append((group, name, host_vars))
+        for group, name, host_vars in host_lines:
+            merged = dict(self.group_vars.get("all", {}))
+            for ancestor in self._ancestors(group):
+                merged.update(self.group_vars.get(ancestor, {}))
+            merged.update(host_vars)
+            self.groups.setdefault(group, []).append(Host(name, merged))
+
+    def _ancestors(self, group):
+        """Return group and the groups it is a child of, outermost first"""
+        parents = [parent for parent, kids in self.children.items() if group in kids]
+        ancestors = []
+        for parent in parents:
+            ancestors += [name for name in self._ancestors(parent) if name not in ancestors]
+        return ancestors + [group]
+
+    def _members(self, group):
+        hosts = list(self.groups.get(group, []))
+        for child in self.children.get(group, []):
+            hosts += self._members(child)
+        return hosts
+
+    def hosts(self, pattern=DEFAULT_PATTERN):
+        """Return hosts matching a group name, a host name or ``all``"""
+        if pattern in self.groups or pattern in self.children:
+            members = self._members(pattern)
+        else:
+            members = [
+                host
+                for hosts in self.groups.values()
+                for host in hosts
+                if pattern in ("all", host.name)
+            ]
+        found = {}
+        for host in members:
+            found.setdefault(host.name, host)
+        return list(found.values())
+
+
+def _enabled(value):
+    return str(value).lower() in ("1", "true", "yes", "on")
+
+
+def ssh_options(name, host_vars, user=DEFAULT_USER):
+    """Return the :class:`SSHTransport` arguments of inventory host name with host_vars
+
+    Connection variables ansible would use but :class:`SSHTransport` cannot,
+    like passwords, raise ValueError instead of being ignored.
+    """
+    unsupported = sorted(set(host_vars) & set(UNSUPPORTED_VARS))
+    if unsupported:
+        raise ValueError(f"{name}: unsupported {', '.join(unsupported)}, use ssh keys")
+    connection = host_vars.get("ansible_connection", "ssh")
+    if connection not in ("ssh", "smart"):
+        raise ValueError(f"{name}: ansible_connection={connection} is not supported")
+    method = host_vars.get("ansible_become_method", "sudo")
+    if _enabled(host_vars.get("ansible_become", False)) and method != "sudo":
+        raise ValueError(f"{name}: ansible_become_method={method} is not supported")
+
+    def var(*names, default=None):
+        for key in names:
+            if key in host_vars:
+                return host_vars[key]
+        return default
+
+    ssh_args = []
+    for key in ("ansible_ssh_common_args", "ansible_ssh_extra_args"):
+        ssh_args += shlex.split(host_vars.get(key, ""))
+    become = None
+    if _enabled(host_vars.get("ansible_become", False)):
+        become = host_vars.get("ansible_become_user", "root")
+    return {
+        "host": var("ansible_host", "ansible_ssh_host", default=name),
+        "user": var("ansible_user", "ansible_ssh_user", default=user),
+        "port": var("ansible_port", "ansible_ssh_port"),
+        "identity_file": var("ansible_ssh_private_key_file", "ansible_private_key_file"),
+        "ssh_args": ssh_args,
+        "become": become,
+    }
+
+
+class LocalTransport:
+    """Run commands on the controller itself, a stand-in for a remote host"""
+
+    def __init__(self, host="localhost"):
+        self.host = host
+
+    def connect(self):
+        """Nothing to connect to"""
+
+    def popen(self, argv, **kwargs):
+        """Start argv and return the :class:`subprocess.Popen` object"""
+        return subprocess.Popen(_command_line(argv), shell=True, **kwargs)
+
+    def run(self, argv, timeout=None, input=None):
+        """Run argv, writing input to its standard input, and return :class:`Result`"""
+        proc = self.popen(
+            argv,
+            stdin=subprocess.PIPE if input is not None else subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            universal_newlines=True,
+        )
+        stdout, stderr = proc.communicate(input=input, timeout=timeout)
+        return Result(proc.returncode, stdout, stderr)
+
+    def close(self):
+        """Nothing to close"""
+
+
+class SSHTransport(LocalTransport):
+    """Run commands over a persistent OpenSSH control master connection
+
+    @param identity_file: private key, like ``ansible_ssh_private_key_file``
+    @param ssh_args: extra ssh arguments, like ``ansible_ssh_common_args``
+    @param become: user to run commands as with ``sudo``, like ``ansible_become_user``
+    @param multiplex: keep a control master, otherwise every command opens a connection
+    """
+
+    def __init__(
+        self,
+        host,
+        user=DEFAULT_USER,
+        port=None,
+        control_dir=None,
+        persist=600,
+        identity_file=None,
+        ssh_args=(),
+        become=None,
+        multiplex=True,
+    ):
+        super().__init__(host)
+        self.user = user
+        self.port = port
+        self.persist = persist
+        self.identity_file = identity_file
+        self.ssh_args = list(ssh_args)
+        self.become = become
+        self.multiplex = multiplex
+        self.control_dir = control_dir or tempfile.mkdtemp(prefix="testfm-ssh-")
+        self._connected = False
+        self._lock = threading.Lock()
+
+    def _ssh(self, *extra):
+        cmd = ["ssh", "-o", "BatchMode=yes"]
+        if self.multiplex:
+            cmd += [
+                "-o",
+                "ControlMaster=auto",
+                "-o",
+                f"ControlPath={os.path.join(self.control_dir, '%C')}",
+                "-o",
+                f"ControlPersist={self.persist}",
+            ]
+        else:
+            cmd += ["-o", "ControlPath=none"]
+        if self.port:
+            cmd += ["-p", str(self.port)]
+        if self.identity_file:
+            cmd += ["-i", os.path.expanduser(self.identity_file)]
+        return cmd + self.ssh_args + list(extra) + [f"{self.user}@{self.host}"]
+
+    def connected(self):
+        """Return whether the control master is up"""
+        check = subprocess.run(
+            self._ssh("-O", "check"), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        return check.returncode == 0
+
+    def connect(self):
+        """Start the control master, unless it is already running"""
+        if not self.multiplex:
+            return
+        with self._lock:
+            if not self._connected and not self.connected():
+                subprocess.run(self._ssh("-f", "-N"), check=True)
+            self._connected = True
+
+    def popen(self, argv, **kwargs):
+        """Start argv on the remote host and return the local ssh process"""
+        command = _command_line(argv)
+        if self.become:
+            command = f"sudo -n -H -u {shlex.quote(self.become)} -- sh -c {shlex.quote(command)}"
+        return subprocess.Popen(self._ssh() + ["--", command], **kwargs)
+
+    def close(self):
+        """Stop the control master"""
+        if not self.multiplex:
+            return
+        subprocess.run(
+            self._ssh("-O", "exit"), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        self._connected = False
+
+
+class Executor:
+    """Pool of persistent transports, one per inventory host
+
+    @param inventory: path to the ansible INI inventory
+    @param pattern: default host pattern, like the ``server`` group
+    @param user: remote user
+    @param transport: transport class (or factory), :class:`SSHTransport` or :class:`LocalTransport`
+    """
+
+    def __init__(
+        self,
+        inventory=DEFAULT_INVENTORY,
+        pattern=DEFAULT_PATTERN,
+        user=DEFAULT_USER,
+        transport=SSHTransport,
+    ):
+        self.inventory = inventory
+        self.pattern = pattern
+        self.user = user
+        self.transport = transport
+        self._transports = {}
+        self._lock = threading.Lock()
+
+    def hosts(self, pattern=None):
+        """Return names of inventory hosts matching pattern"""
+        return [host.name for host in Inventory(self.inventory).hosts(pattern or self.pattern)]
+
+    def default_host(self):
+        """Return the first host matching the default pattern"""
+        hosts = self.hosts()
+        if not hosts:
+            raise ValueError(f"No host matches '{self.pattern}' in {self.inventory}")
+        return hosts[0]
+
+    def transport_for(self, host=None):
+        """Return the pooled transport of host, starting it on first use"""
+        if host is None:
+            host = self.default_host()
+        with self._lock:
+            transport = self._transports.get(host)
+            if transport is None:
+                host_vars = {}
+                if self.transport is not LocalTransport:
+                    for item in Inventory(self.inventory).hosts(host):
+                        host_vars = item.vars
+                if (
+                    self.transport is LocalTransport
+                    or host_vars.get("ansible_connection") == "local"
+                ):
+                    transport = LocalTransport(host)
+                else:
+                    transport = self.transport(**ssh_options(host, host_vars, self.user))
+                self._transports[host] = transport
+        return transport
+
+    def run(self, argv, host=None, timeout=None, input=None):
+        """Run argv (a list or a shell command line) on host and return :class:`Result`
+
+        @param input: text written to the standard input of argv
+        """
+        if host is None:
+            host = self.default_host()
+        transport = self.transport_for(host)
+
+        def proceed():
+            with phase("connect"):
+                transport.connect()
+            with phase("exec"):
+                return transport.run(argv, timeout=timeout, input=input)
+
+        kwargs = {"input": input} if input is not None else {}
+        return dispatch(Call(host, "command", (argv,), kwargs, "executor.run"), proceed)
+
+    def stream(self, argv, host=None, fatal=FATAL_STATUSES, labels=None, on_step=None, grace=10):
+        """Run a foreman-maintain command on host, parsing its steps as they are printed
+
+        The command runs in its own process group. As soon as a step ends with one
+        of the fatal statuses the whole group is killed and the steps parsed so far
+        are returned, instead of waiting for the command to finish.
+
+        @param fatal: step statuses aborting the command, like ``("FAIL", "WARNING")``
+        @param labels: mapping of step descriptions to labels, see :class:`StepParser`
+        @param on_step: callable called with every completed step
+        @param grace: seconds to wait for the command to exit once killed
+        @return: :class:`StreamResult`
+        """
+        if host is None:
+            host = self.default_host()
+        transport = self.transport_for(host)
+
+        def proceed():
+            with phase("connect"):
+                transport.connect()
+            # steps are parsed while the command runs
+            with phase("exec"):
+                return self._stream(transport, host, argv, fatal, labels, on_step, grace)
+
+        return dispatch(Call(host, "command", (argv,), {}, "executor.stream"), proceed)
+
+    def _stream(self, transport, host, argv, fatal, labels, on_step, grace):
+        # setsid makes the shell a group leader, so its pid is the group to kill; -w waits
+        # for it, as setsid forks when started by a group leader, like the shell sshd runs
+        script = f'echo "{PGID_MARKER} $$"; {_command_line(argv)}'
+        parser = StepParser(labels, clock=time.monotonic, on_step=on_step)
+        decoder = codecs.getincrementaldecoder("utf-8")("replace")
+        pgid = None
+        head = ""
+        aborted = None
+        with tempfile.TemporaryFile() as stderr:
+            proc = transport.popen(
+                f"setsid -w sh -c {shlex.quote(script)}",
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.PIPE,
+                stderr=stderr,
+            )
+            while aborted is None:
+                chunk = os.read(proc.stdout.fileno(), 65536)
+                if not chunk:
+                    break
+                text = decoder.decode(chunk)
+                if head is not None:
+                    head += text
+                    if "\n" not in head:
+                        continue
+                    line, text = head.split("\n", 1)
+                    if line.startswith(f"{PGID_MARKER} "):
+                        pgid = line.split()[-1]
+                    else:
+                        text = head
+                    head = None
+                for step in parser.feed(text):
+                    if step.status in fatal:
+                        aborted = step
+                        break
+            if aborted is not None:
+                if pgid is not None:
+                    self.run(["kill", "-TERM", f"-{pgid}"], host)
+                proc.stdout.close()
+                try:
+                    proc.wait(timeout=grace)
+                except subprocess.TimeoutExpired:
+                    proc.kill()
+            else:
+                if head:
+                    parser.feed(head)
+                parser.feed(decoder.decode(b"", final=True))
+                proc.stdout.close()
+            rc = proc.wait()
+            parser.close()
+            stderr.seek(0)
+            errors = stderr.read().decode("utf-8", "replace")
+        return StreamResult(rc, parser.steps, aborted, errors)
+
+    def close(self):
+        """Close all pooled transports"""
+        with self._lock:
+            for transport in self._transports.values():
+                transport.close()
+            self._transports.clear()
+
+
+_default = None
+_default_lock = threading.Lock()
+
+
+def configure(**kwargs):
+    """Replace the executor used by :func:`default_executor` (and so by the helpers)"""
+    global _default
+    with _default_lock:
+        if _default is not None:
+            _default.close()
+        _default = Executor(**kwargs)
+    return _default
+
+
+def default_executor():
+    """Return the shared executor, creating it with default settings on first use"""
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = Executor()
+    return _default
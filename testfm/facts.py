@@ -0,0 +1,173 @@
+"""Session cache of host facts used by :func:`testfm.helpers.product` and ``server``.
+
+Facts are fetched with a single ``rpm`` query per host, kept in memory for the
+session and persisted to ``~/.cache/testfm/facts.json`` together with the
+NEVRA of the installed satellite (or satellite-capsule) package. The first
+lookup of a host in a session checks that NEVRA with a single ``rpm -q`` and
+queries the host again when it differs, so re-provisioned or upgraded hosts do
+not keep stale facts. Calls which change packages on a host, like
+``Upgrade.run`` or ``yum``, drop its entry so the next lookup queries the host
+again. :mod:`testfm.cassette` keeps facts in memory only, so recording and
+replaying make the same query whatever the file holds.
+"""
+import json
+import os
+import re
+import threading
+from collections import namedtuple
+
+from testfm.base import Command
+from testfm.executor import default_executor
+from testfm.remote import register
+
+CACHE_DIR = os.path.join(os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache")), "testfm")
+FACTS_FILE = os.path.join(CACHE_DIR, "facts.json")
+FACTS_QUERY = "rpm -q --queryformat '%{NAME} %{NEVRA} %{VERSION}\\n' satellite satellite-capsule"
+
+NEVRA_QUERY = "rpm -q --queryformat '%{{NEVRA}}\\n' {package}"
+PACKAGES = {"satellite": "satellite", "capsule": "satellite-capsule"}
+
+Facts = namedtuple("Facts", ["host", "nevra", "version", "role"])
+
+PACKAGE_MODULES = ("yum", "dnf", "package")
+PACKAGE_COMMANDS = {
+    ("upgrade", "run"),
+    ("packages", "install"),
+    ("packages", "update"),
+    ("advanced procedure run", "packages-update"),
+    ("advanced procedure run", "installer-upgrade"),
+}
+PACKAGE_CHANGE = re.compile(
+    r"\b(yum|dnf)\b[^|;&]*\b(install|localinstall|reinstall|update|upgrade|downgrade|remove|"
+    r"erase)\b|\brpm\s+-{1,2}(i|U|F|e|install|upgrade|freshen|erase)"
+    r"|\b(foreman|satellite)-maintain\s+(upgrade\s+run|packages\s+(install|update))"
+)
+
+
+def parse_facts(host, output):
+    """Build :class:`Facts` from the output of :data:`FACTS_QUERY`"""
+    installed = {}
+    for line in output.splitlines():
+        fields = line.split()
+        if len(fields) == 3 and fields[0] in ("satellite", "satellite-capsule"):
+            installed[fields[0]] = fields
+    if "satellite" in installed:
+        role, (_, nevra, version) = "satellite", installed["satellite"]
+    elif "satellite-capsule" in installed:
+        role, (_, nevra, version) = "capsule", installed["satellite-capsule"]
+    else:
+        raise ValueError(f"Neither satellite nor satellite-capsule is installed on {host}")
+    return Facts(host, nevra, ".".join(version.split(".")[:2]), role)
+
+
+def changes_packages(call):
+    """Return whether a :class:`testfm.remote.Call` may install, update or remove packages"""
+    if call.module in PACKAGE_MODULES:
+        return True
+    command = call.command
+    if command is None:
+        return False
+    if isinstance(command, Command):
+        return (command.base, command.sub) in PACKAGE_COMMANDS
+    return bool(PACKAGE_CHANGE.search(str(command)))
+
+
+class FactsCache:
+    """Host facts kept in memory and in a JSON file keyed by host, checked by NEVRA
+
+    @param path: JSON file persisting facts between sessions, None to keep them in memory only
+    @param executor: executor used to query hosts, the shared one by default
+    """
+
+    def __init__(self, path=FACTS_FILE, executor=None):
+        self.path = path
+        self.executor = executor
+        self._facts = None
+        self._checked = set()
+        self._lock = threading.RLock()
+
+    def _executor(self):
+        return self.executor or default_executor()
+
+    def _load(self):
+        if self._facts is None:
+            self._facts = {}
+            if self.path is None:
+                return self._facts
+            try:
+                with open(self.path) as handle:
+                    for host, entry in json.load(handle).items():
+                        self._facts[host] = Facts(host, **entry)
+            except (OSError, ValueError, TypeError):
+                pass
+        return self._facts
+
+    def _save(self):
+        if self.path is None:
+            return
+        data = {host: facts._asdict() for host, facts in self._facts.items()}
+        for entry in data.values():
+            del entry["host"]
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as handle:
+            json.dump(data, handle, indent=2, sort_keys=True)
+        os.replace(tmp, self.path)
+
+    def current(self, facts):
+        """Return whether the package NEVRA of cached facts is still installed on their host"""
+        query = NEVRA_QUERY.format(package=PACKAGES[facts.role])
+        result = self._executor().run(query, facts.host)
+        return result.rc == 0 and result.stdout.strip() == facts.nevra
+
+    def get(self, host=None):
+        """Return :class:`Facts` of host, querying it when nothing current is cached
+
+        Facts cached by an earlier session are checked once per session with
+        :meth:`current`.
+        """
+        if host is None:
+            host = self._executor().default_host()
+        with self._lock:
+            facts = self._load().get(host)
+            if facts is not None and host not in self._checked and not self.current(facts):
+                facts = None
+            if facts is None:
+                result = self._executor().run(FACTS_QUERY, host)
+                facts = parse_facts(host, result.stdout)
+                self._facts[host] = facts
+                self._save()
+            self._checked.add(host)
+        return facts
+
+    def invalidate(self, pattern=None):
+        """Drop facts of hosts matching pattern, or of all hosts"""
+        with self._lock:
+            facts = self._load()
+            if pattern is None:
+                hosts = list(facts)
+            else:
+                try:
+                    hosts = self._executor().hosts(pattern) + [pattern]
+                except OSError:
+                    hosts = [pattern]
+            if any([facts.pop(host, None) for host in hosts]):
+                self._save()
+
+
+cache = FactsCache()
+
+
+def host_facts(host=None):
+    """Return :class:`Facts` of host (the default executor host if not given)"""
+    return cache.get(host)
+
+
+@register
+def invalidate_on_package_change(call, proceed):
+    """Drop cached facts of hosts on which packages may have changed"""
+    try:
+        return proceed()
+    finally:
+        if changes_packages(call):
+            cache.invalidate(call.host)
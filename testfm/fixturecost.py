@@ -0,0 +1,171 @@
+"""Cost of every fixture over a session, to find the ones worth rescoping or caching.
+
+With ``--fixture-costs`` this plugin counts, per fixture:
+
+* how many times it was instantiated,
+* the time spent setting it up and tearing it down,
+* the remote calls made by its setup and teardown.
+
+The N fixtures costing the most time are listed in the terminal summary with
+``--fixture-costs N``, all of them with ``--fixture-costs 0``. Setup time is the
+fixture's own, the fixtures it requests are set up before it. Teardown time and
+calls are those since the previous fixture was torn down, see
+:mod:`testfm.timing`.
+"""
+import threading
+import time
+
+import pytest
+
+from testfm.remote import register
+from testfm.timing import context
+
+
+class FixtureCost:
+    """Instantiations, time and remote calls of one fixture"""
+
+    def __init__(self, name):
+        self.name = name
+        self.instances = 0
+        self.setup = 0.0
+        self.teardown = 0.0
+        self.setup_calls = 0
+        self.teardown_calls = 0
+
+    @property
+    def total(self):
+        """Setup and teardown time"""
+        return self.setup + self.teardown
+
+    @property
+    def calls(self):
+        """Remote calls of setup and teardown"""
+        return self.setup_calls + self.teardown_calls
+
+
+class FixtureCosts:
+    """Middleware counting remote calls per fixture, with the costs of every fixture"""
+
+    def __init__(self):
+        self.costs = {}
+        self._lock = threading.Lock()
+        self._teardown_calls = 0
+        self._mark = None
+
+    def cost(self, name):
+        """Return the :class:`FixtureCost` of fixture name"""
+        with self._lock:
+            if name not in self.costs:
+                self.costs[name] = FixtureCost(name)
+            return self.costs[name]
+
+    def __call__(self, call, proceed):
+        fixture = context.fixture
+        if fixture is not None:
+            self.cost(fixture).setup_calls += 1
+        elif context.when == "teardown":
+            with self._lock:
+                self._teardown_calls += 1
+        return proceed()
+
+    def mark(self):
+        """Start timing the next fixture torn down"""
+        self._mark = time.perf_counter()
+
+    def fixture_set_up(self, name, duration):
+        """Count an instantiation of fixture name, set up in duration seconds"""
+        cost = self.cost(name)
+        cost.instances += 1
+        cost.setup += duration
+        self.mark()
+
+    def fixture_finished(self, name):
+        """Charge fixture name with the time and calls since the previous fixture finished"""
+        cost = self.cost(name)
+        with self._lock:
+            cost.teardown_calls += self._teardown_calls
+            self._teardown_calls = 0
+        if self._mark is not None:
+            cost.teardown += time.perf_counter() - self._mark
+        self.mark()
+
+    def test_finished(self):
+        """Forget teardown calls no fixture claimed"""
+        with self._lock:
+            self._teardown_calls = 0
+        self._mark = None
+
+    def top(self, count=None):
+        """Return the :class:`FixtureCost` of the count costliest fixtures, all by default"""
+        with self._lock:
+            costs = sorted(self.costs.values(), key=lambda cost: cost.total, reverse=True)
+        return costs[:count] if count else costs
+
+
+fixture_costs = None
+
+
+def pytest_addoption(parser):
+    """Add the report option"""
+    parser.addoption(
+        "--fixture-costs",
+        metavar="N",
+        type=int,
+        help="Report the time and remote calls of the N costliest fixtures (N=0 for all)",
+    )
+
+
+def pytest_configure(config):
+    """Count fixture costs if a report is wanted"""
+    global fixture_costs
+    if config.getoption("fixture_costs") is not None:
+        fixture_costs = FixtureCosts()
+        register(fixture_costs)
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_setup(item):
+    """Time fixtures torn down before the setup of the test, on a scope change"""
+    if fixture_costs is not None:
+        fixture_costs.mark()
+    yield
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_teardown(item, nextitem):
+    """Time the fixtures torn down after the test"""
+    if fixture_costs is not None:
+        fixture_costs.mark()
+    yield
+    if fixture_costs is not None:
+        fixture_costs.test_finished()
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_fixture_setup(fixturedef, request):
+    """Time the fixture setup"""
+    start = time.perf_counter()
+    yield
+    if fixture_costs is not None:
+        fixture_costs.fixture_set_up(fixturedef.argname, time.perf_counter() - start)
+
+
+def pytest_fixture_post_finalizer(fixturedef, request):
+    """Time the fixture teardown"""
+    if fixture_costs is not None:
+        fixture_costs.fixture_finished(fixturedef.argname)
+
+
+def pytest_terminal_summary(terminalreporter, exitstatus, config):
+    """List the costliest fixtures"""
+    if fixture_costs is None:
+        return
+    terminalreporter.write_sep("=", "fixture costs")
+    terminalreporter.write_line(
+        f"{'fixture':40} {'instances':>9} {'setup':>9} {'teardown':>9} {'total':>9} {'calls':>6}"
+    )
+    for cost in fixture_costs.top(config.getoption("fixture_costs")):
+        terminalreporter.write_line(
+            f"{cost.name:40} {cost.instances:9} {cost.setup:8.2f}s {cost.teardown:8.2f}s "
+            f"{cost.total:8.2f}s {cost.calls:6}"
+        )
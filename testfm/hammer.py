@@ -0,0 +1,621 @@
+"""Clients for the Foreman operations used by TestFM fixtures.
+
+Every ``hammer`` command pays a Ruby interpreter and apipie start of several
+seconds. The fixtures instead use one of two long lived clients exposing the
+same methods:
+
+* :class:`ForemanAPI` calls the Foreman and Katello REST API over a small pool
+  of keep-alive HTTPS connections,
+* :class:`HammerShell` keeps one ``hammer shell`` process running on the
+  server, through the executor's persistent connection.
+
+Both pass every request or command through :func:`testfm.remote.dispatch`, so
+the middlewares see them like the other remote calls.
+
+:class:`StubForeman` serves the API endpoints used by :class:`ForemanAPI` from
+memory, to try the client without a Satellite::
+
+    from testfm.hammer import ForemanAPI
+    from testfm.hammer import StubForeman
+
+    with StubForeman() as stub:
+        api = ForemanAPI("127.0.0.1", port=stub.port, scheme="http")
+        api.product_create("zoo", organization_id=1)
+
+:meth:`ForemanAPI.sync_plans` and :meth:`HammerShell.sync_plans` list the sync
+plans of all organizations as :class:`SyncPlan` tuples, reading them a page at
+a time.
+"""
+import http.client
+import json
+import queue
+import re
+import shlex
+import ssl
+import subprocess
+import threading
+import uuid
+from base64 import b64encode
+from collections import namedtuple
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+from urllib.parse import parse_qs
+from urllib.parse import urlencode
+from urllib.parse import urlsplit
+
+from testfm.constants import FOREMAN_PASSWORD
+from testfm.constants import FOREMAN_USERNAME
+from testfm.executor import default_executor
+from testfm.helpers import wait_until
+from testfm.remote import Call
+from testfm.remote import dispatch
+from testfm.remote import phase
+
+BACKENDS = ("api", "shell")
+
+SyncPlan = namedtuple("SyncPlan", ["id", "name", "organization_id", "enabled"])
+
+
+class HammerError(Exception):
+    """A Foreman operation failed"""
+
+
+class ForemanAPI:
+    """Foreman and Katello REST API client with keep-alive connections
+
+    @param host: server name or address
+    @param username: Foreman user
+    @param password: password of username
+    @param port: API port
+    @param scheme: ``https``, or ``http`` for :class:`StubForeman`
+    @param pool_size: connections kept open for reuse
+    @param task_timeout: seconds to wait for asynchronous tasks like repository syncs
+    @param name: inventory name of the server the calls are reported for, host by default
+    """
+
+    def __init__(
+        self,
+        host,
+        username=FOREMAN_USERNAME,
+        password=FOREMAN_PASSWORD,
+        port=None,
+        scheme="https",
+        pool_size=4,
+        task_timeout=1800,
+        name=None,
+    ):
+        self.host = host
+        self.name = name or host
+        self.port = port
+        self.scheme = scheme
+        self.task_timeout = task_timeout
+        credentials = b64encode(f"{username}:{password}".encode()).decode()
+        self.headers = {
+            "Authorization": f"Basic {credentials}",
+            "Accept": "application/json",
+            "Content-Type": "application/json",
+        }
+        self._pool = queue.LifoQueue(maxsize=pool_size)
+
+    def _connect(self):
+        if self.scheme == "http":
+            return http.client.HTTPConnection(self.host, self.port, timeout=300)
+        # test servers use self-signed certificates
+        context = ssl._create_unverified_context()
+        return http.client.HTTPSConnection(self.host, self.port, timeout=300, context=context)
+
+    def request(self, method, path, body=None, **params):
+        """Send a request and return the decoded JSON answer"""
+        if params:
+            path = f"{path}?{urlencode(params)}"
+        call = Call(self.name, "api", (method, path), {"body": body}, "hammer.api")
+        return dispatch(call, lambda: self._send(method, path, body))
+
+    def _send(self, method, path, body):
+        payload = json.dumps(body) if body is not None else None
+        while True:
+            try:
+                connection, reused = self._pool.get_nowait(), True
+            except queue.Empty:
+                with phase("connect"):
+                    connection, reused = self._connect(), False
+            sent = False
+            try:
+                with phase("exec"):
+                    connection.request(method, path, body=payload, headers=self.headers)
+                    sent = True
+                    response = connection.getresponse()
+                    data = response.read()
+            except (http.client.HTTPException, OSError) as err:
+                connection.close()
+                # a reused connection the server closed while idle fails before any answer,
+                # past that the request may have run and a POST must not run twice
+                unanswered = not sent or isinstance(err, http.client.RemoteDisconnected)
+                if reused and unanswered:
+                    continue
+                raise
+            try:
+                self._pool.put_nowait(connection)
+            except queue.Full:
+                connection.close()
+            break
+        if response.status >= 400:
+            raise HammerError(f"{method} {path} failed with {response.status}: {data[:500]!r}")
+        return json.loads(data) if data else None
+
+    def _results(self, path, **params):
+        return self.request("GET", path, per_page=1000, **params)["results"]
+
+    def _pages(self, path, per_page=100, **params):
+        """Yield the results of a collection page by page, each page with its own request"""
+        page = 1
+        while True:
+            answer = self.request("GET", path, page=page, per_page=per_page, **params)
+            if answer["results"]:
+                yield answer["results"]
+            total = answer.get("subtotal", answer["total"])
+            if len(answer["results"]) < per_page or page * per_page >= total:
+                return
+            page += 1
+
+    def _id(self, path, name, **params):
+        for entry in self._results(path, search=f'name="{name}"', **params):
+            if entry["name"] == name:
+                return entry["id"]
+        raise HammerError(f"No {path} named {name}")
+
+    def wait_task(self, task):
+        """Wait for a foreman task returned by an asynchronous call to finish"""
+        if not task or "id" not in task or "state" not in task:
+            return task
+        path = f"/foreman_tasks/api/tasks/{task['id']}"
+
+        def stopped():
+            current = self.request("GET", path)
+            return current if current["state"] == "stopped" else None
+
+        done = wait_until(stopped, timeout=self.task_timeout)
+        if done["result"] != "success":
+            raise HammerError(f"Task {task['id']} ended with {done['result']}")
+        return done
+
+    def organization_ids(self):
+        """Return the ids of all organizations"""
+        return [org["id"] for page in self._pages("/katello/api/organizations") for org in page]
+
+    def sync_plan_create(self, name, organization_id, interval, sync_date, enabled=True):
+        """Create a sync plan, return its id"""
+        body = {"name": name, "interval": interval, "sync_date": sync_date, "enabled": enabled}
+        path = f"/katello/api/organizations/{organization_id}/sync_plans"
+        return self.request("POST", path, body)["id"]
+
+    def sync_plans(self):
+        """Yield the sync plans of all organizations, requesting them a page at a time"""
+        for organization_id in self.organization_ids():
+            path = f"/katello/api/organizations/{organization_id}/sync_plans"
+            for page in self._pages(path):
+                for plan in page:
+                    yield SyncPlan(plan["id"], plan["name"], organization_id, bool(plan["enabled"]))
+
+    def product_create(self, name, organization_id):
+        """Create a product, return its id"""
+        body = {"name": name, "organization_id": organization_id}
+        return self.request("POST", "/katello/api/products", body)["id"]
+
+    def product_delete(self, name, organization_id):
+        """Delete a product and its repositories"""
+        product = self._id("/katello/api/products", name, organization_id=organization_id)
+        self.wait_task(self.request("DELETE", f"/katello/api/products/{product}"))
+
+    def repository_create(
+        self, name, product, organization_id, url, content_type="yum", download_policy="immediate"
+    ):
+        """Create a repository in a product, return its id"""
+        body = {
+            "name": name,
+            "product_id": self._id(
+                "/katello/api/products", product, organization_id=organization_id
+            ),
+            "url": url,
+            "content_type": content_type,
+            "download_policy": download_policy,
+        }
+        return self.request("POST", "/katello/api/repositories", body)["id"]
+
+    def repository_synchronize(self, name, product, organization_id):
+        """Synchronize a repository and wait for the sync to finish"""
+        product = self._id("/katello/api/products", product, organization_id=organization_id)
+        repository = self._id("/katello/api/repositories", name, product_id=product)
+        self.wait_task(self.request("POST", f"/katello/api/repositories/{repository}/sync", {}))
+
+    def setting_set(self, name, value):
+        """Change the value of a setting"""
+        self.request("PUT", f"/api/settings/{name}", {"setting": {"value": str(value)}})
+
+    def role_create(self, name):
+        """Create a role, return its id"""
+        return self.request("POST", "/api/roles", {"role": {"name": name}})["id"]
+
+    def role_delete(self, name):
+        """Delete a role"""
+        self.request("DELETE", f"/api/roles/{self._id('/api/roles', name)}")
+
+    def filter_create(self, role, permissions):
+        """Add a filter with permissions, like ``["view_hosts"]``, to a role"""
+        search = " or ".join(f"name={permission}" for permission in permissions)
+        body = {
+            "filter": {
+                "role_id": self._id("/api/roles", role),
+                "permission_ids": [
+                    perm["id"] for perm in self._results("/api/permissions", search=search)
+                ],
+            }
+        }
+        return self.request("POST", "/api/filters", body)["id"]
+
+    def close(self):
+        """Close the pooled connections"""
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+def parse_table(output):
+    """Return the rows of a hammer table as dicts keyed by lowercase column names"""
+    # separator lines only have dashes between the column bars
+    lines = [line for line in output.splitlines() if "|" in line and line.strip("-| ")]
+    if not lines:
+        return []
+    header = [column.strip().lower() for column in lines[0].split("|")]
+    return [dict(zip(header, (cell.strip() for cell in line.split("|")))) for line in lines[1:]]
+
+
+class HammerShell:
+    """One ``hammer shell`` kept running on the server
+
+    Commands are written to the shell followed by an unknown command whose
+    name is a unique marker. hammer answers it with an error naming it, which
+    tells where the output of the previous command ends. The shell starts with
+    the first command, so replayed cassettes never start it.
+
+    @param executor: executor reaching the server, the shared one by default
+    @param host: server, the default host of executor by default
+    """
+
+    ERROR = re.compile(r"^(Error|Could not|\[ERROR)", re.MULTILINE)
+
+    def __init__(self, executor=None, host=None):
+        executor = executor or default_executor()
+        # calls are reported for the inventory name, the transport may use an address
+        self.host = host or executor.default_host()
+        self._transport = executor.transport_for(self.host)
+        self._proc = None
+        self._lock = threading.Lock()
+
+    def _start(self):
+        with phase("connect"):
+            self._transport.connect()
+            self._proc = self._transport.popen(
+                "hammer shell 2>&1",
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                universal_newlines=True,
+                bufsize=1,
+            )
+
+    def run(self, *args):
+        """Run a hammer command, like ``run("settings", "list")``, return its output"""
+        call = Call(self.host, "hammer", args, {}, "hammer.shell")
+        output = dispatch(call, lambda: self._send(args))
+        if self.ERROR.search(output):
+            raise HammerError(f"hammer {shlex.join(args)} failed: {output}")
+        return output
+
+    def _send(self, args):
+        marker = f"testfm-end-{uuid.uuid4().hex}"
+        with self._lock:
+            if self._proc is None:
+                self._start()
+            with phase("exec"):
+                self._proc.stdin.write(f"{shlex.join(args)}\n{marker}\n")
+                self._proc.stdin.flush()
+                lines = []
+                for line in self._proc.stdout:
+                    if marker in line:
+                        break
+                    lines.append(line)
+                else:
+                    raise HammerError(f"hammer shell exited while running {args}")
+        return "".join(lines)
+
+    def _pages(self, *args, per_page=100):
+        """Yield the table rows listed by hammer command args page by page"""
+        page = 1
+        while True:
+            rows = parse_table(self.run(*args, "--page", str(page), "--per-page", str(per_page)))
+            if rows:
+                yield rows
+            if len(rows) < per_page:
+                return
+            page += 1
+
+    def organization_ids(self):
+        """Return the ids of all organizations"""
+        return [int(row["id"]) for page in self._pages("organization", "list") for row in page]
+
+    def sync_plan_create(self, name, organization_id, interval, sync_date, enabled=True):
+        """Create a sync plan"""
+        self.run(
+            "sync-plan",
+            "create",
+            "--name",
+            name,
+            "--organization-id",
+            str(organization_id),
+            "--interval",
+            interval,
+            "--sync-date",
+            sync_date,
+            "--enabled",
+            str(enabled).lower(),
+        )
+
+    def sync_plans(self):
+        """Yield the sync plans of all organizations, listing them a page at a time"""
+        for organization_id in self.organization_ids():
+            for page in self._pages("sync-plan", "list", "--organization-id", str(organization_id)):
+                for row in page:
+                    yield SyncPlan(
+                        int(row["id"]),
+                        row.get("name"),
+                        organization_id,
+                        row.get("enabled") in ("yes", "true"),
+                    )
+
+    def product_create(self, name, organization_id):
+        """Create a product"""
+        self.run("product", "create", "--organization-id", str(organization_id), "--name", name)
+
+    def product_delete(self, name, organization_id):
+        """Delete a product and its repositories"""
+        self.run("product", "delete", "--organization-id", str(organization_id), "--name", name)
+
+    def repository_create(
+        self, name, product, organization_id, url, content_type="yum", download_policy="immediate"
+    ):
+        """Create a repository in a product"""
+        self.run(
+            "repository",
+            "create",
+            "--organization-id",
+            str(organization_id),
+            "--name",
+            name,
+            "--product",
+            product,
+            "--content-type",
+            content_type,
+            "--url",
+            url,
+            "--download-policy",
+            download_policy,
+        )
+
+    def repository_synchronize(self, name, product, organization_id):
+        """Synchronize a repository and wait for the sync to finish"""
+        self.run(
+            "repository",
+            "synchronize",
+            "--organization-id",
+            str(organization_id),
+            "--product",
+            product,
+            "--name",
+            name,
+        )
+
+    def setting_set(self, name, value):
+        """Change the value of a setting"""
+        self.run("settings", "set", "--name", name, "--value", str(value))
+
+    def role_create(self, name):
+        """Create a role"""
+        self.run("role", "create", "--name", name)
+
+    def role_delete(self, name):
+        """Delete a role"""
+        self.run("role", "delete", "--name", name)
+
+    def filter_create(self, role, permissions):
+        """Add a filter with permissions, like ``["view_hosts"]``, to a role"""
+        self.run("filter", "create", "--role", role, "--permissions", ",".join(permissions))
+
+    def close(self):
+        """Stop the hammer shell"""
+        if self._proc is not None and self._proc.poll() is None:
+            self._proc.stdin.close()
+            try:
+                self._proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self._proc.kill()
+
+
+def hammer_client(backend="api", executor=None):
+    """Return the client of backend, ``api`` or ``shell``, for the default server"""
+    executor = executor or default_executor()
+    if backend == "api":
+        host = executor.default_host()
+        return ForemanAPI(executor.transport_for(host).host, name=host)
+    if backend == "shell":
+        return HammerShell(executor)
+    raise ValueError(f"Unknown hammer backend '{backend}', use one of {BACKENDS}")
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    """Request handler of :class:`StubForeman`"""
+
+    protocol_version = "HTTP/1.1"
+    # headers and body are written separately, delayed acks would hold the body back
+    disable_nagle_algorithm = True
+
+    # collection paths and their store keys, nested paths capture the organization id
+    ROUTES = [
+        (re.compile(r"^/katello/api/organizations/(\d+)/sync_plans$"), "sync_plans"),
+        (re.compile(r"^/katello/api/organizations$"), "organizations"),
+        (re.compile(r"^/katello/api/products$"), "products"),
+        (re.compile(r"^/katello/api/repositories$"), "repositories"),
+        (re.compile(r"^/api/roles$"), "roles"),
+        (re.compile(r"^/api/permissions$"), "permissions"),
+        (re.compile(r"^/api/filters$"), "filters"),
+    ]
+    SINGULAR = {"roles": "role", "filters": "filter"}
+    MEMBER = re.compile(r"^(?P<collection>.+)/(?P<id>[^/]+)$")
+
+    def log_message(self, *args):
+        pass
+
+    def _answer(self, status, body=None):
+        data = json.dumps(body).encode() if body is not None else b""
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length)) if length else {}
+
+    def _route(self, path):
+        for pattern, name in self.ROUTES:
+            match = pattern.match(path)
+            if match:
+                return name, dict(zip(["organization_id"], (int(g) for g in match.groups())))
+        return None, {}
+
+    def _matches(self, entry, query):
+        for key, values in query.items():
+            if key == "search":
+                names = re.findall(r'name="?([^"\s]+)"?', values[0])
+                if entry.get("name") not in names:
+                    return False
+            elif key not in ("page", "per_page") and str(entry.get(key)) != values[0]:
+                return False
+        return True
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        task = re.match(r"^/foreman_tasks/api/tasks/(\d+)$", url.path)
+        if task:
+            return self._answer(
+                200, {"id": int(task.group(1)), "state": "stopped", "result": "success"}
+            )
+        name, scope = self._route(url.path)
+        if name is None:
+            return self._answer(404, {"error": url.path})
+        query = parse_qs(url.query)
+        results = [
+            entry
+            for entry in self.server.store[name]
+            if self._matches(entry, query) and all(entry.get(k) == v for k, v in scope.items())
+        ]
+        per_page = int(query.get("per_page", ["20"])[0])
+        page = int(query.get("page", ["1"])[0])
+        start = (page - 1) * per_page
+        end = start + per_page
+        self._answer(
+            200,
+            {
+                "results": results[start:end],
+                "total": len(self.server.store[name]),
+                "subtotal": len(results),
+                "page": page,
+                "per_page": per_page,
+            },
+        )
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        body = self._body()
+        sync = re.match(r"^/katello/api/repositories/(\d+)/sync$", url.path)
+        if sync:
+            return self._answer(202, self.server.task())
+        name, scope = self._route(url.path)
+        if name is None:
+            return self._answer(404, {"error": url.path})
+        # Foreman wraps attributes of some resources in their singular name
+        entry = dict(body.get(self.SINGULAR.get(name), body), **scope)
+        self._answer(201, self.server.add(name, entry))
+
+    def do_PUT(self):
+        member = self.MEMBER.match(urlsplit(self.path).path)
+        if member and member.group("collection") == "/api/settings":
+            value = self._body()["setting"]["value"]
+            self.server.settings[member.group("id")] = value
+            return self._answer(200, {"name": member.group("id"), "value": value})
+        self._answer(404, {"error": self.path})
+
+    def do_DELETE(self):
+        member = self.MEMBER.match(urlsplit(self.path).path)
+        name, _ = self._route(member.group("collection")) if member else (None, {})
+        if name is None:
+            return self._answer(404, {"error": self.path})
+        entries = self.server.store[name]
+        before = len(entries)
+        entries[:] = [entry for entry in entries if str(entry["id"]) != member.group("id")]
+        if len(entries) == before:
+            return self._answer(404, {"error": self.path})
+        self._answer(202, self.server.task() if name == "products" else {})
+
+
+class StubForeman(ThreadingHTTPServer):
+    """In-memory Foreman API answering the calls of :class:`ForemanAPI` on localhost
+
+    It starts serving in a thread when entered as a context manager.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, port=0):
+        super().__init__(("127.0.0.1", port), _StubHandler)
+        self.port = self.server_address[1]
+        self.settings = {}
+        self.store = {
+            name: []
+            for name in (
+                "organizations",
+                "sync_plans",
+                "products",
+                "repositories",
+                "roles",
+                "permissions",
+                "filters",
+            )
+        }
+        self._ids = iter(range(1, 1 << 30))
+        self._lock = threading.Lock()
+        self.add("organizations", {"name": "Default Organization"})
+        for permission in ("view_hosts", "console_hosts"):
+            self.add("permissions", {"name": permission})
+
+    def add(self, name, entry):
+        """Store entry in collection name with a new id, return it"""
+        with self._lock:
+            entry = dict(entry, id=next(self._ids))
+            self.store[name].append(entry)
+        return entry
+
+    def task(self):
+        """Return a finished foreman task"""
+        with self._lock:
+            return {"id": next(self._ids), "state": "running"}
+
+    def __enter__(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+        self.server_close()
@@ -14,13 +14,27 @@ Subcommands:
 Options:
     -h, --help                    print help
 """
+import re
+from collections import namedtuple
+
 from testfm.base import Base
+from testfm.batch import Batch
+from testfm.steps import ANSI
+
+LABEL = re.compile(r"^\[(?P<label>[\w-]+)\]")
+# tags listed after the description of a check by health list, like "[default] [pre-upgrade]"
+TAGS = re.compile(r"((?:\s+\[[\w-]+\])+)\s*$")
+TAG = re.compile(r"\[([\w-]+)\]")
+
+CheckResult = namedtuple("CheckResult", ["label", "rc", "stdout", "steps"])
+CheckResult.__doc__ = "Outcome of the health check of a label, see :meth:`Health.check_by_tags`"
 
 
 class Health(Base):
     """Manipulates Foreman-maintain's health command"""
 
     command_base = "health"
+    read_only = frozenset({"list", "list-tags"})
 
     @classmethod
     def check(cls, options=None):
@@ -43,35 +57,112 @@ class Health(Base):
                                           were already run
             -h, --help                    print help
         """
-        cls.command_sub = "check"
-
         if options is None:
             options = {}
 
-        result = cls._construct_command(options)
+        result = cls._construct_command(options, "check")
 
         return result
 
     @classmethod
     def list(cls, options=None):
         """Build foreman-maintain health list"""
-        cls.command_sub = "list"
-
         if options is None:
             options = {}
 
-        result = cls._construct_command(options)
+        result = cls._construct_command(options, "list")
 
         return result
 
     @classmethod
     def list_tags(cls, options=None):
         """Build foreman-maintain health list-tags"""
-        cls.command_sub = "list-tags"
-
         if options is None:
             options = {}
 
-        result = cls._construct_command(options)
+        result = cls._construct_command(options, "list-tags")
 
         return result
+
+    @classmethod
+    def parse_labels(cls, output):
+        """Return the labels, like ``server-ping``, listed by health list or list-tags output"""
+        labels = []
+        for line in ANSI.sub("", output).splitlines():
+            match = LABEL.match(line.strip())
+            if match and match.group("label") not in labels:
+                labels.append(match.group("label"))
+        return labels
+
+    @classmethod
+    def parse_check_tags(cls, output):
+        """Return {label: [tags]} of the checks listed by health list output"""
+        checks = {}
+        for line in ANSI.sub("", output).splitlines():
+            line = line.strip()
+            match = LABEL.match(line)
+            if not match:
+                continue
+            tags = TAGS.search(line, match.end())
+            checks[match.group("label")] = TAG.findall(tags.group(1)) if tags else []
+        return checks
+
+    @staticmethod
+    def _labels_by_tag(checks, tags):
+        return {tag: [label for label, tagged in checks.items() if tag in tagged] for tag in tags}
+
+    @classmethod
+    def check_by_tags(cls, ansible_module, tags=None, options=None):
+        """Run the checks of several tags in one remote call, each check only once
+
+        Labels of each tag, per host, come from one ``health list``, which shows
+        the tags of every check; tags it does not show are listed with
+        ``health list --tags``, all in one :class:`testfm.batch.Batch`. The union of
+        the labels is checked one label after the other in a single batch and the
+        results are fanned out per host and tag::
+
+            for by_tag in Health.check_by_tags(ansible_module).values():
+                for tag, checks in by_tag.items():
+                    assert all("FAIL" not in check.stdout for check in checks), tag
+
+        @param tags: tags to check, all tags shown by health list by default
+        @param options: extra options of every check, like ``["--assumeyes"]``
+        @return: dict of {host: {tag: [:class:`CheckResult`]}}
+        """
+        contacted = ansible_module.command(cls.list())
+        host_checks = {
+            host: cls.parse_check_tags(result["stdout"]) for host, result in contacted.items()
+        }
+        if tags is None:
+            tags = []
+            for checks in host_checks.values():
+                for tagged in checks.values():
+                    tags += [tag for tag in tagged if tag not in tags]
+        tag_labels = {
+            host: cls._labels_by_tag(checks, tags) for host, checks in host_checks.items()
+        }
+        missing = [tag for tag in tags if not any(labels[tag] for labels in tag_labels.values())]
+        if missing:
+            listing = Batch()
+            for tag in missing:
+                listing.add(cls.list({"tags": tag}), rc=None)
+            for host, steps in listing.run(ansible_module).items():
+                for tag, step in zip(missing, steps):
+                    tag_labels.setdefault(host, {})[tag] = cls.parse_labels(step.stdout)
+        labels = []
+        for by_tag in tag_labels.values():
+            for tag in tags:
+                labels += [label for label in by_tag.get(tag, []) if label not in labels]
+        batch = Batch()
+        for label in labels:
+            batch.add(cls.check(["--label", label] + list(options or [])), rc=None)
+        results = {}
+        for host, steps in batch.run(ansible_module).items():
+            checks = {
+                label: CheckResult(label, step.rc, step.stdout, cls.parse(step.stdout))
+                for label, step in zip(labels, steps)
+            }
+            by_tag = tag_labels.get(host, {})
+            # labels listed on other hosts only are checked here too, but not reported
+            results[host] = {tag: [checks[label] for label in by_tag.get(tag, [])] for tag in tags}
+        return results
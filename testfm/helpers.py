@@ -1,26 +1,72 @@
 # helpers required for TestFM
-import os
+import shlex
+import time
+
+from testfm.executor import default_executor
+from testfm.facts import host_facts
+
+
+def backdate(ansible_module, paths, seconds):
+    """Use this helper to make files on Satellite look older than they are.
+
+    Files are created when missing and their modification time is set to
+    seconds ago, all with a single remote call, instead of waiting for them to age.
+    It returns the contacted results of the call.
+    """
+    if isinstance(paths, str):
+        paths = [paths]
+    quoted = " ".join(shlex.quote(path) for path in paths)
+    return ansible_module.command(f"touch -d '{int(seconds)} seconds ago' {quoted}")
 
 
 def product():
-    """This helper provides Satellite/Capsule version"""
-    server_version = os.popen(
-        "ansible -i testfm/inventory server --user root -m shell "
-        '-a "rpm -q satellite > /dev/null && rpm -q satellite --queryformat=%{VERSION}'
-        ' || rpm -q satellite-capsule --queryformat=%{VERSION}" -o'
-    ).read()
-    return server_version.splitlines()[0].split(" ")[-1][:3]
+    """This helper provides Satellite/Capsule version, like '6.10'.
+
+    It comes from the session facts cache, see :mod:`testfm.facts`.
+    """
+    return host_facts().version
 
 
 def run(command):
-    """Use this helper to execute shell command on Satellite"""
-    return os.popen(f"ansible server -i testfm/inventory -u root -m command -a '{command}'").read()
+    """Use this helper to execute shell command on Satellite.
+
+    It returns :class:`testfm.executor.Result` with rc, stdout and stderr.
+    """
+    return default_executor().run(command)
+
+
+def stream(command, **kwargs):
+    """Use this helper to execute a long foreman-maintain command on Satellite.
+
+    Its steps are parsed while it runs and it is killed at the first failed
+    step, see :meth:`testfm.executor.Executor.stream` for the keyword arguments.
+    It returns :class:`testfm.executor.StreamResult` with rc, steps, aborted and stderr.
+    """
+    return default_executor().stream(command, **kwargs)
 
 
 def server():
-    """Use this to find whether server on which tests are running is capsule or satellite."""
-    result = run("rpm -q satellite")
-    if "rc=0" in result:
-        return "satellite"
-    else:
-        return "capsule"
+    """Use this to find whether server on which tests are running is capsule or satellite.
+
+    It comes from the session facts cache, see :mod:`testfm.facts`.
+    """
+    return host_facts().role
+
+
+def wait_until(condition, timeout=300, delay=1, backoff=2, max_delay=30):
+    """Use this helper instead of fixed sleeps to wait for Satellite to reach some state.
+
+    condition is called until it returns a true value, which is returned. The
+    delay between calls grows by backoff up to max_delay. TimeoutError is
+    raised when it still fails after timeout seconds.
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        result = condition()
+        if result:
+            return result
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise TimeoutError(f"{condition!r} still false after {timeout} seconds")
+        time.sleep(min(delay, remaining))
+        delay = min(delay * backoff, max_delay)
@@ -22,51 +22,44 @@ class MaintenanceMode(Base):
     """Manipulates Foreman-maintain's maintenance-mode command"""
 
     command_base = "maintenance-mode"
+    read_only = frozenset({"status", "is-enabled"})
 
     @classmethod
     def start(cls, options=None):
         """foreman-maintain maintenance-mode start [OPTIONS]"""
-        cls.command_sub = "start"
-
         if options is None:
             options = {}
 
-        result = cls._construct_command(options)
+        result = cls._construct_command(options, "start")
 
         return result
 
     @classmethod
     def stop(cls, options=None):
         """foreman-maintain maintenance-mode stop [OPTIONS]"""
-        cls.command_sub = "stop"
-
         if options is None:
             options = {}
 
-        result = cls._construct_command(options)
+        result = cls._construct_command(options, "stop")
 
         return result
 
     @classmethod
     def status(cls, options=None):
         """foreman-maintain maintenance-mode status [OPTIONS]"""
-        cls.command_sub = "status"
-
         if options is None:
             options = {}
 
-        result = cls._construct_command(options)
+        result = cls._construct_command(options, "status")
 
         return result
 
     @classmethod
     def is_enabled(cls, options=None):
         """foreman-maintain maintenance-mode is-enabled [OPTIONS]"""
-        cls.command_sub = "is-enabled"
-
         if options is None:
             options = {}
 
-        result = cls._construct_command(options)
+        result = cls._construct_command(options, "is-enabled")
 
         return result
@@ -25,6 +25,7 @@ class Packages(Base):
     """Manipulates Foreman-maintain's packages command"""
 
     command_base = "packages"
+    read_only = frozenset({"status", "is-locked"})
 
     @classmethod
     def lock(cls, options=None):
@@ -41,12 +42,10 @@ class Packages(Base):
 
             -h, --help                    print help
         """
-        cls.command_sub = "lock"
-
         if options is None:
             options = {}
 
-        result = cls._construct_command(options)
+        result = cls._construct_command(options, "lock")
 
         return result
 
@@ -65,12 +64,10 @@ class Packages(Base):
 
             -h, --help                    print help
         """
-        cls.command_sub = "unlock"
-
         if options is None:
             options = {}
 
-        result = cls._construct_command(options)
+        result = cls._construct_command(options, "unlock")
 
         return result
 
@@ -89,12 +86,10 @@ class Packages(Base):
 
             -h, --help                    print help
         """
-        cls.command_sub = "status"
-
         if options is None:
             options = {}
 
-        result = cls._construct_command(options)
+        result = cls._construct_command(options, "status")
 
         return result
 
@@ -113,12 +108,10 @@ class Packages(Base):
 
             -h, --help                    print help
         """
-        cls.command_sub = "install"
-
         if options is None:
             options = {}
 
-        result = cls._construct_command(options)
+        result = cls._construct_command(options, "install")
 
         return result
 
@@ -137,12 +130,10 @@ class Packages(Base):
 
             -h, --help                    print help
         """
-        cls.command_sub = "update"
-
         if options is None:
             options = {}
 
-        result = cls._construct_command(options)
+        result = cls._construct_command(options, "update")
 
         return result
 
@@ -161,12 +152,10 @@ class Packages(Base):
 
             -h, --help                    print help
         """
-        cls.command_sub = "is-locked"
-
         if options is None:
             options = {}
 
-        result = cls._construct_command(options)
+        result = cls._construct_command(options, "is-locked")
 
         return result
 
@@ -187,10 +176,8 @@ class Packages(Base):
 
             -h, --help                    print help
         """
-        cls.command_sub = "check-update"
-
         if options is None:
             options = {}
 
-        result = cls._construct_command(options)
+        result = cls._construct_command(options, "check-update")
         return result
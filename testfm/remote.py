@@ -0,0 +1,174 @@
+"""Single entry point for the remote calls made by TestFM.
+
+Both ``ansible_module`` calls (through :class:`RemoteModule`) and
+:class:`testfm.executor.Executor` runs are described by a :class:`Call` and
+passed through :func:`dispatch`. Registered middlewares see every call and can
+observe it, answer it themselves or let it proceed::
+
+    from testfm import remote
+
+    @remote.register
+    def log_calls(call, proceed):
+        logger.info(call.command)
+        return proceed()
+
+The code doing the work reports where the time of a call goes with
+:func:`phase`, like ``connect`` or ``exec``. The time spent before the work
+starts, in middlewares, is the ``queue`` phase. Middlewares read the phases of
+the call they wrap with :func:`phases`.
+
+Values marked with :func:`secret`, like passwords put on command lines, are
+replaced by :func:`redact` in whatever middlewares write out: cassettes,
+timing reports, traces and budget failures.
+"""
+import threading
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+
+_middlewares = []
+_lock = threading.Lock()
+_local = threading.local()
+_secrets = set()
+
+COMMAND_MODULES = ("command", "shell", "raw")
+MASK = "********"
+
+
+class Call(
+    namedtuple("Call", ["host", "module", "args", "kwargs", "via"], defaults=("ansible_module",))
+):
+    """One remote call: the host (or host pattern), the ansible module and its arguments
+
+    Executor runs are described as calls of the ``command`` module. via names
+    the API making the call, like ``executor.run``, as it decides the type of
+    the result.
+    """
+
+    __slots__ = ()
+
+    @property
+    def command(self):
+        """Command line of command, shell and raw calls, None for other modules"""
+        if self.module in COMMAND_MODULES and self.args:
+            return self.args[0]
+        return None
+
+
+def secret(value):
+    """Mark value, like a password, to be masked by :func:`redact`, return it"""
+    if value:
+        with _lock:
+            _secrets.add(str(value))
+    return value
+
+
+def redact(text):
+    """Return text with the values marked by :func:`secret` masked"""
+    with _lock:
+        secrets = sorted(_secrets, key=len, reverse=True)
+    for value in secrets:
+        text = text.replace(value, MASK)
+    return text
+
+
+def register(middleware, outermost=False):
+    """Add middleware, a ``middleware(call, proceed)`` callable, to every remote call
+
+    Middlewares wrap the ones registered after them, an outermost one wraps all
+    the others and calls it answers are not seen by them.
+    """
+    with _lock:
+        if middleware not in _middlewares:
+            if outermost:
+                _middlewares.insert(0, middleware)
+            else:
+                _middlewares.append(middleware)
+    return middleware
+
+
+def unregister(middleware):
+    """Remove a middleware added by :func:`register`"""
+    with _lock:
+        if middleware in _middlewares:
+            _middlewares.remove(middleware)
+
+
+def _calls():
+    """Return the phases of the calls being dispatched by this thread, innermost last"""
+    if not hasattr(_local, "calls"):
+        _local.calls = []
+        _local.last = None
+    return _local.calls
+
+
+def phases():
+    """Return the phase durations, in seconds, of the call being dispatched by this thread"""
+    calls = _calls()
+    return calls[-1] if calls else None
+
+
+@contextmanager
+def phase(name):
+    """Add the time spent in the with block to phase name of the current call
+
+    Outside of a call, like when parsing its result, the time goes to the last
+    call made by the thread.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        calls = _calls()
+        current = calls[-1] if calls else _local.last
+        if current is not None:
+            current[name] = current.get(name, 0.0) + time.perf_counter() - start
+
+
+def dispatch(call, proceed):
+    """Run call through the registered middlewares, ``proceed()`` does the actual work"""
+    with _lock:
+        middlewares = list(_middlewares)
+    calls = _calls()
+    current = {}
+    start = time.perf_counter()
+
+    def chain(index):
+        if index == len(middlewares):
+            current["queue"] = time.perf_counter() - start
+            return proceed()
+        return middlewares[index](call, lambda: chain(index + 1))
+
+    calls.append(current)
+    try:
+        return chain(0)
+    finally:
+        calls.pop()
+        _local.last = current
+
+
+class RemoteModule:
+    """Proxy of pytest-ansible's ``ansible_module`` routing each call through :func:`dispatch`
+
+    @param dispatcher: the original ``ansible_module``
+    @param host: host pattern the dispatcher targets
+    """
+
+    def __init__(self, dispatcher, host):
+        self._dispatcher = dispatcher
+        self.host = host
+
+    def __getattr__(self, name):
+        module = getattr(self._dispatcher, name)
+        if not callable(module):
+            return module
+
+        def proceed(*args, **kwargs):
+            with phase("exec"):
+                return module(*args, **kwargs)
+
+        def call(*args, **kwargs):
+            return dispatch(Call(self.host, name, args, kwargs), lambda: proceed(*args, **kwargs))
+
+        call.__name__ = name
+        return call
@@ -0,0 +1,77 @@
+"""Serialize tests changing the same server resources.
+
+Several pytest workers may share a server (see ``--workers-per-host`` of
+:mod:`testfm.runner`). Around every test this plugin takes file locks, one per
+server and resource declared with :func:`testfm.decorators.uses`: shared locks
+for reads, exclusive locks for writes. Tests only reading services or
+``foreman_maintain.yml`` therefore run at the same time, while a test
+restarting services waits for them and runs alone on that resource.
+
+Tests without :func:`~testfm.decorators.uses`, and destructive tests whose
+databases :mod:`testfm.dbcheckpoint` restores, take an exclusive lock on the
+whole server. Locks are always taken in the same order, so workers cannot
+deadlock. Fixtures shared between tests (module or session scoped) are only
+covered while the test setting them up or tearing them down holds its locks.
+"""
+import fcntl
+import os
+import tempfile
+from contextlib import contextmanager
+
+import pytest
+
+from testfm.executor import default_executor
+
+LOCK_DIR = os.path.join(tempfile.gettempdir(), "testfm-locks")
+SERVER = "server"
+
+
+def requirements(item):
+    """Return the (resource, exclusive) locks a test item needs, in locking order"""
+    markers = list(item.iter_markers("uses"))
+    if not markers or item.get_closest_marker("destructive"):
+        return [(SERVER, True)]
+    wanted = {}
+    for marker in markers:
+        for resource in marker.args:
+            name, _, access = resource.partition(":")
+            wanted[name] = wanted.get(name, False) or access == "write"
+    return [(SERVER, False)] + sorted(wanted.items())
+
+
+def lock_dir(config):
+    """Return the directory of the locks of the default host"""
+    return os.path.join(config.getoption("lock_dir"), default_executor().default_host())
+
+
+@contextmanager
+def locked(directory, needed):
+    """Hold the (resource, exclusive) locks needed, as lock files in directory"""
+    os.makedirs(directory, exist_ok=True)
+    handles = []
+    try:
+        for resource, exclusive in needed:
+            handle = open(os.path.join(directory, f"{resource}.lock"), "a")
+            handles.append(handle)
+            fcntl.flock(handle, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        yield
+    finally:
+        # closing the files releases the locks
+        for handle in reversed(handles):
+            handle.close()
+
+
+def pytest_addoption(parser):
+    """Add the lock directory option"""
+    parser.addoption(
+        "--lock-dir",
+        default=LOCK_DIR,
+        help="Directory of the resource locks shared by workers running on the same server",
+    )
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_protocol(item, nextitem):
+    """Run the setup, call and teardown of item holding its resource locks"""
+    with locked(lock_dir(item.config), requirements(item)):
+        yield
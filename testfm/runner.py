@@ -0,0 +1,332 @@
+"""Run the suite in parallel on a pool of satellite and capsule hosts.
+
+Every inventory host matching the pattern (``all`` by default) gets a worker
+running pytest against that host only. Tests are collected once and split by
+test module into chunks, which workers pick according to the role of their
+host:
+
+* tests marked ``@run_only_on_server(...)`` go to hosts of those roles,
+* tests marked ``@pytest.mark.capsule`` go to satellite or capsule hosts,
+* all other tests go to satellite hosts.
+
+Host roles and versions come from :mod:`testfm.facts`. The junit reports of the
+workers are merged into one file, and so are their timelines with
+``--trace-events``, see :mod:`testfm.trace`::
+
+    python -m testfm.runner -i testfm/inventory --version 6.10 --junitxml results.xml tests/
+
+Options not known to the runner are passed to every pytest worker.
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import xml.etree.ElementTree as ET
+from collections import Counter
+from collections import namedtuple
+from contextlib import contextmanager
+
+import pytest
+
+from testfm.executor import DEFAULT_INVENTORY
+from testfm.executor import DEFAULT_USER
+from testfm.executor import Executor
+from testfm.facts import FactsCache
+from testfm.log import logger
+from testfm.trace import merge_traces
+
+ROLES = ("satellite", "capsule")
+
+Chunk = namedtuple("Chunk", ["roles", "nodeids"])
+Chunk.__doc__ = "Test node ids of one module which may run on hosts of the given roles"
+
+WorkerResult = namedtuple("WorkerResult", ["host", "worker", "rc", "junitxml", "log", "trace"])
+
+
+def item_roles(item):
+    """Return the host roles a collected test item may run on"""
+    marker = item.get_closest_marker("run_only_on_server")
+    if marker:
+        return frozenset(marker.args)
+    if item.get_closest_marker("capsule"):
+        return frozenset(ROLES)
+    return frozenset(["satellite"])
+
+
+class _Collector:
+    """pytest plugin recording the roles of the collected (and selected) tests"""
+
+    def __init__(self):
+        self.tests = []
+        self.paths = []
+
+    def pytest_collection_finish(self, session):
+        self.tests = [(item.nodeid, item_roles(item)) for item in session.items]
+        # positional arguments, as parsed by pytest
+        self.paths = list(session.config.args)
+
+
+def collect(args):
+    """Collect tests with pytest args
+
+    @return: (nodeid, roles) pairs and the test paths pytest found among args
+    """
+    collector = _Collector()
+    rc = pytest.main(["--collect-only", "-qq"] + list(args), plugins=[collector])
+    if rc not in (0, 5):
+        raise RuntimeError(f"Collecting tests failed with exit code {rc}")
+    return collector.tests, collector.paths
+
+
+def strip_paths(args, paths):
+    """Return args without the test paths, keeping option values equal to a path
+
+    Paths are removed from the end, where pytest takes its positional arguments
+    from when an option value looks the same.
+    """
+    options = list(args)
+    for path in reversed(paths):
+        for index in range(len(options) - 1, -1, -1):
+            if options[index] == path:
+                del options[index]
+                break
+    return options
+
+
+def make_chunks(tests, size=10):
+    """Group tests by module and roles, in chunks of at most size tests"""
+    groups = {}
+    for nodeid, roles in tests:
+        groups.setdefault((nodeid.split("::")[0], roles), []).append(nodeid)
+    chunks = []
+    for (_, roles), nodeids in groups.items():
+        while nodeids:
+            chunks.append(Chunk(roles, nodeids[:size]))
+            nodeids = nodeids[size:]
+    # biggest chunks first, so the slowest modules do not end up running last
+    chunks.sort(key=lambda chunk: len(chunk.nodeids), reverse=True)
+    return chunks
+
+
+class HostPool:
+    """Inventory hosts with their facts, leased to a limited number of workers at a time
+
+    @param executor: executor reading the inventory and querying the hosts
+    @param pattern: host pattern selecting the pool
+    @param version: only pool hosts of this satellite version, like '6.10'
+    @param slots: workers one host can be leased to at the same time
+    """
+
+    def __init__(self, executor, pattern="all", version=None, slots=1):
+        facts = FactsCache(executor=executor)
+        self.hosts = [facts.get(host) for host in executor.hosts(pattern)]
+        if version is not None:
+            self.hosts = [host for host in self.hosts if host.version == str(version)]
+        self.slots = slots
+        self._leased = Counter()
+        self._cond = threading.Condition()
+
+    def roles(self):
+        """Return the roles of the pooled hosts"""
+        return {host.role for host in self.hosts}
+
+    @contextmanager
+    def lease(self, roles=ROLES):
+        """Wait for a free host of one of roles and hold it for the with block"""
+        matching = [host for host in self.hosts if host.role in roles]
+        if not matching:
+            raise ValueError(f"No {' or '.join(roles)} host in the pool")
+        with self._cond:
+            while True:
+                free = [host for host in matching if self._leased[host.host] < self.slots]
+                if free:
+                    break
+                self._cond.wait()
+            host = free[0]
+            self._leased[host.host] += 1
+        try:
+            yield host
+        finally:
+            with self._cond:
+                self._leased[host.host] -= 1
+                self._cond.notify_all()
+
+
+class Runner:
+    """Run chunks of tests on pooled hosts, one pytest worker per host slot
+
+    Workers sharing a host coordinate through :mod:`testfm.resources` locks.
+
+    @param pool: :class:`HostPool` to run on
+    @param chunks: :class:`Chunk` list, see :func:`make_chunks`
+    @param pytest_args: extra pytest arguments for every worker
+    @param inventory: inventory passed to the workers
+    @param user: remote user passed to the workers
+    @param output_dir: directory of the worker logs and junit reports
+    @param trace: whether the workers write a timeline, see :mod:`testfm.trace`
+    """
+
+    def __init__(
+        self,
+        pool,
+        chunks,
+        pytest_args=(),
+        inventory=DEFAULT_INVENTORY,
+        user=DEFAULT_USER,
+        output_dir=None,
+        trace=False,
+    ):
+        self.pool = pool
+        self.chunks = list(chunks)
+        self.pytest_args = list(pytest_args)
+        self.inventory = inventory
+        self.user = user
+        self.output_dir = output_dir or tempfile.mkdtemp(prefix="testfm-run-")
+        self.trace = trace
+        self.results = []
+        self.unscheduled = []
+        self._lock = threading.Lock()
+
+    def unschedulable(self):
+        """Return the chunks no pooled host can run"""
+        roles = self.pool.roles()
+        return [chunk for chunk in self.chunks if not chunk.roles & roles]
+
+    def _next(self, role):
+        """Pop the next chunk for a host of role, preferring chunks only it can run"""
+        with self._lock:
+            runnable = [chunk for chunk in self.chunks if role in chunk.roles]
+            if not runnable:
+                return None
+            chunk = min(runnable, key=lambda chunk: len(chunk.roles))
+            self.chunks.remove(chunk)
+            return chunk
+
+    def _pytest(self, host, chunk, worker, name):
+        junitxml = os.path.join(self.output_dir, f"{name}.xml")
+        log = os.path.join(self.output_dir, f"{name}.log")
+        trace = os.path.join(self.output_dir, f"{name}.trace.json") if self.trace else None
+        argv = [
+            sys.executable,
+            "-m",
+            "pytest",
+            "--ansible-inventory",
+            self.inventory,
+            "--ansible-host-pattern",
+            host.host,
+            "--ansible-user",
+            self.user,
+            "--junitxml",
+            junitxml,
+        ]
+        if trace:
+            argv += ["--trace-events", trace]
+        if self.pool.slots > 1:
+            # state and results known by one worker go stale when another one changes them
+            argv.append("--shared-host")
+        argv += self.pytest_args + chunk.nodeids
+        logger.info(f"{host.host}: running {len(chunk.nodeids)} tests, log in {log}")
+        with open(log, "w") as handle:
+            rc = subprocess.call(argv, stdout=handle, stderr=subprocess.STDOUT)
+        return WorkerResult(host.host, worker, rc, junitxml, log, trace)
+
+    def _worker(self, worker):
+        with self.pool.lease() as host:
+            index = 0
+            while True:
+                chunk = self._next(host.role)
+                if chunk is None:
+                    return
+                result = self._pytest(host, chunk, worker, f"{host.host}-{worker}-{index}")
+                with self._lock:
+                    self.results.append(result)
+                index += 1
+
+    def run(self):
+        """Run all schedulable chunks, return the worker results
+
+        Chunks no pooled host can run are kept in :attr:`unscheduled`.
+        """
+        for chunk in self.unschedulable():
+            logger.error(f"No {' or '.join(chunk.roles)} host to run {chunk.nodeids}")
+            self.chunks.remove(chunk)
+            self.unscheduled.append(chunk)
+        workers = [
+            threading.Thread(target=self._worker, args=(worker,))
+            for worker in range(len(self.pool.hosts) * self.pool.slots)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        return self.results
+
+
+def merge_junitxml(results, output):
+    """Merge the junit reports of :class:`WorkerResult` results into one ``testsuites`` report"""
+    merged = ET.Element("testsuites")
+    for result in results:
+        try:
+            root = ET.parse(result.junitxml).getroot()
+        except (OSError, ET.ParseError):
+            continue
+        for suite in root.iter("testsuite"):
+            suite.set("hostname", result.host)
+            merged.append(suite)
+    ET.ElementTree(merged).write(output, encoding="utf-8", xml_declaration=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Run TestFM on every satellite and capsule of an inventory in parallel"
+    )
+    parser.add_argument("-i", "--inventory", default=DEFAULT_INVENTORY)
+    parser.add_argument("-p", "--pattern", default="all", help="hosts to pool")
+    parser.add_argument("-u", "--user", default=DEFAULT_USER)
+    parser.add_argument("--version", help="only pool hosts of this version, like 6.10")
+    parser.add_argument(
+        "--workers-per-host",
+        type=int,
+        default=1,
+        help="pytest workers sharing each host, tests declaring resources with @uses overlap",
+    )
+    parser.add_argument("--chunk-size", type=int, default=10, help="tests per pytest worker run")
+    parser.add_argument("--output-dir", help="directory of the worker logs and junit reports")
+    parser.add_argument("--junitxml", help="merged junit report")
+    parser.add_argument("--trace-events", help="merged timeline of the workers")
+    args, pytest_args = parser.parse_known_args(argv)
+
+    executor = Executor(args.inventory, args.pattern, args.user)
+    try:
+        pool = HostPool(executor, args.pattern, args.version, args.workers_per_host)
+    finally:
+        executor.close()
+    if not pool.hosts:
+        parser.error(f"No host matches '{args.pattern}' (version {args.version})")
+    tests, paths = collect(pytest_args)
+    chunks = make_chunks(tests, args.chunk_size)
+    # workers get node ids instead of the test paths
+    options = strip_paths(pytest_args, paths)
+    runner = Runner(
+        pool, chunks, options, args.inventory, args.user, args.output_dir, bool(args.trace_events)
+    )
+    results = runner.run()
+    if args.junitxml:
+        merge_junitxml(results, args.junitxml)
+    if args.trace_events:
+        traces = [(result.trace, f"worker {result.worker} on {result.host}") for result in results]
+        merge_traces(traces, args.trace_events)
+    failed = [result for result in results if result.rc not in (0, 5)]
+    for result in failed:
+        logger.error(f"{result.host}: pytest exited with {result.rc}, see {result.log}")
+    if runner.unscheduled:
+        count = sum(len(chunk.nodeids) for chunk in runner.unscheduled)
+        logger.error(f"{count} tests did not run, no pooled host has the roles they need")
+    return 1 if failed or runner.unscheduled else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -25,17 +25,16 @@ class Service(Base):
     """Manipulates Foreman-maintain's service command"""
 
     command_base = "service"
+    read_only = frozenset({"list"})
 
     @classmethod
     def service_start(cls, options=None):
         """Build foreman-maintain service start"""
 
-        cls.command_sub = "start"
-
         if options is None:
             options = {}
 
-        result = cls._construct_command(options)
+        result = cls._construct_command(options, "start")
 
         return result
 
@@ -43,12 +42,10 @@ class Service(Base):
     def service_stop(cls, options=None):
         """Build foreman-maintain service stop"""
 
-        cls.command_sub = "stop"
-
         if options is None:
             options = {}
 
-        result = cls._construct_command(options)
+        result = cls._construct_command(options, "stop")
 
         return result
 
@@ -56,12 +53,10 @@ class Service(Base):
     def service_restart(cls, options=None):
         """Build foreman-maintain service"""
 
-        cls.command_sub = "restart"
-
         if options is None:
             options = {}
 
-        result = cls._construct_command(options)
+        result = cls._construct_command(options, "restart")
 
         return result
 
@@ -69,12 +64,10 @@ class Service(Base):
     def service_status(cls, options=None):
         """Build foreman-maintain service status"""
 
-        cls.command_sub = "status"
-
         if options is None:
             options = {}
 
-        result = cls._construct_command(options)
+        result = cls._construct_command(options, "status")
 
         return result
 
@@ -82,12 +75,10 @@ class Service(Base):
     def service_enable(cls, options=None):
         """Build foreman-maintain service enable"""
 
-        cls.command_sub = "enable"
-
         if options is None:
             options = {}
 
-        result = cls._construct_command(options)
+        result = cls._construct_command(options, "enable")
 
         return result
 
@@ -95,12 +86,10 @@ class Service(Base):
     def service_disable(cls, options=None):
         """Build foreman-maintain service disable"""
 
-        cls.command_sub = "disable"
-
         if options is None:
             options = {}
 
-        result = cls._construct_command(options)
+        result = cls._construct_command(options, "disable")
 
         return result
 
@@ -108,11 +97,9 @@ class Service(Base):
     def service_list(cls, options=None):
         """Build foreman-maintain service list"""
 
-        cls.command_sub = "list"
-
         if options is None:
             options = {}
 
-        result = cls._construct_command(options)
+        result = cls._construct_command(options, "list")
 
         return result
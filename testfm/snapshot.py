@@ -0,0 +1,107 @@
+"""Snapshots of remote files, restored byte for byte.
+
+Fixtures modifying configuration or gem files used to undo their changes by
+reinstalling packages or moving copies around. :class:`FileSnapshot` instead
+records the content, mode, owner and checksum of the files before they are
+changed and puts back only the files whose checksum differs afterwards, all in
+one remote call::
+
+    snapshot = FileSnapshot([foreman_maintain_yml]).take()
+    request.addfinalizer(snapshot.restore)
+
+Files missing when the snapshot is taken are removed by :meth:`FileSnapshot.restore`.
+"""
+import base64
+import hashlib
+import shlex
+from collections import namedtuple
+
+from testfm.executor import default_executor
+
+FileState = namedtuple("FileState", ["path", "content", "mode", "uid", "gid", "checksum"])
+FileState.__doc__ = "Recorded state of a remote file, content is None for a missing file"
+
+EOF_MARKER = "@@testfm-snapshot-eof"
+
+
+class SnapshotError(Exception):
+    """Taking or restoring a snapshot failed"""
+
+
+class FileSnapshot:
+    """Recorded state of remote files, to restore them after a test
+
+    It can be used as a context manager, taking the snapshot when entered and
+    restoring it on exit.
+
+    @param paths: remote file paths, relative ones start at the remote user's home
+    @param executor: executor reaching the server, the shared one by default
+    @param host: server, the default host of executor by default
+    """
+
+    def __init__(self, paths, executor=None, host=None):
+        self.paths = list(paths)
+        self.executor = executor or default_executor()
+        self.host = host
+        self.files = []
+
+    def _run(self, script):
+        result = self.executor.run("sh -s", self.host, input=script)
+        if result.rc != 0:
+            raise SnapshotError(f"Snapshot script failed with {result.rc}: {result.stderr}")
+        return result.stdout
+
+    def take(self):
+        """Record the files as they are now, return the snapshot"""
+        script = ["set -e"]
+        for path in self.paths:
+            quoted = shlex.quote(path)
+            script.append(
+                f"if [ -f {quoted} ]; then stat -L -c '%a %u %g' {quoted}; "
+                f"base64 -w0 {quoted}; echo; else echo missing; fi"
+            )
+        lines = iter(self._run("\n".join(script) + "\n").splitlines())
+        self.files = []
+        for path in self.paths:
+            header = next(lines)
+            if header == "missing":
+                self.files.append(FileState(path, None, None, None, None, None))
+                continue
+            mode, uid, gid = header.split()
+            content = base64.b64decode(next(lines))
+            checksum = hashlib.sha256(content).hexdigest()
+            self.files.append(FileState(path, content, mode, uid, gid, checksum))
+        return self
+
+    def _restore_script(self):
+        script = ["set -e"]
+        for index, state in enumerate(self.files):
+            quoted = shlex.quote(state.path)
+            if state.content is None:
+                script.append(f"if [ -e {quoted} ]; then rm -f {quoted}; echo {index}; fi")
+                continue
+            encoded = base64.encodebytes(state.content).decode()
+            script += [
+                f"if [ \"$(sha256sum < {quoted} 2>/dev/null | cut -d' ' -f1)\" != "
+                f"{state.checksum} ]; then",
+                f"base64 -d > {quoted} << '{EOF_MARKER}'",
+                f"{encoded}{EOF_MARKER}",
+                f"echo {index}",
+                "fi",
+                f"chmod {state.mode} {quoted}",
+                f"chown {state.uid}:{state.gid} {quoted}",
+            ]
+        return "\n".join(script) + "\n"
+
+    def restore(self):
+        """Put back the files whose checksum changed, return their paths"""
+        if not self.files:
+            return []
+        output = self._run(self._restore_script())
+        return [self.files[int(index)].path for index in output.split()]
+
+    def __enter__(self):
+        return self.take()
+
+    def __exit__(self, *exc):
+        self.restore()
@@ -0,0 +1,186 @@
+"""Track server state changed by fixtures and order tests to change it less often.
+
+Fixtures like ``setup_backup_tests`` or ``setup_katello_service_stop`` bring
+services, package locking, maintenance mode or the registration of the server
+(see :mod:`testfm.subscription`) into the state their tests need and back
+afterwards. They do it through :data:`tracker`:
+
+* :meth:`StateTracker.need` runs the transition only when the server is not
+  known to be in the wanted state already,
+* :meth:`StateTracker.restore` postpones the way back until the test is torn
+  down, and skips it when the next test needs the state as it is.
+
+Any call which may change one of those states (``service stop``, ``systemctl``,
+``satellite-installer``, backups, ...) makes the tracker forget it, so it is
+queried again by the next transition instead of trusted blindly. The tracker
+follows the server the session runs against.
+
+Restorations run at the end of the test teardown, while :mod:`testfm.resources`
+still holds the locks of the test. When several workers share the server
+(``--shared-host``, set by :mod:`testfm.runner` with ``--workers-per-host``
+above 1) the tracker cannot see the calls of the other workers, so every
+transition runs and no restoration is skipped.
+
+With ``--order-by-state`` tests needing the same states, according to
+:data:`FIXTURE_STATES`, are also moved next to each other.
+"""
+import re
+
+import pytest
+
+from testfm.base import Command
+from testfm.remote import register
+
+# states each fixture brings the server into for its tests
+FIXTURE_STATES = {
+    "setup_backup_tests": {"services": "up"},
+    "setup_katello_service_stop": {"services": "down"},
+    "setup_packages_lock_tests": {"packages": "locked"},
+    "setup_subscribe_to_cdn_dogfood": {"subscription": "cdn"},
+    "setup_sync_plan": {"maintenance_mode": "off"},
+}
+
+FOREMAN_MAINTAIN = r"\b(foreman|satellite)-maintain\s+"
+STATE_CHANGES = {
+    "services": re.compile(
+        FOREMAN_MAINTAIN + r"(service\s+(start|stop|restart|enable|disable)|backup|restore|"
+        r"upgrade\s+run|packages\s+(install|update)|advanced\s+procedure\s+run\s+service-)"
+        r"|\b(systemctl|katello-service|satellite-installer|foreman-installer|reboot)\b"
+    ),
+    "packages": re.compile(
+        FOREMAN_MAINTAIN + r"(packages\s+(lock|unlock|install|update)|upgrade\s+run)"
+        r"|\b(satellite|foreman)-installer\b"
+    ),
+    "maintenance_mode": re.compile(
+        FOREMAN_MAINTAIN + r"(maintenance-mode\s+(start|stop)|backup|upgrade\s+run|"
+        r"advanced\s+procedure\s+run\s+maintenance-mode-)|\b(iptables|nft|firewall-cmd)\b"
+    ),
+    "subscription": re.compile(
+        r"\bsubscription-manager\s+(register|unregister|clean|subscribe|unsubscribe|"
+        r"attach|remove)\b"
+    ),
+}
+SERVICE_MODULES = ("service", "systemd")
+
+
+def changed_states(call):
+    """Return the names of the states a :class:`testfm.remote.Call` may change"""
+    if call.module in SERVICE_MODULES:
+        return ["services"]
+    command = call.command
+    if command is None or (isinstance(command, Command) and command.read_only):
+        return []
+    return [name for name, pattern in STATE_CHANGES.items() if pattern.search(str(command))]
+
+
+def item_states(item):
+    """Return the states the fixtures of a test item need"""
+    needs = {}
+    for fixture in getattr(item, "fixturenames", ()):
+        needs.update(FIXTURE_STATES.get(fixture, {}))
+    return needs
+
+
+class StateTracker:
+    """Known state of the server and the transitions to run after the current test"""
+
+    def __init__(self, shared=False):
+        self.known = {}
+        self.pending = {}
+        self.transitions = 0
+        self.skipped = 0
+        self.shared = shared
+
+    def need(self, name, value, transition):
+        """Bring state name to value by calling transition, unless it is there already
+
+        On a shared server the transition always runs.
+
+        @return: whether transition was called
+        """
+        if not self.shared and self.known.get(name) == value:
+            self.skipped += 1
+            return False
+        self.known.pop(name, None)
+        transition()
+        self.known[name] = value
+        self.transitions += 1
+        return True
+
+    def restore(self, name, value, transition):
+        """Bring state name back to value with transition once the current test is torn down"""
+        self.pending[name] = (value, transition)
+
+    def forget(self, names):
+        """Mark states as unknown"""
+        for name in names:
+            self.known.pop(name, None)
+
+    def settle(self, needs=None):
+        """Run the pending restorations, except for states kept as they are by needs
+
+        On a shared server no restoration is kept, another worker may get the
+        server before the next test.
+        """
+        needs = {} if self.shared or needs is None else needs
+        for name, (value, transition) in list(self.pending.items()):
+            current = self.known.get(name)
+            if current is not None and needs.get(name) == current:
+                self.skipped += 1
+                continue
+            del self.pending[name]
+            self.need(name, value, transition)
+
+
+tracker = StateTracker()
+
+
+@register
+def forget_changed_states(call, proceed):
+    """Forget states the call may change"""
+    try:
+        return proceed()
+    finally:
+        tracker.forget(changed_states(call))
+
+
+def pytest_addoption(parser):
+    """Add the ordering and shared host options"""
+    parser.addoption(
+        "--order-by-state",
+        action="store_true",
+        help="Run tests needing the same services, package locking and maintenance mode "
+        "state one after the other",
+    )
+    parser.addoption(
+        "--shared-host",
+        action="store_true",
+        help="Other workers use the server too, always run state transitions and restorations",
+    )
+
+
+def pytest_configure(config):
+    """Stop trusting the known state when the server is shared"""
+    tracker.shared = config.getoption("shared_host")
+
+
+def pytest_collection_modifyitems(config, items):
+    """Group tests by the states they need, keeping the order of first appearance"""
+    if not config.getoption("order_by_state"):
+        return
+    first = {}
+    keys = []
+    for item in items:
+        key = tuple(sorted(item_states(item).items()))
+        keys.append(first.setdefault(key, len(first)))
+    items[:] = [item for _, _, item in sorted(zip(keys, range(len(items)), items))]
+
+
+@pytest.hookimpl(trylast=True)
+def pytest_runtest_teardown(item, nextitem):
+    """Run the restorations postponed by the fixtures of item, unless nextitem needs them
+
+    This runs inside :func:`testfm.resources.pytest_runtest_protocol`, so the
+    locks of item are still held.
+    """
+    tracker.settle(item_states(nextitem) if nextitem is not None else None)
@@ -0,0 +1,166 @@
+"""Incremental parser of foreman-maintain step output.
+
+foreman-maintain prints every step of a scenario as a description, an
+optional message and a status, with dashed lines between steps::
+
+    Running ForemanMaintain::Scenario::FilteredScenario
+    ================================================================================
+    Check for paused tasks:                                               [FAIL]
+    There are currently 1 paused tasks in the system
+    --------------------------------------------------------------------------------
+
+:class:`StepParser` turns such output into :class:`Step` records. It can be
+fed line by line (or by arbitrary chunks) while the command is running and
+only keeps the lines of the current step, bounded by ``max_message_lines``.
+"""
+import re
+from collections import deque
+from collections import namedtuple
+
+ANSI = re.compile(r"\x1b\[[0-9;?]*[A-Za-z]")
+STATUSES = ("OK", "FAIL", "WARNING", "SKIPPED", "ABORTED", "ALREADY RUN")
+STATUS_LINE = re.compile(r"^(?P<text>.*?)\s*\[(?P<status>{})\]\s*$".format("|".join(STATUSES)))
+SEPARATOR = re.compile(r"^(-{20,}|={20,})$")
+SUMMARY = re.compile(r"^The following steps ended up in (?P<state>failing|warning) state:$")
+SUMMARY_LABEL = re.compile(r"^\s+\[(?P<label>[\w-]+)\]$")
+MAX_LINE = 65536
+
+Step = namedtuple("Step", ["label", "description", "status", "duration", "message"])
+Step.__doc__ = "One foreman-maintain step, duration is None unless the parser has a clock"
+
+
+class StepParser:
+    """Turn foreman-maintain stdout into :class:`Step` records as it streams in
+
+    @param labels: mapping of step descriptions to labels
+    @param clock: callable returning seconds, like ``time.monotonic``, to measure
+        step durations while output streams in
+    @param max_message_lines: lines of a step message to keep (the last ones)
+    @param on_step: callable called with every completed :class:`Step`
+    """
+
+    def __init__(self, labels=None, clock=None, max_message_lines=50, on_step=None):
+        self.labels = labels or {}
+        self.clock = clock
+        self.on_step = on_step
+        self.steps = []
+        self.scenario = None
+        self._partial = ""
+        self._lines = deque(maxlen=max_message_lines)
+        self._description = None
+        self._status = None
+        self._started = None
+        self._finished = None
+        self._summary = None
+        self._summary_labels = {"failing": [], "warning": []}
+
+    def feed(self, data):
+        """Parse a chunk of output, return the steps it completed"""
+        data = self._partial + data
+        *lines, self._partial = data.split("\n")
+        # an unfinished line only matters after its last carriage return
+        self._partial = self._partial.rsplit("\r", 1)[-1][-MAX_LINE:]
+        done = []
+        for line in lines:
+            step = self._line(line)
+            if step is not None:
+                done.append(step)
+        return done
+
+    def close(self):
+        """Parse what is left of the output, return the steps it completed"""
+        done = self.feed("\n") if self._partial else []
+        step = self._emit()
+        if step is not None:
+            done.append(step)
+        self._apply_summary()
+        return done
+
+    def _now(self):
+        return self.clock() if self.clock else None
+
+    def _line(self, line):
+        # spinners rewrite the line with carriage returns, keep the final text
+        line = ANSI.sub("", line).split("\r")[-1].rstrip()
+        if SEPARATOR.match(line):
+            if line.startswith("="):
+                if self._description:
+                    self.scenario = re.sub(r"^Running\s+", "", self._description)
+                self._reset()
+                return None
+            return self._emit()
+        summary = SUMMARY.match(line)
+        if summary:
+            step = self._emit()
+            self._summary = summary.group("state")
+            return step
+        if self._summary:
+            label = SUMMARY_LABEL.match(line)
+            if label:
+                self._summary_labels[self._summary].append(label.group("label"))
+            elif line:
+                self._summary = None
+            return None
+        if not line:
+            return None
+        if self._description is None:
+            self._started = self._now()
+        status = STATUS_LINE.match(line)
+        if status and self._status is None:
+            self._status = status.group("status")
+            self._finished = self._now()
+            text = status.group("text").rstrip(":")
+            if self._description is None:
+                self._description = text.lstrip("/-\\| ")
+            elif text:
+                self._lines.append(text.lstrip("/-\\| "))
+        elif self._description is None:
+            self._description = line.rstrip(":")
+        else:
+            self._lines.append(line)
+        return None
+
+    def _reset(self):
+        self._lines.clear()
+        self._description = None
+        self._status = None
+        self._started = None
+        self._finished = None
+
+    def _emit(self):
+        if self._status is None:
+            self._reset()
+            return None
+        duration = None
+        if self._started is not None and self._finished is not None:
+            duration = self._finished - self._started
+        step = Step(
+            self.labels.get(self._description),
+            self._description,
+            self._status,
+            duration,
+            "\n".join(self._lines),
+        )
+        self._reset()
+        self.steps.append(step)
+        if self.on_step:
+            self.on_step(step)
+        return step
+
+    def _apply_summary(self):
+        """Label failed and warning steps from the summary printed at the end"""
+        for state, status in (("failing", "FAIL"), ("warning", "WARNING")):
+            labels = self._summary_labels[state]
+            indexes = [i for i, step in enumerate(self.steps) if step.status == status]
+            if labels and len(labels) == len(indexes):
+                for index, label in zip(indexes, labels):
+                    if self.steps[index].label is None:
+                        self.steps[index] = self.steps[index]._replace(label=label)
+
+
+def parse_steps(output, labels=None):
+    """Return the :class:`Step` records of a complete foreman-maintain output"""
+    parser = StepParser(labels)
+    parser.feed(output)
+    parser.close()
+    return parser.steps
@@ -0,0 +1,115 @@
+"""Registration of the server to the CDN or to the dogfood server.
+
+Tests of repository setup and package locking need the server registered to
+the CDN, while it is usually registered to the dogfood server. Registering is
+slow, so :class:`Registration` remembers the identity of the server (its
+consumer uuid and organization) and only switches when the wanted state
+differs, each switch being one :class:`testfm.batch.Batch` script.
+``setup_subscribe_to_cdn_dogfood`` switches through :data:`testfm.state.tracker`,
+so consecutive tests needing the CDN share one registration and the server
+goes back to dogfood only once they are done.
+"""
+from collections import namedtuple
+
+from testfm.batch import Batch
+from testfm.remote import secret
+
+IDENTITY = "subscription-manager identity"
+# organization of the CDN account
+CDN_ORG = "Quality Assurance"
+STATES = ("cdn", "dogfood", "unregistered")
+
+Identity = namedtuple("Identity", ["uuid", "org"])
+Identity.__doc__ = "Fingerprint of a registration: consumer uuid and organization name"
+
+
+def parse_identity(output):
+    """Return the :class:`Identity` in ``subscription-manager identity`` output, or None"""
+    fields = {}
+    for line in output.splitlines():
+        key, sep, value = line.partition(":")
+        if sep:
+            fields[key.strip().lower()] = value.strip()
+    if "system identity" not in fields:
+        return None
+    return Identity(fields["system identity"], fields.get("org name", ""))
+
+
+def state_of(identity):
+    """Return the registration state, one of :data:`STATES`, of an :class:`Identity`"""
+    if identity is None:
+        return "unregistered"
+    return "cdn" if CDN_ORG in identity.org else "dogfood"
+
+
+def cdn_batch(username, password, pool_ids):
+    """Return the :class:`Batch` registering to the CDN and attaching pool_ids
+
+    The password is on the command line, it is marked as a secret so records of the
+    call mask it.
+    """
+    secret(password)
+    batch = (
+        Batch()
+        .add("subscription-manager unregister", rc=None)
+        .add("subscription-manager clean")
+        .add("rpm -qa 'katello-ca-consumer*' | xargs -r yum -y remove")
+        .add(f'subscription-manager register --force --user="{username}" --password="{password}"')
+    )
+    for pool_id in pool_ids:
+        batch.add(f"subscription-manager subscribe --pool={pool_id}")
+    return batch
+
+
+def dogfood_batch(ca_consumer, org, activationkey):
+    """Return the :class:`Batch` registering to the dogfood server of ca_consumer"""
+    return (
+        Batch()
+        .add("subscription-manager unregister", rc=None)
+        .add("subscription-manager clean")
+        .add(f"yum -y localinstall {ca_consumer}")
+        .add(
+            f'subscription-manager register --force --org="{org}" --activationkey="{activationkey}"'
+        )
+    )
+
+
+def unregister_batch():
+    """Return the :class:`Batch` leaving the server unregistered"""
+    return Batch().add("subscription-manager unregister", rc=None).add("subscription-manager clean")
+
+
+class Registration:
+    """Last known identity of the server and the state it was found in first"""
+
+    def __init__(self):
+        self.identity = None
+        self.home = None
+        self.switches = 0
+
+    def query(self, ansible_module):
+        """Read the identity of the server, return its state"""
+        contacted = ansible_module.command(IDENTITY)
+        self.identity = parse_identity(contacted.values()[0]["stdout"])
+        state = state_of(self.identity)
+        if self.home is None:
+            self.home = state
+        return state
+
+    def switch(self, ansible_module, state, batch):
+        """Run batch to register the server in state, unless it is registered so already
+
+        @param batch: callable returning the :class:`Batch` of the switch
+        @return: whether the server was registered again
+        """
+        if self.query(ansible_module) == state:
+            return False
+        for steps in batch().run(ansible_module).values():
+            if not all(step.ok for step in steps):
+                raise RuntimeError(f"Registering the server to {state} failed: {steps}")
+        self.identity = None
+        self.switches += 1
+        return True
+
+
+registration = Registration()
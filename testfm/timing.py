@@ -0,0 +1,202 @@
+"""Time every remote call of a session, phase by phase.
+
+With ``--timing-report timing.json`` a :mod:`testfm.remote` middleware
+records each ``ansible_module`` call and executor run with the time spent in
+its phases:
+
+* ``queue``: in middlewares, before the work starts,
+* ``connect``: opening the persistent SSH connection of executor runs,
+* ``exec``: running the command, including ansible overhead for
+  ``ansible_module`` calls,
+* ``parse``: parsing the result, like the steps of a :class:`testfm.batch.Batch`.
+
+Records are tagged with the test id, the fixture being set up or torn down,
+the test phase (setup, call or teardown) and the builder of foreman-maintain
+commands, like ``Backup.run_online_backup``. The report is written when the
+session ends, with totals per builder and per fixture.
+
+:data:`context` follows the test and fixture pytest is busy with, for the
+other profiling plugins.
+"""
+import json
+import threading
+import time
+
+import pytest
+
+from testfm.base import Command
+from testfm.remote import phases
+from testfm.remote import redact
+from testfm.remote import register
+
+PHASES = ("queue", "connect", "exec", "parse")
+
+
+class Context:
+    """Test, test phase and fixture the session is busy with"""
+
+    def __init__(self):
+        self.nodeid = None
+        self.when = None
+        self.fixtures = []
+        self.scopes = []
+
+    @property
+    def fixture(self):
+        """Fixture being set up, the innermost one if several are"""
+        return self.fixtures[-1] if self.fixtures else None
+
+    @property
+    def scope(self):
+        """Scope of :attr:`fixture`, None outside of fixture setup"""
+        return self.scopes[-1] if self.scopes else None
+
+
+context = Context()
+
+
+def builder_of(call):
+    """Return the builder of the foreman-maintain command of a call, or None"""
+    command = call.command
+    return command.builder if isinstance(command, Command) else None
+
+
+class Timings:
+    """Middleware recording the timing of every remote call"""
+
+    def __init__(self):
+        self.records = []
+        self._teardown = []
+        self._lock = threading.Lock()
+
+    def __call__(self, call, proceed):
+        started = time.time()
+        start = time.perf_counter()
+        rc = None
+        try:
+            result = proceed()
+            rc = getattr(result, "rc", None)
+            return result
+        finally:
+            record = {
+                "test": context.nodeid,
+                "when": context.when,
+                "fixture": context.fixture,
+                "host": call.host,
+                "module": call.module,
+                "command": redact(str(call.command)) if call.command is not None else None,
+                "builder": builder_of(call),
+                "rc": rc,
+                "start": started,
+                "total": time.perf_counter() - start,
+                # the same dict receives the parse phase after the call returns
+                "phases": phases(),
+            }
+            with self._lock:
+                self.records.append(record)
+                if context.when == "teardown" and record["fixture"] is None:
+                    self._teardown.append(record)
+
+    def fixture_finished(self, name):
+        """Attribute the calls made since the previous fixture finished to fixture name"""
+        with self._lock:
+            for record in self._teardown:
+                record["fixture"] = name
+            self._teardown = []
+
+    def test_finished(self):
+        """Forget teardown calls no fixture claimed, like those of postponed restorations"""
+        with self._lock:
+            self._teardown = []
+
+    def report(self):
+        """Return the records and their totals per builder and per fixture"""
+        with self._lock:
+            records = [dict(record, phases=dict(record["phases"] or {})) for record in self.records]
+        totals = {"builders": {}, "fixtures": {}}
+        for record in records:
+            for kind, key in (("builders", record["builder"]), ("fixtures", record["fixture"])):
+                if key is None:
+                    continue
+                total = totals[kind].setdefault(key, {"calls": 0, "total": 0.0})
+                total["calls"] += 1
+                total["total"] += record["total"]
+                for name in PHASES:
+                    total[name] = total.get(name, 0.0) + record["phases"].get(name, 0.0)
+        return {"calls": records, "totals": totals}
+
+    def write(self, path):
+        """Write :meth:`report` to path as JSON"""
+        with open(path, "w") as handle:
+            json.dump(self.report(), handle, indent=1)
+
+
+timings = Timings()
+
+
+def pytest_addoption(parser):
+    """Add the report option"""
+    parser.addoption(
+        "--timing-report",
+        metavar="PATH",
+        help="Write the phase timings of every remote call to a JSON file",
+    )
+
+
+def pytest_configure(config):
+    """Record the calls if a report is wanted"""
+    if config.getoption("timing_report"):
+        register(timings)
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_protocol(item, nextitem):
+    """Follow the running test"""
+    context.nodeid = item.nodeid
+    yield
+    context.nodeid = None
+    context.when = None
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_setup(item):
+    """Follow the test phase"""
+    context.when = "setup"
+    yield
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_call(item):
+    """Follow the test phase"""
+    context.when = "call"
+    yield
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_teardown(item, nextitem):
+    """Follow the test phase"""
+    context.when = "teardown"
+    yield
+    timings.test_finished()
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_fixture_setup(fixturedef, request):
+    """Follow the fixture being set up"""
+    context.fixtures.append(fixturedef.argname)
+    context.scopes.append(fixturedef.scope)
+    yield
+    context.fixtures.pop()
+    context.scopes.pop()
+
+
+def pytest_fixture_post_finalizer(fixturedef, request):
+    """Claim the teardown calls made since the previous fixture was torn down"""
+    timings.fixture_finished(fixturedef.argname)
+
+
+def pytest_sessionfinish(session, exitstatus):
+    """Write the report"""
+    path = session.config.getoption("timing_report")
+    if path:
+        timings.write(path)
@@ -0,0 +1,242 @@
+"""Timeline of a test session in the Chrome trace event format.
+
+With ``--trace-events trace.json`` this plugin writes a file which Perfetto
+(https://ui.perfetto.dev) or ``chrome://tracing`` show as a timeline:
+
+* the ``tests`` track of the pytest process has a span per test, nesting
+  spans for its setup, call and teardown, which nest the set up and tear down
+  of each fixture,
+* every host gets a track with a span per remote call, tagged with the test
+  and fixture it was made for.
+
+Gaps between the spans are time spent in pytest and TestFM itself. When
+:mod:`testfm.runner` is given ``--trace-events``, the timelines of its workers
+are merged into one file with a process per worker.
+"""
+import json
+import os
+import threading
+import time
+
+import pytest
+
+from testfm.remote import redact
+from testfm.remote import register
+from testfm.timing import builder_of
+from testfm.timing import context
+
+# fixtures torn down quicker than this have no finalizer, they are left out
+MIN_TEARDOWN = 0.001
+
+
+def _now():
+    """Return the wall clock in microseconds, shared by the workers of a run"""
+    return time.time() * 1e6
+
+
+class Trace:
+    """Trace events of this pytest process
+
+    @param name: process name shown in the timeline
+    """
+
+    def __init__(self, name=None):
+        self.pid = os.getpid()
+        self.events = []
+        self._tracks = {}
+        self._lock = threading.Lock()
+        self._teardown_mark = None
+        self.rename(name or f"pytest {self.pid}")
+        # tests come first, so merged processes share their track ids
+        self.track("tests")
+
+    def rename(self, name):
+        """Set the process name shown in the timeline"""
+        self._metadata("process_name", 0, name)
+
+    def _metadata(self, kind, tid, name):
+        with self._lock:
+            self.events.append(
+                {"ph": "M", "name": kind, "pid": self.pid, "tid": tid, "args": {"name": name}}
+            )
+
+    def track(self, name):
+        """Return the thread id of track name, adding the track on first use"""
+        with self._lock:
+            tid = self._tracks.get(name)
+            if tid is not None:
+                return tid
+            tid = self._tracks[name] = len(self._tracks)
+        self._metadata("thread_name", tid, name)
+        return tid
+
+    def span(self, name, category, start, end, track="tests", **args):
+        """Add a complete span, start and end are in microseconds"""
+        event = {
+            "ph": "X",
+            "name": name,
+            "cat": category,
+            "ts": start,
+            "dur": max(end - start, 0),
+            "pid": self.pid,
+            "tid": self.track(track),
+            "args": args,
+        }
+        with self._lock:
+            self.events.append(event)
+
+    def __call__(self, call, proceed):
+        start = _now()
+        try:
+            return proceed()
+        finally:
+            command = redact(str(call.command)) if call.command is not None else None
+            name = builder_of(call) or command or call.module
+            self.span(
+                name[:80],
+                "remote",
+                start,
+                _now(),
+                track=f"host {call.host}",
+                command=command,
+                module=call.module,
+                test=context.nodeid,
+                fixture=context.fixture,
+            )
+
+    def teardown_started(self):
+        """Start timing the fixtures torn down for the current test"""
+        self._teardown_mark = _now()
+
+    def fixture_finished(self, name):
+        """Add the teardown span of fixture name, from the previous fixture torn down on"""
+        if self._teardown_mark is None:
+            return
+        end = _now()
+        if end - self._teardown_mark >= MIN_TEARDOWN * 1e6:
+            self.span(f"{name} teardown", "fixture", self._teardown_mark, end)
+        self._teardown_mark = end
+
+    def write(self, path):
+        """Write the trace events to path"""
+        with self._lock:
+            events = list(self.events)
+        with open(path, "w") as handle:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, handle)
+
+
+def merge_traces(traces, output):
+    """Merge trace files into output, skipping missing ones
+
+    Track ids are numbered by each process, so the tracks of the files merged
+    into one process are renumbered by track name.
+
+    @param traces: (path, name) pairs, the files of the same name become one process
+    """
+    events = []
+    pids = {}
+    tracks = {}
+    for path, name in traces:
+        try:
+            with open(path) as handle:
+                loaded = json.load(handle)["traceEvents"]
+        except (OSError, ValueError, KeyError):
+            continue
+        if name not in pids:
+            pids[name] = len(pids) + 1
+            tracks[name] = {}
+            events.append(
+                {"ph": "M", "name": "process_name", "pid": pids[name], "args": {"name": name}}
+            )
+        process = tracks[name]
+        tids = {}
+        for event in loaded:
+            if event.get("name") == "thread_name":
+                track = event["args"]["name"]
+                if track not in process:
+                    process[track] = len(process)
+                    events.append(dict(event, pid=pids[name], tid=process[track]))
+                tids[event.get("tid")] = process[track]
+        for event in loaded:
+            if event.get("ph") != "M":
+                events.append(dict(event, pid=pids[name], tid=tids.get(event.get("tid"), 0)))
+    with open(output, "w") as handle:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, handle)
+
+
+trace = None
+
+
+def pytest_addoption(parser):
+    """Add the trace option"""
+    parser.addoption(
+        "--trace-events",
+        metavar="PATH",
+        help="Write a timeline of tests, fixtures and remote calls in the Chrome trace format",
+    )
+
+
+def pytest_configure(config):
+    """Trace the session if asked, naming the process after the hosts it runs on"""
+    global trace
+    if config.getoption("trace_events"):
+        pattern = config.getoption("ansible_host_pattern", None)
+        trace = Trace(f"pytest {pattern}" if pattern else None)
+        register(trace)
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_protocol(item, nextitem):
+    """Add the span of the test"""
+    start = _now()
+    yield
+    if trace is not None:
+        trace.span(item.nodeid, "test", start, _now())
+
+
+def _phase_span(when, item):
+    start = _now()
+    if when == "teardown" and trace is not None:
+        trace.teardown_started()
+    yield
+    if trace is not None:
+        trace.span(when, "phase", start, _now(), test=item.nodeid)
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_setup(item):
+    """Add the span of the test setup"""
+    yield from _phase_span("setup", item)
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_call(item):
+    """Add the span of the test call"""
+    yield from _phase_span("call", item)
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_teardown(item, nextitem):
+    """Add the span of the test teardown"""
+    yield from _phase_span("teardown", item)
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_fixture_setup(fixturedef, request):
+    """Add the span of the fixture setup"""
+    start = _now()
+    yield
+    if trace is not None:
+        trace.span(f"{fixturedef.argname} setup", "fixture", start, _now())
+
+
+def pytest_fixture_post_finalizer(fixturedef, request):
+    """Add the span of the fixture teardown"""
+    if trace is not None:
+        trace.fixture_finished(fixturedef.argname)
+
+
+def pytest_sessionfinish(session, exitstatus):
+    """Write the trace"""
+    if trace is not None:
+        trace.write(session.config.getoption("trace_events"))
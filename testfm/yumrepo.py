@@ -0,0 +1,198 @@
+"""Yum repositories of generated packages, served from the controller.
+
+Fixtures installing custom or hotfix packages used to download them from
+external mirrors. :func:`build_repo` instead builds small ``noarch`` packages
+with ``rpmbuild``, optionally signs them with ``rpmsign`` and indexes them
+with ``createrepo_c`` (or ``createrepo``), all on the controller.
+:class:`RepoServer` serves the repositories over HTTP on the address the
+target host reaches the controller with::
+
+    build_repo("/tmp/repos/fake_yum0", [Package("walrus", "0.71"), Package("walrus", "5.21")])
+    with RepoServer("/tmp/repos", target="satellite.example.com") as server:
+        url = server.url("fake_yum0")
+
+Payloads are derived from the package names, so the same packages are built
+on every run. With ``--local-repos`` the fixtures use the repositories of
+:data:`LOCAL_REPOS` instead of ``FAKE_YUM0_REPO`` and ``HOTFIX_URL``.
+"""
+import os
+import random
+import shutil
+import socket
+import subprocess
+import tempfile
+import threading
+from collections import namedtuple
+from functools import partial
+from http.server import SimpleHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+
+Package = namedtuple("Package", ["name", "version", "release", "size"], defaults=("1.0", "1", 1024))
+Package.__doc__ = "Package to generate, size is the size of its payload in bytes"
+
+# repositories replacing the external ones used by the fixtures
+LOCAL_REPOS = {
+    "fake_yum0": [Package("walrus", "0.71"), Package("walrus", "5.21")],
+    # foreman-maintain recognizes hotfixes by their release
+    "hotfix": [Package("hotfix-package", "1.0", "1HOTFIX")],
+}
+
+SPEC = """Name: {name}
+Version: {version}
+Release: {release}
+Summary: Package generated by TestFM
+License: GPLv2
+BuildArch: noarch
+Source0: {source}
+
+%description
+Package generated by TestFM for repository tests.
+
+%install
+mkdir -p %{{buildroot}}/usr/share/testfm/{name}
+cp %{{SOURCE0}} %{{buildroot}}/usr/share/testfm/{name}/payload
+
+%files
+/usr/share/testfm/{name}/payload
+"""
+# gzip payloads and metadata, which el7 yum and rpm can read
+RPM_DEFINES = {
+    "_binary_payload": "w6.gzdio",
+    "_binary_filedigest_algorithm": "8",
+    "_buildhost": "testfm",
+    "use_source_date_epoch_as_buildtime": "1",
+}
+SOURCE_DATE_EPOCH = "1577836800"
+GPG_KEY_FILE = "RPM-GPG-KEY-testfm"
+
+
+class RepoError(Exception):
+    """Building a repository failed"""
+
+
+def make_packages(count, size=1024, prefix="testfm-pkg"):
+    """Return count packages named prefix-0, prefix-1, ... with payloads of size bytes"""
+    return [Package(f"{prefix}-{index}", size=size) for index in range(count)]
+
+
+def _payload(package, path):
+    # random bytes do not compress, so the package size follows the payload size
+    rng = random.Random(f"{package.name}-{package.version}-{package.release}")
+    remaining = package.size
+    with open(path, "wb") as handle:
+        while remaining > 0:
+            block = min(remaining, 1 << 20)
+            handle.write(rng.getrandbits(block * 8).to_bytes(block, "little"))
+            remaining -= block
+
+
+def _tool(*names):
+    for name in names:
+        path = shutil.which(name)
+        if path:
+            return path
+    raise RepoError(f"{' or '.join(names)} is needed on the controller to build repositories")
+
+
+def _run(argv, **kwargs):
+    proc = subprocess.run(
+        argv, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, universal_newlines=True, **kwargs
+    )
+    if proc.returncode != 0:
+        raise RepoError(f"{' '.join(argv)} failed with {proc.returncode}: {proc.stdout}")
+    return proc.stdout
+
+
+def build_rpm(package, output_dir):
+    """Build package into output_dir, return the path of the rpm"""
+    rpmbuild = _tool("rpmbuild")
+    env = dict(os.environ, SOURCE_DATE_EPOCH=SOURCE_DATE_EPOCH)
+    with tempfile.TemporaryDirectory(prefix="testfm-rpmbuild-") as topdir:
+        sources = os.path.join(topdir, "SOURCES")
+        os.makedirs(sources)
+        _payload(package, os.path.join(sources, "payload"))
+        spec = os.path.join(topdir, f"{package.name}.spec")
+        with open(spec, "w") as handle:
+            handle.write(SPEC.format(source="payload", **package._asdict()))
+        defines = dict(RPM_DEFINES, _topdir=topdir, _rpmdir=os.path.abspath(output_dir))
+        argv = [rpmbuild, "-bb", "--quiet"]
+        for name, value in defines.items():
+            argv += ["--define", f"{name} {value}"]
+        _run(argv + [spec], env=env)
+    # rpmbuild puts packages in a subdirectory per architecture
+    return os.path.join(
+        output_dir, "noarch", f"{package.name}-{package.version}-{package.release}.noarch.rpm"
+    )
+
+
+def sign(rpms, key):
+    """Sign rpms with the gpg key key, a key id or user id of the controller's keyring"""
+    _run([_tool("rpmsign"), "--addsign", "--define", f"_gpg_name {key}"] + list(rpms))
+
+
+def build_repo(directory, packages, key=None):
+    """Build packages into a yum repository in directory, signed with gpg key if given
+
+    A signed repository also gets the public key as ``RPM-GPG-KEY-testfm``.
+
+    @return: directory
+    """
+    os.makedirs(directory, exist_ok=True)
+    rpms = [build_rpm(package, directory) for package in packages]
+    if key is not None:
+        sign(rpms, key)
+        public = _run([_tool("gpg", "gpg2"), "--armor", "--export", key])
+        with open(os.path.join(directory, GPG_KEY_FILE), "w") as handle:
+            handle.write(public)
+    createrepo = _tool("createrepo_c", "createrepo")
+    argv = [createrepo, "--quiet", "--database"]
+    if os.path.basename(createrepo) == "createrepo_c":
+        argv.append("--general-compress-type=gz")
+    _run(argv + [directory])
+    return directory
+
+
+def reachable_address(target):
+    """Return the address of the controller interface used to reach host target"""
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as probe:
+        # connecting a UDP socket sends nothing, it only picks the route
+        probe.connect((socket.gethostbyname(target), 80))
+        return probe.getsockname()[0]
+
+
+class RepoServer(ThreadingHTTPServer):
+    """HTTP server of a directory of repositories, serving in a thread as a context manager
+
+    @param directory: directory served, with one repository per subdirectory
+    @param target: host the repositories are for, to advertise the address it can reach
+    @param port: port to listen on, any free one by default
+    @param address: advertised address, found from target by default
+    """
+
+    daemon_threads = True
+
+    def __init__(self, directory, target=None, port=0, address=None):
+        handler = partial(_QuietHandler, directory=os.path.abspath(directory))
+        super().__init__(("0.0.0.0", port), handler)
+        self.port = self.server_address[1]
+        if address is None:
+            address = reachable_address(target) if target else socket.gethostname()
+        self.address = address
+
+    def url(self, repo=None):
+        """Return the URL of repository repo, a subdirectory, or of the served directory"""
+        base = f"http://{self.address}:{self.port}/"
+        return f"{base}{repo}/" if repo else base
+
+    def __enter__(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+        self.server_close()
+
+
+class _QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
@@ -1,10 +1,14 @@
 import datetime
+import os
 
 import pytest
-import yaml
 from fauxfactory import gen_string
 
 from testfm.advanced import Advanced
+from testfm.artifacts import artifacts
+from testfm.artifacts import LATEST_MAX_AGE
+from testfm.batch import Batch
+from testfm.cache import read_cache
 from testfm.constants import CAPSULE_DOGFOOD_ACTIVATIONKEY
 from testfm.constants import DOGFOOD_ACTIVATIONKEY
 from testfm.constants import DOGFOOD_ORG
@@ -13,22 +17,131 @@ from testfm.constants import FAKE_YUM0_REPO
 from testfm.constants import fm_hammer_yml
 from testfm.constants import FM_RHN_POOLID
 from testfm.constants import foreman_maintain_yml
+from testfm.constants import get_pip_url
 from testfm.constants import HOTFIX_URL
 from testfm.constants import katello_ca_consumer
+from testfm.constants import pexpect_wheels
 from testfm.constants import RHN_PASSWORD
 from testfm.constants import RHN_USERNAME
 from testfm.constants import satellite_answer_file
 from testfm.constants import upstream_url
+from testfm.decorators import version_tuple
+from testfm.executor import configure
+from testfm.executor import default_executor
+from testfm.executor import DEFAULT_INVENTORY
+from testfm.executor import DEFAULT_PATTERN
+from testfm.executor import DEFAULT_USER
+from testfm.facts import cache as facts_cache
+from testfm.hammer import BACKENDS
+from testfm.hammer import hammer_client
 from testfm.helpers import product
 from testfm.helpers import server
 from testfm.log import logger
 from testfm.maintenance_mode import MaintenanceMode
 from testfm.packages import Packages
+from testfm.remote import register
+from testfm.remote import RemoteModule
 from testfm.service import Service
+from testfm.snapshot import FileSnapshot
+from testfm.state import tracker
+from testfm.subscription import cdn_batch
+from testfm.subscription import dogfood_batch
+from testfm.subscription import registration
+from testfm.subscription import unregister_batch
+from testfm.yumrepo import build_repo
+from testfm.yumrepo import LOCAL_REPOS
+from testfm.yumrepo import RepoServer
+
+pytest_plugins = [
+    "testfm.budget",
+    "testfm.cassette",
+    "testfm.dbcheckpoint",
+    "testfm.decorators",
+    "testfm.fixturecost",
+    "testfm.resources",
+    "testfm.state",
+    "testfm.timing",
+    "testfm.trace",
+]
+
+
+def pytest_addoption(parser):
+    """Add TestFM command line options"""
+    parser.addoption(
+        "--refresh-facts",
+        action="store_true",
+        help="Query host version and role again instead of using facts cached by earlier runs",
+    )
+    parser.addoption(
+        "--hammer-backend",
+        choices=BACKENDS,
+        default="api",
+        help="How fixtures make Foreman changes: REST API calls or a persistent hammer shell",
+    )
+    parser.addoption(
+        "--no-read-cache",
+        action="store_true",
+        help="Run read-only commands like 'health list' every time instead of reusing results",
+    )
+    parser.addoption(
+        "--local-repos",
+        action="store_true",
+        help="Build the custom and hotfix package repositories on the controller and serve "
+        "them from there instead of using the external mirrors",
+    )
+
+
+def pytest_configure(config):
+    """Point the helpers' executor at the inventory, hosts and user given to pytest-ansible"""
+    configure(
+        inventory=config.getoption("ansible_inventory", None) or DEFAULT_INVENTORY,
+        pattern=config.getoption("ansible_host_pattern", None) or DEFAULT_PATTERN,
+        user=config.getoption("ansible_user", None) or DEFAULT_USER,
+    )
+    if config.getoption("refresh_facts"):
+        facts_cache.invalidate()
+    # other workers sharing the host change what read-only commands report
+    if not config.getoption("no_read_cache") and not config.getoption("shared_host"):
+        # cache hits are no remote calls for budgets, timings and fixture costs
+        register(read_cache, outermost=True)
+
+
+def pytest_unconfigure(config):
+    """Close the persistent connections of the helpers' executor"""
+    default_executor().close()
+
+
+@pytest.fixture(scope="function")
+def ansible_module(ansible_module, request):
+    """Route every call of pytest-ansible's ansible_module through testfm.remote"""
+    pattern = request.config.getoption("ansible_host_pattern", None) or DEFAULT_PATTERN
+    return RemoteModule(ansible_module, pattern)
+
+
+@pytest.fixture(scope="session")
+def hammer(request):
+    """Client of the Foreman operations used by fixtures, see testfm.hammer"""
+    client = hammer_client(request.config.getoption("hammer_backend"))
+    request.addfinalizer(client.close)
+    return client
+
+
+@pytest.fixture(scope="session")
+def yum_repos(request, tmpdir_factory):
+    """URLs of the custom (fake_yum0) and hotfix package repositories, see testfm.yumrepo"""
+    if not request.config.getoption("local_repos"):
+        return {"fake_yum0": FAKE_YUM0_REPO, "hotfix": HOTFIX_URL}
+    directory = str(tmpdir_factory.mktemp("repos"))
+    for name, packages in LOCAL_REPOS.items():
+        build_repo(os.path.join(directory, name), packages)
+    server = RepoServer(directory, target=default_executor().transport_for().host)
+    server.__enter__()
+    request.addfinalizer(server.__exit__)
+    return {name: server.url(name) for name in LOCAL_REPOS}
 
 
 @pytest.fixture(scope="function")
-def setup_hotfix_check(request, ansible_module):
+def setup_hotfix_check(request, ansible_module, yum_repos):
     """This fixture is used for installing hofix package and modifying foreman file.
     This fixture is used in test_positive_check_hotfix_installed_with_hotfix of test_health.py
     """
@@ -39,43 +152,41 @@ def setup_hotfix_check(request, ansible_module):
     )
     dpath = file.values()[0]["files"][0]["path"]
     fpath = dpath + "/lib/fog/vsphere/requests/compute/list_clusters.rb"
+    snapshot = FileSnapshot([fpath, "/etc/yum.repos.d/hotfix_repo.repo"]).take()
     ansible_module.lineinfile(dest=fpath, insertafter="EOF", line="#modifying_file")
 
     ansible_module.yum_repository(
         name="hotfix_repo",
         description="hotfix_repo",
         file="hotfix_repo",
-        baseurl=HOTFIX_URL,
+        baseurl=yum_repos["hotfix"],
         enabled="yes",
         gpgcheck="no",
     )
     setup = ansible_module.file(path="/etc/yum.repos.d/hotfix_repo.repo", state="present")
     assert setup.values()[0]["changed"] == 0
-    pkgs_locked = ansible_module.command(Packages.is_locked()).values()[0]["rc"]
-    if pkgs_locked == 0:
-        ansible_module.command(Packages.unlock())
-    setup = ansible_module.yum(name="hotfix-package", state="present")
-    for result in setup.values():
-        assert result["rc"] == 0
-    if pkgs_locked == 0:
-        ansible_module.command(Packages.lock())
+    setup = (
+        Batch()
+        .add(f"{Packages.is_locked()} && PKGS_LOCKED=1", rc=None)
+        .add(f'[ -z "$PKGS_LOCKED" ] || {Packages.unlock()}')
+        .add("yum -y install hotfix-package")
+        .add(f'[ -z "$PKGS_LOCKED" ] || {Packages.lock()}')
+    )
+    for steps in setup.run(ansible_module).values():
+        assert all(step.ok for step in steps), steps
 
     def teardown_hotfix_check():
-        pkgs_locked = ansible_module.command(Packages.is_locked()).values()[0]["rc"]
-        if pkgs_locked == 0:
-            ansible_module.command(Packages.unlock())
-        teardown = ansible_module.command("yum -y reinstall tfm-rubygem-fog-vsphere")
-        for result in teardown.values():
-            assert result["rc"] == 0
-
-        teardown = ansible_module.file(path="/etc/yum.repos.d/hotfix_repo.repo", state="absent")
-        assert teardown.values()[0]["changed"] == 1
-        teardown = ansible_module.yum(name=["hotfix-package"], state="absent")
-        for result in teardown.values():
-            assert result["rc"] == 0
-        if pkgs_locked == 0:
-            ansible_module.command(Packages.lock())
-        ansible_module.command("yum clean all")
+        teardown = (
+            Batch()
+            .add(f"{Packages.is_locked()} && PKGS_LOCKED=1", rc=None)
+            .add(f'[ -z "$PKGS_LOCKED" ] || {Packages.unlock()}')
+            .add("yum -y remove hotfix-package")
+            .add(f'[ -z "$PKGS_LOCKED" ] || {Packages.lock()}')
+        )
+        for steps in teardown.run(ansible_module).values():
+            assert all(step.ok for step in steps), steps
+        # puts back the gem file and removes the hotfix repository
+        snapshot.restore()
 
     request.addfinalizer(teardown_hotfix_check)
     return fpath
@@ -123,9 +234,11 @@ def setup_katello_service_stop(request, ansible_module):
     """This fixture is used to stop/start katello services.
     It is used by test test_negative_check_server_ping of test_health.py.
     """
-    setup = ansible_module.command(Advanced.run_katello_service_stop())
-    for result in setup.values():
-        assert result["rc"] == 0
+
+    def katello_service_stop():
+        setup = ansible_module.command(Advanced.run_katello_service_stop())
+        for result in setup.values():
+            assert result["rc"] == 0
 
     def teardown_katello_service_start():
         teardown = ansible_module.command(Advanced.run_service_start())
@@ -133,7 +246,8 @@ def setup_katello_service_stop(request, ansible_module):
             logger.info(result["stdout"])
             assert result["rc"] == 0
 
-    request.addfinalizer(teardown_katello_service_start)
+    tracker.need("services", "down", katello_service_stop)
+    request.addfinalizer(lambda: tracker.restore("services", "up", teardown_katello_service_start))
 
 
 @pytest.fixture(scope="function")
@@ -144,75 +258,56 @@ def setup_install_pexpect(ansible_module, request):
     test_positive_check_old_foreman_tasks of test_advanced.py and in
     fixture setup_puppet_empty_cert.
     """
-    ansible_module.get_url(url="https://bootstrap.pypa.io/get-pip.py", dest="/root")
-    setup = ansible_module.command("python3 /root/get-pip.py")
-    for result in setup.values():
-        assert result["rc"] == 0
-    setup = ansible_module.command("pip install pexpect")
-    for result in setup.values():
-        assert result["rc"] == 0
+    installed = []
+    if ansible_module.command("python3 -c 'import pexpect'").values()[0]["rc"] != 0:
+        get_pip = artifacts.push(get_pip_url, max_age=LATEST_MAX_AGE)
+        wheels = os.path.dirname(artifacts.push(pexpect_wheels[0]))
+        for url in pexpect_wheels[1:]:
+            artifacts.push(url)
+        local = f"--no-index --find-links {wheels}"
+        if ansible_module.command("python3 -m pip --version").values()[0]["rc"] != 0:
+            setup = ansible_module.command(f"python3 {get_pip} {local} --no-setuptools --no-wheel")
+            assert setup.values()[0]["rc"] == 0
+            installed.append("pip")
+        setup = ansible_module.command(f"python3 -m pip install {local} pexpect")
+        assert setup.values()[0]["rc"] == 0
+        installed.append("pexpect")
 
     def teardown_uninstall():
-        uninstall_pexpect = ansible_module.command("pip uninstall pexpect -y")
-        assert uninstall_pexpect.values()[0]["rc"] == 0
-        uninstall_pip = ansible_module.command("pip uninstall pip -y")
-        assert uninstall_pip.values()[0]["rc"] == 0
+        for name in reversed(installed):
+            uninstall = ansible_module.command(f"python3 -m pip uninstall {name} -y")
+            assert uninstall.values()[0]["rc"] == 0
 
     request.addfinalizer(teardown_uninstall)
 
 
 @pytest.fixture(scope="function")
-def setup_sync_plan(request, ansible_module):
+def setup_sync_plan(request, ansible_module, hammer):
     """This fixture is used to create/delete sync-plan.
     It is used by tests test_positive_sync_plan_disable_enable and test_positive_maintenance_mode.
     """
     sync_plan_name = gen_string("alpha")
-    ansible_module.lineinfile(
+    contacted = ansible_module.lineinfile(
         dest=foreman_maintain_yml, insertafter="EOF", line=":manage_crond: true"
     )
+    # fetch stores files under the inventory name of the host
+    sat_hostname = list(contacted.keys())[0]
 
     def sync_plan():
-        org_ids = []
-        sync_ids = []
-        sat_hostname = ""
         sync_date = datetime.datetime.today().strftime("%Y-%m-%d")
-        setup = ansible_module.command(
-            'hammer sync-plan create --name {} --enabled true \
-            --interval "weekly" --sync-date {} --organization-id 1'.format(
-                sync_plan_name, sync_date
-            )
-        )
-        for result in setup.values():
-            assert result["rc"] == 0
-        # Find all sync-plan id present in satellite
-        for facts in ansible_module.setup().items():
-            sat_hostname = facts[0]
-        setup = ansible_module.shell("hammer --output json organization list > /tmp/orgs.yaml")
-        ansible_module.fetch(src="/tmp/orgs.yaml", dest="./")
-        with open(f"./{sat_hostname}/tmp/orgs.yaml") as f:
-            org_yml = yaml.safe_load(f)
-        for id in org_yml:
-            org_ids.append(id["Id"])
-        for id in org_ids:
-            ansible_module.shell(
-                "hammer --output yaml sync-plan list --organization-id {} | "
-                "sed -n '1!p' >> /tmp/sync_id.yaml".format(id)
-            )
-        ansible_module.fetch(src="/tmp/sync_id.yaml", dest="./")
-        with open(f"./{sat_hostname}/tmp/sync_id.yaml") as f:
-            sync_yml = yaml.safe_load(f)
-            for id in sync_yml:
-                if id["Enabled"]:
-                    sync_ids.append(id["Id"])
+        hammer.sync_plan_create(sync_plan_name, 1, interval="weekly", sync_date=sync_date)
+        # Find all enabled sync-plan ids present in satellite
+        sync_ids = {plan.id for plan in hammer.sync_plans() if plan.enabled}
         request.addfinalizer(teardown_sync_plan)
-        return list(set(sync_ids)), sat_hostname
+        return list(sync_ids), sat_hostname
 
-    def teardown_sync_plan():
+    def maintenance_mode_stop():
         teardown = ansible_module.command(MaintenanceMode.stop())
         for result in teardown.values():
             assert result["rc"] == 0
-        for path in ["/tmp/sync_id.yaml", "/tmp/orgs.yaml"]:
-            ansible_module.file(path=path, state="absent")
+
+    def teardown_sync_plan():
+        tracker.restore("maintenance_mode", "off", maintenance_mode_stop)
         ansible_module.lineinfile(
             dest=foreman_maintain_yml, state="absent", line=":manage_crond: true"
         )
@@ -263,40 +358,29 @@ def setup_subscribe_to_cdn_dogfood(request, ansible_module):
     and unsubscribe from CDN after test finishes and subscribe back to dogfood.
     It is used by test test_positive_repositories_setup of test_health.py.
     """
-    subscribed_to = str(
-        ansible_module.command("subscription-manager identity").values()[0]["stdout"]
-    )
-    if "Quality Assurance" in subscribed_to:
-        subscribed_to_cdn = True
-    else:
-        subscribed_to_cdn = False
-    if subscribed_to_cdn is False:
-        ansible_module.command("subscription-manager unregister")
-        ansible_module.command("subscription-manager clean")
-        ca_consumer = ansible_module.command("yum list katello-ca-consumer*").values()[0]["stdout"]
-        if "katello-ca-consumer" in ca_consumer:
-            pkg_name = [t for t in ca_consumer.split() if t.startswith("katello-ca-consumer")][0]
-            ansible_module.yum(name=pkg_name, state="absent")
-        credentials = f' --user="{RHN_USERNAME}" --password="{RHN_PASSWORD}"'
-        ansible_module.command("subscription-manager register --force" + credentials)
-        for pool_id in FM_RHN_POOLID.split():
-            ansible_module.command(f"subscription-manager subscribe --pool={pool_id}")
+
+    def dogfood():
+        if server() == "satellite":
+            activationkey = DOGFOOD_ACTIVATIONKEY
+        else:
+            activationkey = CAPSULE_DOGFOOD_ACTIVATIONKEY
+        ca_consumer = artifacts.push(katello_ca_consumer, max_age=LATEST_MAX_AGE)
+        return dogfood_batch(ca_consumer, DOGFOOD_ORG, activationkey)
+
+    batches = {
+        "cdn": lambda: cdn_batch(RHN_USERNAME, RHN_PASSWORD, FM_RHN_POOLID.split()),
+        "dogfood": dogfood,
+        "unregistered": unregister_batch,
+    }
+
+    def switch_to(state):
+        return lambda: registration.switch(ansible_module, state, batches[state])
+
+    tracker.need("subscription", "cdn", switch_to("cdn"))
 
     def teardown_subscribe_to_cdn_dogfood():
-        if subscribed_to_cdn is False:
-            ansible_module.command("subscription-manager unregister")
-            ansible_module.command("subscription-manager clean")
-            ansible_module.command(f"yum -y localinstall {katello_ca_consumer}")
-            if server() == "satellite":
-                ansible_module.command(
-                    f'subscription-manager register --force --org="{DOGFOOD_ORG}" '
-                    f'--activationkey="{DOGFOOD_ACTIVATIONKEY}"'
-                )
-            else:
-                ansible_module.command(
-                    f'subscription-manager register --force --org="{DOGFOOD_ORG}" '
-                    f'--activationkey="{CAPSULE_DOGFOOD_ACTIVATIONKEY}"'
-                )
+        if registration.home != "cdn":
+            tracker.restore("subscription", registration.home, switch_to(registration.home))
         else:
             contacted = ansible_module.command(
                 Advanced.run_repositories_setup({"version": product()})  # Satellite minor version
@@ -313,7 +397,9 @@ def setup_subscribe_to_cdn_dogfood(request, ansible_module):
 def setup_epel_repository(request, ansible_module):
     """Setup/teardown fixture used by test_positive_check_epel_repository
     and test_positive_check_epel_repository_with_invalid_repo"""
-    setup = ansible_module.yum(name=epel_repo, state="present")
+    setup = ansible_module.yum(
+        name=artifacts.push(epel_repo, max_age=LATEST_MAX_AGE), state="present"
+    )
     assert setup.values()[0]["rc"] == 0
 
     def teardown_epel_repository():
@@ -345,31 +431,22 @@ def setup_invalid_repository(request, ansible_module):
 @pytest.fixture(scope="function")
 def setup_bz_1696862(request, ansible_module):
     """Setup/teardown fixture used by test test_positive_fm_service_restart_bz_1696862"""
-    if float(product()) >= 6.6:
-        contacted = ansible_module.lineinfile(
+    hammer_yml = ".hammer/cli.modules.d/foreman.yml"
+    snapshot = FileSnapshot([satellite_answer_file, hammer_yml, fm_hammer_yml]).take()
+    request.addfinalizer(snapshot.restore)
+    if version_tuple(product()) >= (6, 6):
+        ansible_module.lineinfile(
             dest=satellite_answer_file,
             regexp="  initial_admin_password:",
             line="  initial_admin_password: invalid_password",
-            backup="yes",
         )
     else:
-        contacted = ansible_module.lineinfile(
+        ansible_module.lineinfile(
             dest=satellite_answer_file,
             regexp="  admin_password:",
             line="  admin_password: invalid_password",
-            backup="yes",
-        )
-    ansible_module.command("mv .hammer/cli.modules.d/foreman.yml /tmp/foreman.yml")
-    ansible_module.command(f"mv {fm_hammer_yml} /tmp/foreman-maintain-hammer.yml")
-
-    def teardown_bz_1696862():
-        ansible_module.command("mv /tmp/foreman.yml .hammer/cli.modules.d/foreman.yml")
-        ansible_module.command(f"mv /tmp/foreman-maintain-hammer.yml {fm_hammer_yml}")
-        ansible_module.command(
-            "mv {} {}".format(contacted.values()[0]["backup"], satellite_answer_file)
         )
-
-    request.addfinalizer(teardown_bz_1696862)
+    ansible_module.command(f"rm -f {hammer_yml} {fm_hammer_yml}")
 
 
 @pytest.fixture(scope="function")
@@ -401,12 +478,16 @@ def setup_backup_tests(request, ansible_module):
     """Teardown for backup/restore tests"""
     setup = ansible_module.shell("rm -rf /tmp/backup-*; rm -rf /mnt/satellite-backup-*")
     assert setup.values()[0]["rc"] == 0
-    ansible_module.command(Service.service_start())
+
+    def service_start():
+        ansible_module.command(Service.service_start())
+
+    tracker.need("services", "up", service_start)
 
     def teardown_backup_tests():
         teardown = ansible_module.shell("rm -rf /tmp/backup-*; rm -rf /mnt/satellite-backup-*")
         assert teardown.values()[0]["rc"] == 0
-        ansible_module.command(Service.service_start())
+        tracker.restore("services", "up", service_start)
 
     request.addfinalizer(teardown_backup_tests)
 
@@ -414,95 +495,79 @@ def setup_backup_tests(request, ansible_module):
 @pytest.fixture(scope="function")
 def setup_packages_lock_tests(request, ansible_module, setup_subscribe_to_cdn_dogfood):
     """Setup/Teardown for Packages lock tests"""
+
+    def lock_package_versions():
+        lock = ansible_module.command("satellite-installer --lock-package-versions")
+        for result in lock.values():
+            logger.info(result["stdout"])
+            assert result["rc"] == 0
+
+    tracker.need("packages", "locked", lock_package_versions)
     # Test whether packages are locked or not
-    contacted = ansible_module.command("satellite-installer --lock-package-versions")
-    for result in contacted.values():
-        logger.info(result["stdout"])
-        assert result["rc"] == 0
-    contacted = ansible_module.command(Packages.status())
-    for result in contacted.values():
-        logger.info(result["stdout"])
-        assert "Packages are locked." in result["stdout"]
-        assert "Automatic locking of package versions is enabled in installer." in result["stdout"]
-        assert "FAIL" not in result["stdout"]
-        assert result["rc"] == 0
-    contacted = ansible_module.command(Packages.is_locked())
-    for result in contacted.values():
-        logger.info(result["stdout"])
-        assert "Packages are locked" in result["stdout"]
-        assert result["rc"] == 0
-    contacted = ansible_module.yum(name="zsh", state="absent")
-    for result in contacted.values():
-        assert result["rc"] == 0
-    contacted = ansible_module.yum(name="elinks", state="absent")
-    for result in contacted.values():
-        assert result["rc"] == 0
+    setup = (
+        Batch()
+        .add(Packages.status())
+        .add(Packages.is_locked())
+        .add("yum -y remove zsh")
+        .add("yum -y remove elinks")
+    )
+    for steps in setup.run(ansible_module).values():
+        for step in steps:
+            logger.info(step.stdout)
+        assert all(step.ok for step in steps), steps
+        status, is_locked, _, _ = steps
+        assert "Packages are locked." in status.stdout
+        assert "Automatic locking of package versions is enabled in installer." in status.stdout
+        assert "FAIL" not in status.stdout
+        assert "Packages are locked" in is_locked.stdout
 
     def teardown_packages_lock_tests():
-        contacted = ansible_module.yum(name="zsh", state="absent")
-        for result in contacted.values():
-            assert result["rc"] == 0
-        contacted = ansible_module.yum(name="elinks", state="absent")
-        for result in contacted.values():
-            assert result["rc"] == 0
         # lock packages
-        teardown = ansible_module.command("satellite-installer --lock-package-versions")
-        for result in teardown.values():
-            logger.info(result["stdout"])
-            assert result["rc"] == 0
+        teardown = Batch().add("yum -y remove zsh").add("yum -y remove elinks")
+        for steps in teardown.run(ansible_module).values():
+            for step in steps:
+                logger.info(step.stdout)
+            assert all(step.ok for step in steps), steps
+        tracker.restore("packages", "locked", lock_package_versions)
 
     request.addfinalizer(teardown_packages_lock_tests)
 
 
 @pytest.fixture(scope="function")
-def setup_tftp_storage(request, ansible_module):
+def setup_tftp_storage(request, hammer):
     """Setup/Teardown for test_positive_check_tftp_storage"""
-    setup = ansible_module.command("hammer settings set --name token_duration --value 2")
-    assert setup.values()[0]["rc"] == 0
+    hammer.setting_set("token_duration", 2)
 
     def teardown_tftp_storage():
-        teardown = ansible_module.command("hammer settings set --name token_duration --value 360")
-        assert teardown.values()[0]["rc"] == 0
+        hammer.setting_set("token_duration", 360)
 
     request.addfinalizer(teardown_tftp_storage)
 
 
 @pytest.fixture(scope="function")
-def setup_yum_content(request, ansible_module):
+def setup_yum_content(request, hammer, yum_repos):
     """Setup/Teardown custom yum repo for test_positive_content_migrate"""
     prod_name = gen_string("alpha")
     repo_name = gen_string("alpha")
-    repo_url = FAKE_YUM0_REPO
+    repo_url = yum_repos["fake_yum0"]
 
-    ansible_module.command(f"hammer product create --organization-id 1 --name {prod_name}")
-    ansible_module.command(
-        f"hammer repository create --organization-id 1 --name {repo_name} --product {prod_name} "
-        f"--content-type 'yum' --url {repo_url} --download-policy 'immediate'"
-    )
-    setup = ansible_module.command(
-        f"hammer repository synchronize --organization-id 1 --product {prod_name} "
-        f"--name {repo_name}"
-    )
-    assert setup.values()[0]["rc"] == 0
+    hammer.product_create(prod_name, 1)
+    hammer.repository_create(repo_name, prod_name, 1, repo_url, download_policy="immediate")
+    hammer.repository_synchronize(repo_name, prod_name, 1)
 
     def teardown_yum_content():
-        teardown = ansible_module.command(
-            f"hammer product delete --organization-id 1 --name {prod_name}"
-        )
-        assert teardown.values()[0]["rc"] == 0
+        hammer.product_delete(prod_name, 1)
 
     request.addfinalizer(teardown_yum_content)
 
 
 @pytest.fixture(scope="function")
-def setup_corrupted_role(request, ansible_module):
+def setup_corrupted_role(request, ansible_module, hammer):
     """This fixture is used to corrupt a role for test test_corrupted_roles"""
     role_name = "test_role"
     resource_type = gen_string("alpha")
-    ansible_module.command(f"hammer role create --name {role_name}")
-    ansible_module.command(
-        f"hammer filter create --role {role_name} --permissions view_hosts,console_hosts"
-    )
+    hammer.role_create(role_name)
+    hammer.filter_create(role_name, ["view_hosts", "console_hosts"])
     permission_name = r"'\''console_hosts'\''"
     resource_type = rf"'\''{resource_type}'\''"
     setup = ansible_module.shell(
@@ -518,20 +583,19 @@ def setup_corrupted_role(request, ansible_module):
             resource_type = {resource_type} WHERE name = {permission_name};'"'''
         )
         assert setup.values()[0]["rc"] == 0
-        teardown = ansible_module.command(f"hammer role delete --name {role_name}")
-        assert teardown.values()[0]["rc"] == 0
+        hammer.role_delete(role_name)
 
     request.addfinalizer(teardown_corrupted_role)
 
 
 @pytest.fixture(scope="function")
-def setup_custom_package(request, ansible_module):
+def setup_custom_package(request, ansible_module, yum_repos):
     """Setup/Teardown cusom yum repo/package for non-rh-packages check."""
     ansible_module.yum_repository(
         name="custom_repo",
         description="custom repo",
         file="custom_repo",
-        baseurl=f"{FAKE_YUM0_REPO}",
+        baseurl=yum_repos["fake_yum0"],
         enabled="yes",
         gpgcheck="no",
     )
@@ -592,13 +656,13 @@ def change_admin_passwd(request, setup_install_pexpect, ansible_module):
 
 
 @pytest.fixture(scope="function")
-def setup_packages_update(request, ansible_module):
+def setup_packages_update(request, ansible_module, yum_repos):
     """This fixture is used to downgrade a package for test test_positive_fm_packages_update"""
     ansible_module.yum_repository(
         name="custom_repo",
         description="custom_repo",
         file="custom_repo",
-        baseurl=FAKE_YUM0_REPO,
+        baseurl=yum_repos["fake_yum0"],
         enabled="yes",
         gpgcheck="no",
     )
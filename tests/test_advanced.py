@@ -8,8 +8,8 @@ from testfm.constants import cap_repos
 from testfm.constants import fm_hammer_yml
 from testfm.constants import sat_beta_repo
 from testfm.constants import sat_repos
+from testfm.decorators import run_only_on_server
 from testfm.decorators import stubbed
-from testfm.helpers import server
 from testfm.log import logger
 
 
@@ -115,6 +115,7 @@ def test_positive_foreman_maintain_packages_update(ansible_module):
         assert "FAIL" not in result["stdout"]
 
 
+@pytest.mark.destructive
 def test_positive_foreman_taks_delete_old(ansible_module):
     """Delete old foreman-tasks using advanced procedure run
 
@@ -137,6 +138,7 @@ def test_positive_foreman_taks_delete_old(ansible_module):
         assert "FAIL" not in result["stdout"]
 
 
+@pytest.mark.destructive
 def test_positive_foreman_taks_delete_planning(ansible_module):
     """Delete planning foreman-tasks using advanced procedure run
 
@@ -159,6 +161,7 @@ def test_positive_foreman_taks_delete_planning(ansible_module):
         assert "FAIL" not in result["stdout"]
 
 
+@pytest.mark.destructive
 def test_positive_foreman_taks_delete_pending(ansible_module):
     """Delete pending foreman-tasks using advanced procedure run
 
@@ -420,7 +423,7 @@ def test_positive_satellite_repositories_setup(setup_subscribe_to_cdn_dogfood, a
 
 
 @pytest.mark.capsule
-@pytest.mark.skipif(server() == "satellite", reason="Test intended to run only on Capsule servers")
+@run_only_on_server("capsule")
 def test_positive_capsule_repositories_setup(setup_subscribe_to_cdn_dogfood, ansible_module):
     """Verify that all required capsule repositories gets enabled.
 
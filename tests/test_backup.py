@@ -312,6 +312,7 @@ def test_positive_backup_online_all(setup_backup_tests, ansible_module):
 
 
 @pytest.mark.capsule
+@pytest.mark.destructive
 def test_positive_backup_offline(setup_backup_tests, ansible_module):
     """Take offline backup of server
 
@@ -345,6 +346,7 @@ def test_positive_backup_offline(setup_backup_tests, ansible_module):
 
 
 @pytest.mark.capsule
+@pytest.mark.destructive
 def test_positive_backup_offline_skip_pulp_content(setup_backup_tests, ansible_module):
     """Take offline backup of server skipping pulp content
 
@@ -381,6 +383,7 @@ def test_positive_backup_offline_skip_pulp_content(setup_backup_tests, ansible_m
 
 
 @pytest.mark.capsule
+@pytest.mark.destructive
 def test_positive_backup_offline_preserve_directory(setup_backup_tests, ansible_module):
     """Take offline backup of server preserving directory
 
@@ -415,6 +418,7 @@ def test_positive_backup_offline_preserve_directory(setup_backup_tests, ansible_
 
 
 @pytest.mark.capsule
+@pytest.mark.destructive
 def test_positive_backup_offline_split_pulp_tar(setup_backup_tests, ansible_module):
     """Take offline backup of server splitting pulp tar
 
@@ -450,6 +454,7 @@ def test_positive_backup_offline_split_pulp_tar(setup_backup_tests, ansible_modu
 
 
 @pytest.mark.capsule
+@pytest.mark.destructive
 def test_positive_backup_offline_incremental(setup_backup_tests, ansible_module):
     """Take offline incremental backup of server
 
@@ -492,6 +497,7 @@ def test_positive_backup_offline_incremental(setup_backup_tests, ansible_module)
 
 
 @pytest.mark.capsule
+@pytest.mark.destructive
 def test_positive_backup_offline_capsule_features(setup_backup_tests, ansible_module):
     """Take offline backup of server including capsule features dns, tftp, etc.
 
@@ -527,6 +533,7 @@ def test_positive_backup_offline_capsule_features(setup_backup_tests, ansible_mo
 
 
 @pytest.mark.capsule
+@pytest.mark.destructive
 def test_positive_backup_offline_logical(setup_backup_tests, ansible_module):
     """Take offline backup of server include-db-dumps
 
@@ -564,6 +571,7 @@ def test_positive_backup_offline_logical(setup_backup_tests, ansible_module):
 
 
 @pytest.mark.capsule
+@pytest.mark.destructive
 def test_positive_backup_offline_all(setup_backup_tests, ansible_module):
     """Take offline backup of server providing all options
 
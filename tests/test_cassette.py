@@ -0,0 +1,179 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+from pytest_ansible.results import AdHocResult
+
+from testfm.cassette import Cassette
+from testfm.cassette import CassetteError
+from testfm.cassette import Cassettes
+from testfm.cassette import decode
+from testfm.cassette import encode
+from testfm.cassette import key_of
+from testfm.executor import Result
+from testfm.executor import StreamResult
+from testfm.health import Health
+from testfm.remote import Call
+from testfm.remote import secret
+from testfm.steps import Step
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+INNER_CONFTEST = """
+from testfm.executor import configure
+from testfm.executor import LocalTransport
+
+pytest_plugins = ["testfm.timing", "testfm.cassette"]
+
+
+def pytest_configure(config):
+    configure(inventory="inventory", pattern="server", transport=LocalTransport)
+"""
+
+INNER_TEST = """
+from fauxfactory import gen_string
+
+from testfm.executor import default_executor
+from testfm.facts import host_facts
+
+
+def test_names():
+    assert host_facts().role == "satellite"
+    name = gen_string("alpha")
+    assert default_executor().run(f"echo {name}").stdout.strip() == name
+"""
+
+FAKE_RPM = """#!/bin/sh
+echo "satellite satellite-6.9.0-1.el7.noarch 6.9.0"
+"""
+
+
+def test_positive_codec_round_trip(tmpdir):
+    """Save results of every kind to a cassette and replay them
+
+    :id: 0e6b3f48-7c2d-4a9e-8b1f-5d3a9c7e2f14
+
+    :steps:
+        1. Record executor, stream, ansible, hammer shell and API results
+        2. Save the cassette, load it and replay every key
+
+    :expectedresults: Results come back equal and in the recorded order, the
+        last one being repeated, and missing keys fail.
+
+    :CaseImportance: Medium
+    """
+    step = Step("server-ping", "Check server ping", "FAIL", 1.5, "down")
+    recorded = [
+        (Call("h", "command", ("ls",), {}, "executor.run"), Result(0, "a", "")),
+        (Call("h", "command", ("ls",), {}, "executor.run"), Result(2, "", "gone")),
+        (
+            Call("h", "command", (Health.check(),), {}, "executor.stream"),
+            StreamResult(1, [step], step, ""),
+        ),
+        (Call("h", "hammer", ("organization", "list"), {}, "hammer.shell"), "ID | NAME\n"),
+        (Call("h", "api", ("GET", "/api/roles"), {"body": None}, "hammer.api"), {"results": []}),
+        (Call("h", "api", ("DELETE", "/api/roles/1"), {"body": None}, "hammer.api"), None),
+    ]
+    cassette = Cassette(str(tmpdir.join("test.json.gz")))
+    for call, result in recorded:
+        cassette.record(call, result)
+    cassette.record(Call("h", "ping", (), {}), AdHocResult(contacted={"h": {"ping": "pong"}}))
+    cassette.save()
+    replayed = Cassette(cassette.path).load()
+    assert replayed.replay(key_of(recorded[0][0])) == Result(0, "a", "")
+    assert replayed.replay(key_of(recorded[0][0])) == Result(2, "", "gone")
+    assert replayed.replay(key_of(recorded[0][0])) == Result(2, "", "gone")
+    for call, result in recorded[2:]:
+        assert replayed.replay(key_of(call)) == result
+    assert replayed.replay(key_of(Call("h", "ping", (), {}))).contacted == {"h": {"ping": "pong"}}
+    assert decode(encode(None)) is None
+    cassettes = Cassettes(str(tmpdir), "replay")
+    cassettes.start("test")
+    with pytest.raises(CassetteError):
+        cassettes(Call("h", "command", ("unrecorded",), {}, "executor.run"), None)
+
+
+def test_positive_keys_mask_dates_and_secrets():
+    """Key calls without their dates and secrets
+
+    :id: 4c1a7e93-2b8f-4d6e-9a5c-8e0f3b7d1a26
+
+    :steps:
+        1. Key commands differing by date only, and one holding a password
+
+    :expectedresults: Dates do not change the key, the password is masked.
+
+    :CaseImportance: Medium
+    """
+    secret("hunter2-password")
+    first = key_of(Call("h", "shell", ("backup 2026-10-17 10:00:00",), {}))
+    second = key_of(Call("h", "shell", ("backup 2027-01-02 11:30:00",), {}))
+    assert first == second
+    key = key_of(Call("h", "shell", ('register --password="hunter2-password"',), {}))
+    assert "hunter2-password" not in key
+    cassette = Cassette("unused")
+    cassette.record(Call("h", "shell", ("true",), {}), Result(0, "hunter2-password", ""))
+    assert "hunter2-password" not in json.dumps(cassette.calls)
+
+
+def test_positive_record_then_replay(tmpdir):
+    """Replay a recorded session on the machine which recorded it
+
+    :id: 7e2d9b54-1f6c-4a3e-b8d7-2c5f0a9e4b31
+
+    :setup:
+        1. A facts file holding the host, as a recording session leaves it.
+
+    :steps:
+        1. Record a test querying host facts and running a random command
+        2. Replay it with a broken rpm and the facts file still there
+
+    :expectedresults: The replay passes without running anything, the facts file
+        is left as it was.
+
+    :CaseImportance: High
+    """
+    tmpdir.join("conftest.py").write(INNER_CONFTEST)
+    tmpdir.join("test_inner.py").write(INNER_TEST)
+    tmpdir.join("inventory").write("[server]\nlocalhost ansible_connection=local\n")
+    cache = tmpdir.mkdir("cache").mkdir("testfm")
+    facts = {
+        "localhost": {
+            "nevra": "satellite-6.8.0-1.el7.noarch",
+            "version": "6.8",
+            "role": "satellite",
+        }
+    }
+    cache.join("facts.json").write(json.dumps(facts))
+    bin_dir = tmpdir.mkdir("bin")
+    rpm = bin_dir.join("rpm")
+    rpm.write(FAKE_RPM)
+    rpm.chmod(0o755)
+    env = dict(
+        os.environ,
+        PATH=f"{bin_dir}{os.pathsep}{os.environ['PATH']}",
+        XDG_CACHE_HOME=str(tmpdir.join("cache")),
+        PYTHONPATH=os.pathsep.join([ROOT, os.environ.get("PYTHONPATH", "")]),
+    )
+    argv = [
+        sys.executable,
+        "-m",
+        "pytest",
+        "-q",
+        "-p",
+        "no:cacheprovider",
+        "-p",
+        "no:pytest-ansible",
+    ]
+    argv += ["--cassette-dir", str(tmpdir.join("cassettes"))]
+    record = subprocess.run(
+        argv + ["--cassette-mode", "record"], cwd=str(tmpdir), env=env, stdout=subprocess.PIPE
+    )
+    assert record.returncode == 0, record.stdout.decode()
+    rpm.write("#!/bin/sh\nexit 99\n")
+    replay = subprocess.run(
+        argv + ["--cassette-mode", "replay"], cwd=str(tmpdir), env=env, stdout=subprocess.PIPE
+    )
+    assert replay.returncode == 0, replay.stdout.decode()
+    assert json.loads(cache.join("facts.json").read()) == facts
@@ -0,0 +1,71 @@
+import os
+import shutil
+import subprocess
+
+import pytest
+
+from testfm.dbcheckpoint import DBCheckpoint
+from testfm.executor import Executor
+from testfm.executor import LocalTransport
+
+PORT = "54329"
+
+
+@pytest.fixture
+def postgres(tmpdir):
+    """Throwaway postgres cluster listening on a socket in tmpdir, return its psql command"""
+    if not (shutil.which("initdb") and shutil.which("pg_ctl") and shutil.which("psql")):
+        pytest.skip("postgres is not installed")
+    if os.geteuid() == 0:
+        pytest.skip("postgres does not run as root")
+    data = str(tmpdir.join("data"))
+    subprocess.check_call(["initdb", "-D", data, "-A", "trust"], stdout=subprocess.DEVNULL)
+    options = f"-k {tmpdir} -p {PORT} -c listen_addresses=''"
+    subprocess.check_call(["pg_ctl", "-D", data, "-o", options, "-w", "start"])
+    psql = f"psql -h {tmpdir} -p {PORT}"
+    yield psql
+    subprocess.call(["pg_ctl", "-D", data, "-m", "immediate", "stop"])
+
+
+def _sql(psql, database, statement):
+    return subprocess.check_output(
+        f'{psql} -d {database} -X -q -A -t -c "{statement}"', shell=True, universal_newlines=True
+    ).strip()
+
+
+def test_positive_checkpoint_restore(postgres):
+    """Restore a database from its checkpoint
+
+    :id: 5a8e2d14-3c6f-4b0a-9e7d-1f4b6c8a2d93
+
+    :setup:
+        1. A throwaway postgres cluster with a scratch database.
+
+    :steps:
+        1. Checkpoint the scratch database and a missing one
+        2. Change the scratch database
+        3. Restore the checkpoint, then drop it
+
+    :expectedresults: The change is undone, the missing database is left out and
+        no template is left behind.
+
+    :CaseImportance: Medium
+    """
+    _sql(postgres, "postgres", "CREATE DATABASE scratch")
+    _sql(postgres, "scratch", "CREATE TABLE items (name text); INSERT INTO items VALUES ('kept')")
+    checkpoint = DBCheckpoint(
+        ["scratch", "missing"],
+        Executor(transport=LocalTransport),
+        "localhost",
+        psql=f"{postgres} -d postgres",
+        stop=None,
+        start=None,
+    )
+    checkpoint.create()
+    assert list(checkpoint.owners) == ["scratch"]
+    _sql(postgres, "scratch", "DELETE FROM items")
+    checkpoint.restore()
+    assert _sql(postgres, "scratch", "SELECT name FROM items") == "kept"
+    checkpoint.drop()
+    templates = _sql(postgres, "postgres", "SELECT datname FROM pg_database")
+    assert checkpoint.template("scratch") not in templates.split()
@@ -0,0 +1,151 @@
+import http.client
+import socket
+import threading
+
+import pytest
+
+from testfm.hammer import ForemanAPI
+from testfm.hammer import HammerError
+from testfm.hammer import StubForeman
+
+
+@pytest.fixture
+def stub():
+    """In-memory Foreman API serving the requests of ForemanAPI"""
+    with StubForeman() as server:
+        yield server
+
+
+@pytest.fixture
+def api(stub):
+    """ForemanAPI client of the stub"""
+    client = ForemanAPI("127.0.0.1", port=stub.port, scheme="http")
+    yield client
+    client.close()
+
+
+def _stale_connection(answer=b""):
+    """Return a pooled connection to a server closing it after sending answer"""
+    listener = socket.socket()
+    listener.bind(("127.0.0.1", 0))
+    listener.listen(1)
+
+    def serve():
+        peer, _ = listener.accept()
+        peer.recv(65536)
+        peer.sendall(answer)
+        peer.close()
+        listener.close()
+
+    threading.Thread(target=serve, daemon=True).start()
+    connection = http.client.HTTPConnection("127.0.0.1", listener.getsockname()[1], timeout=10)
+    connection.connect()
+    return connection
+
+
+def test_positive_api_against_stub(stub, api):
+    """Make fixture changes through the API of StubForeman
+
+    :id: 4f0f8a5e-0c8e-4a4c-9a3e-3f8f3b7c6d21
+
+    :steps:
+        1. Create a product, a role with a filter and change a setting
+        2. Delete the product and the role
+
+    :expectedresults: The stub store holds the changes, then loses the deleted entries.
+
+    :CaseImportance: Medium
+    """
+    api.product_create("zoo", organization_id=1)
+    api.role_create("viewer")
+    api.filter_create("viewer", ["view_hosts", "console_hosts"])
+    api.setting_set("token_duration", 2)
+    assert [product["name"] for product in stub.store["products"]] == ["zoo"]
+    assert len(stub.store["filters"][0]["permission_ids"]) == 2
+    assert stub.settings == {"token_duration": "2"}
+    api.product_delete("zoo", organization_id=1)
+    api.role_delete("viewer")
+    assert stub.store["products"] == []
+    assert stub.store["roles"] == []
+    with pytest.raises(HammerError):
+        api.role_delete("viewer")
+
+
+def test_positive_sync_plans_paged(stub, api):
+    """List the sync plans of all organizations a page at a time
+
+    :id: 1c7a0f52-9f5e-4b7e-8d0b-6a1f5f0d2b34
+
+    :steps:
+        1. Create 205 sync plans over two organizations
+        2. List them with ForemanAPI.sync_plans
+
+    :expectedresults: Every plan is listed once, with its organization and enabled state.
+
+    :CaseImportance: Medium
+    """
+    other = stub.add("organizations", {"name": "Other"})["id"]
+    for index in range(205):
+        organization = 1 if index % 2 else other
+        api.sync_plan_create(
+            f"plan{index}", organization, "weekly", "2026-10-17", enabled=index % 3 != 0
+        )
+    plans = list(api.sync_plans())
+    assert sorted(plan.name for plan in plans) == sorted(f"plan{index}" for index in range(205))
+    assert {plan.organization_id for plan in plans} == {1, other}
+    assert sum(plan.enabled for plan in plans) == 136
+
+
+def test_positive_organization_ids_paged(stub, api):
+    """List organizations over several pages
+
+    :id: 6d2f8c43-5a1e-4b9f-9c7d-3e8a0b1f4c62
+
+    :steps:
+        1. Create 250 organizations
+        2. List their ids with ForemanAPI.organization_ids
+
+    :expectedresults: All 251 organizations, the default one included, are listed.
+
+    :CaseImportance: Medium
+    """
+    ids = [stub.add("organizations", {"name": f"org{index}"})["id"] for index in range(250)]
+    assert api.organization_ids() == [1] + ids
+
+
+def test_positive_resend_on_closed_idle_connection(stub, api):
+    """Send a request again when a reused connection was closed before any answer
+
+    :id: 8b3d5e71-2a4f-4c9d-b1e6-0f7c2d9a4e58
+
+    :steps:
+        1. Pool a connection its server closes without answering
+        2. Create a product
+
+    :expectedresults: The product is created once, on a new connection.
+
+    :CaseImportance: Medium
+    """
+    api._pool.put_nowait(_stale_connection())
+    api.product_create("zoo", organization_id=1)
+    assert [product["name"] for product in stub.store["products"]] == ["zoo"]
+
+
+def test_negative_no_resend_after_answer_started(stub, api):
+    """Do not send a POST again once its answer started arriving
+
+    :id: 2e9c4b17-7d3a-4f5e-a8c2-5b1d6e0f3a79
+
+    :steps:
+        1. Pool a connection its server closes in the middle of an answer
+        2. Create a product
+
+    :expectedresults: The request fails and no product is created by a second request.
+
+    :CaseImportance: Medium
+    """
+    answer = b"HTTP/1.1 201 Created\r\nContent-Length: 100\r\n\r\n{"
+    api._pool.put_nowait(_stale_connection(answer))
+    with pytest.raises(http.client.IncompleteRead):
+        api.product_create("zoo", organization_id=1)
+    assert stub.store["products"] == []
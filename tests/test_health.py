@@ -3,11 +3,15 @@ import time
 import pytest
 
 from testfm.decorators import stubbed
+from testfm.decorators import uses
+from testfm.executor import default_executor
 from testfm.health import Health
+from testfm.helpers import backdate
 from testfm.log import logger
 
 
 @pytest.mark.capsule
+@uses("foreman_maintain_yml:read")
 def test_positive_foreman_maintain_health_list(ansible_module):
     """List health check in foreman-maintain
 
@@ -30,6 +34,7 @@ def test_positive_foreman_maintain_health_list(ansible_module):
 
 
 @pytest.mark.capsule
+@uses("foreman_maintain_yml:read")
 def test_positive_foreman_maintain_health_list_tags(ansible_module):
     """List tags for health check in foreman-maintain
 
@@ -52,6 +57,7 @@ def test_positive_foreman_maintain_health_list_tags(ansible_module):
 
 
 @pytest.mark.capsule
+@uses("foreman_maintain_yml:read")
 def test_positive_list_health_check_by_tags(ansible_module):
     """List health check in foreman-maintain by tags
 
@@ -114,16 +120,14 @@ def test_positive_foreman_maintain_health_check_by_tags(ansible_module):
 
     :CaseImportance: Critical
     """
-    contacted = ansible_module.command(Health.list_tags())
-    for result in contacted.values():
-        output = result["stdout"]
-    output = [i.split("]\x1b[0m")[0] for i in output.split("\x1b[36m[") if i]
-    for tag in output:
-        contacted = ansible_module.command(Health.check(["--tags", tag, "--assumeyes"]))
-        for result in contacted.values():
-            logger.info(result["stdout"])
-            assert "FAIL" not in result["stdout"]
-            assert result["rc"] == 0
+    # every check runs once even when it belongs to several tags
+    contacted = Health.check_by_tags(ansible_module, options=["--assumeyes"])
+    for by_tag in contacted.values():
+        for tag, checks in by_tag.items():
+            for check in checks:
+                logger.info(check.stdout)
+                assert "FAIL" not in check.stdout, f"{check.label} of tag {tag}"
+                assert check.rc == 0
 
 
 def test_positive_check_server_ping(ansible_module):
@@ -170,6 +174,38 @@ def test_negative_check_server_ping(setup_katello_service_stop, ansible_module):
         assert "FAIL" in result["stdout"]
 
 
+def test_negative_streamed_check_server_ping(setup_katello_service_stop):
+    """Verify a failing streamed health check reports its exit status
+
+    :id: 6670ebaa-b7fa-412b-a4dd-40e29e43eaa9
+
+    :setup:
+        1. foreman-maintain should be installed.
+
+    :steps:
+        1. Run Katello-service stop
+        2. Stream foreman-maintain health check --label server-ping, then wait
+           before exiting with its status
+        3. Run Katello-service start
+
+    :expectedresults: The failed step arrives before the command exits and the
+        exit status is not 0.
+
+    :CaseImportance: High
+    """
+    arrived = []
+    command = f"{Health.check(['--label', 'server-ping', '--assumeyes'])}; rc=$?; sleep 5; exit $rc"
+    result = default_executor().stream(
+        command, fatal=(), on_step=lambda step: arrived.append(time.monotonic())
+    )
+    returned = time.monotonic()
+    logger.info(result)
+    assert result.aborted is None
+    assert any(step.status == "FAIL" for step in result.steps)
+    assert arrived and returned - arrived[0] >= 4
+    assert result.rc != 0
+
+
 @pytest.mark.capsule
 def test_positive_pre_upgrade_health_check(ansible_module):
     """Verify pre-upgrade health checks
@@ -624,11 +660,9 @@ def test_positive_check_tftp_storage(ansible_module, setup_tftp_storage):
         "do-not-delete.yml",
         "keep-discovery-initrd.img",
     ]
-    # Create files for testing check-tftp-storage check.
-    for file in files[:3]:
-        setup = ansible_module.file(path=f"/var/lib/tftpboot/boot/{file}", state="touch")
-        assert setup.values()[0]["changed"] == 1
-    time.sleep(200)
+    # Create files for testing check-tftp-storage check, older than token_duration (2 minutes).
+    setup = backdate(ansible_module, [f"/var/lib/tftpboot/boot/{file}" for file in files[:3]], 200)
+    assert setup.values()[0]["rc"] == 0
     setup = ansible_module.file(path=f"/var/lib/tftpboot/boot/{files[-1]}", state="touch")
     assert setup.values()[0]["changed"] == 1
     # Run check-tftp-storage check.
@@ -10,6 +10,7 @@ BADDIR_MSG = "The given directory does not contain the " "required files or has
 
 
 @pytest.mark.capsule
+@pytest.mark.destructive
 def test_positive_restore_online_backup(ansible_module):
     """Restore online backup of server
 
@@ -52,6 +53,7 @@ def test_positive_restore_online_backup(ansible_module):
 
 
 @pytest.mark.capsule
+@pytest.mark.destructive
 def test_positive_restore_offline_backup(ansible_module):
     """Restore offline backup of server
 
@@ -1,5 +1,6 @@
 import pytest
 
+from testfm.decorators import uses
 from testfm.health import Health
 from testfm.log import logger
 from testfm.service import Service
@@ -178,6 +179,7 @@ def test_positive_automate_bz1626651(ansible_module):
 
 
 @pytest.mark.capsule
+@uses("services:read")
 def test_positive_service_status_clocale(ansible_module):
     """Foreman-maintain service on C locale
 
@@ -257,6 +259,7 @@ def test_positive_fm_service_restart_bz_1696862(setup_bz_1696862, ansible_module
         assert result["rc"] == 0
 
 
+@uses("services:write")
 def test_positive_foreman_maintain_service_list_sidekiq(ansible_module):
     """List sidekiq services with service list
 
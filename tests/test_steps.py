@@ -0,0 +1,153 @@
+import subprocess
+
+from testfm.batch import Batch
+from testfm.steps import parse_steps
+from testfm.steps import Step
+from testfm.steps import StepParser
+
+OUTPUT = """Running ForemanMaintain::Scenario::FilteredScenario
+================================================================================
+Check for paused tasks:                                               [FAIL]
+There are currently 1 paused tasks in the system
+--------------------------------------------------------------------------------
+Check whether all services are running:
+\\ checking services\r\x1b[32m/ checking services                     [OK]\x1b[0m
+--------------------------------------------------------------------------------
+Check disk speed:                                                     [WARNING]
+Slow disk
+--------------------------------------------------------------------------------
+The following steps ended up in failing state:
+
+  [foreman-tasks-not-paused]
+
+The following steps ended up in warning state:
+
+  [disk-performance]
+
+"""
+
+
+def _run(script):
+    """Run a shell script locally the way ansible's shell module would"""
+    proc = subprocess.run(
+        ["sh", "-c", script], stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=False
+    )
+    return proc.stdout.decode()
+
+
+def test_positive_parse_steps():
+    """Parse the steps of a complete foreman-maintain output
+
+    :id: 9d4b1e27-6f3a-4c8e-b5d2-7a0c3f9e1b46
+
+    :steps:
+        1. Parse canned health check output with colors, a spinner and a summary
+
+    :expectedresults: Every step has its description, status, message and the
+        label given by the summary.
+
+    :CaseImportance: Medium
+    """
+    labels = {"Check whether all services are running": "service-status"}
+    assert parse_steps(OUTPUT, labels) == [
+        Step(
+            "foreman-tasks-not-paused",
+            "Check for paused tasks",
+            "FAIL",
+            None,
+            "There are currently 1 paused tasks in the system",
+        ),
+        Step(
+            "service-status",
+            "Check whether all services are running",
+            "OK",
+            None,
+            "checking services",
+        ),
+        Step("disk-performance", "Check disk speed", "WARNING", None, "Slow disk"),
+    ]
+
+
+def test_positive_stream_steps_by_chunks():
+    """Parse foreman-maintain output fed in small chunks while it streams
+
+    :id: 3f7c2a91-8e5d-4b6f-a0c4-2d9e7b1f5a38
+
+    :steps:
+        1. Feed canned output to a StepParser 7 characters at a time, with a clock
+
+    :expectedresults: Steps are returned as soon as their separator arrives, with
+        durations, and match the steps of the whole output.
+
+    :CaseImportance: Medium
+    """
+    ticks = iter(range(1000))
+    seen = []
+    parser = StepParser(clock=lambda: next(ticks), on_step=seen.append)
+    done = []
+    chunks = [OUTPUT[start:][:7] for start in range(0, len(OUTPUT), 7)]
+    for chunk in chunks:
+        done += parser.feed(chunk)
+    done += parser.close()
+    assert [step.status for step in done] == ["FAIL", "OK", "WARNING"]
+    assert seen == done
+    assert parser.scenario == "ForemanMaintain::Scenario::FilteredScenario"
+    assert all(step.duration is not None and step.duration >= 0 for step in done)
+    assert [step.label for step in parser.steps] == [
+        "foreman-tasks-not-paused",
+        None,
+        "disk-performance",
+    ]
+
+
+def test_positive_batch_steps():
+    """Run a batch as one shell script and parse the outcome of every step
+
+    :id: 7b2e9c15-4a6d-4f8b-9e3a-1c5d8f0a2b67
+
+    :steps:
+        1. Run a batch whose steps share a variable, write to stderr and fail
+
+    :expectedresults: Steps up to the unexpected return code ran with their
+        output, the following one did not run.
+
+    :CaseImportance: Medium
+    """
+    batch = (
+        Batch()
+        .add("GREETING='hello world'")
+        .add('echo "$GREETING"; echo oops >&2')
+        .add("sh -c 'exit 3'", rc=(0, 3))
+        .add("printf 'no newline'", rc=None)
+        .add("false")
+        .add("echo never")
+    )
+    steps = batch.parse(_run(batch.script()))
+    assert [(step.rc, step.ok) for step in steps] == [
+        (0, True),
+        (0, True),
+        (3, True),
+        (0, True),
+        (1, False),
+        (None, False),
+    ]
+    assert (steps[1].stdout, steps[1].stderr) == ("hello world", "oops")
+    assert steps[3].stdout == "no newline"
+    assert steps[5].command == "echo never"
+
+
+def test_negative_batch_garbled_output():
+    """Parse the output of a batch which did not run its steps
+
+    :id: 2c8f5d39-1e7b-4a0c-b6d4-9f3a7e2c1b85
+
+    :steps:
+        1. Parse output holding no step marker
+
+    :expectedresults: Every step is reported as not run.
+
+    :CaseImportance: Low
+    """
+    batch = Batch().add("true").add("true")
+    steps = batch.parse("sh: syntax error\n")
+    assert [(step.rc, step.ok) for step in steps] == [(None, False), (None, False)]
@@ -1,6 +1,7 @@
 import pytest
 
 from testfm.decorators import stubbed
+from testfm.decorators import uses
 from testfm.helpers import product
 from testfm.helpers import server
 from testfm.log import logger
@@ -8,6 +9,7 @@ from testfm.upgrade import Upgrade
 
 
 @pytest.mark.capsule
+@uses("packages:read", "yum_repos:read")
 def test_positive_foreman_maintain_upgrade_list(ansible_module):
     """List versions this system is upgradable to
 